@@ -0,0 +1,421 @@
+"""
+Load test of our own deployment
+
+Fixed rate mode (``--rate``) starts requests on a schedule regardless of the responses, fixed concurrency mode
+(``--concurrency``) runs virtual users sending the next request when the previous one finished. Latency is measured
+from the time a request was scheduled, not from the time it could be sent, so a stalled server is not hidden by
+the client waiting on it (coordinated omission). In fixed concurrency mode the schedule of every user is given by
+``--pace``, without it the latency is only the service time.
+
+Scenarios:
+
+- ``get``: request the endpoint with ``--method`` and ``--data``
+- ``flow``: login, read the feed and create a post with a new session, reading the form security token of every
+  form. A user is registered for every client unless ``--user-name`` is given. Run the server with ``RATE_LIMIT_ENABLED=0`` and
+  ``DOMAIN_FORM_SECURITY='CSRF'`` to measure capacity instead of the limits.
+
+Example::
+
+    python loadtest.py --rate 200 --duration 30 --scenario flow http://localhost:5000
+"""
+import click
+import multiprocessing
+import asyncio
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from httpx import AsyncClient, Limits, Response
+
+SUB_BUCKET_BITS = 7  # Under 1% error on every recorded value
+PERCENTILES = (50, 75, 90, 95, 99, 99.9, 99.99)
+
+
+class Histogram:
+    """
+    Log-linear histogram of microsecond values with bounded relative error, like HdrHistogram
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = defaultdict(int)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    @staticmethod
+    def _bucket(value: int) -> int:
+        half = 1 << (SUB_BUCKET_BITS - 1)
+        if value < (1 << SUB_BUCKET_BITS):
+            return value
+
+        exponent = value.bit_length() - SUB_BUCKET_BITS
+        return (exponent + 1) * half + (value >> exponent) - half
+
+    @staticmethod
+    def _highest(bucket: int) -> int:
+        half = 1 << (SUB_BUCKET_BITS - 1)
+        if bucket < (1 << SUB_BUCKET_BITS):
+            return bucket
+
+        exponent = bucket // half - 1
+        return ((bucket % half + half + 1) << exponent) - 1
+
+    def record(self, seconds: float):
+        value = max(int(seconds * 1_000_000), 0)
+        self.counts[self._bucket(value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'Histogram'):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] += count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Value at a percentile
+        :param percentile: Percentile between 0 and 100
+        :return: Milliseconds
+        """
+        if self.total == 0:
+            return 0.0
+
+        target = max(self.total * percentile / 100, 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return min(self._highest(bucket), self.max) / 1000
+
+        return self.max / 1000
+
+    def mean(self) -> float:
+        return self.sum / self.total / 1000 if self.total else 0.0
+
+
+@dataclass
+class Results:
+    """
+    Results of a worker by step, mergeable across workers
+    """
+    latency: Dict[str, Histogram] = field(default_factory=lambda: defaultdict(Histogram))
+    service: Dict[str, Histogram] = field(default_factory=lambda: defaultdict(Histogram))
+    errors: Dict[str, Counter] = field(default_factory=lambda: defaultdict(Counter))
+    elapsed: float = 0.0
+
+    def merge(self, other: 'Results'):
+        for step, histogram in other.latency.items():
+            self.latency[step].merge(histogram)
+        for step, histogram in other.service.items():
+            self.service[step].merge(histogram)
+        for step, errors in other.errors.items():
+            self.errors[step].update(errors)
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+
+class StepError(Exception):
+    """
+    Failed step of a scenario, recorded by the step unless ``recorded`` is false
+    """
+
+    def __init__(self, error: str, recorded: bool = True):
+        super().__init__(error)
+        self.recorded = recorded
+
+
+@dataclass
+class Config:
+    base_url: str
+    scenario: str
+    method: str
+    data: Dict[str, str]
+    user_name: str
+    password: str
+    token_field: str
+    rate: float
+    concurrency: int
+    pace: float
+    duration: float
+    warmup: float
+    timeout: float
+
+
+class Run:
+    """
+    Measurement state of a worker
+    """
+
+    def __init__(self, config: Config, start: float):
+        self.config = config
+        self.start = start
+        self.results = Results()
+
+    def recording(self, scheduled: float) -> bool:
+        return scheduled - self.start >= self.config.warmup
+
+    async def step(self, name: str, scheduled: float, fx: Callable[[], Awaitable[Response]],
+                   expected: Tuple[int, ...] = (200,)) -> Optional[Response]:
+        """
+        Run a request of a scenario and record its latency from the scheduled time
+        :param name: Step name
+        :param scheduled: Time the step should have started
+        :param fx: Request
+        :param expected: Expected status codes
+        :return: Response, or None when it failed
+        """
+        sent = perf_counter()
+        try:
+            response = await fx()
+            error = None if response.status_code in expected else f'HTTP {response.status_code:d}'
+        except Exception as err:
+            response, error = None, type(err).__name__
+
+        done = perf_counter()
+        if self.recording(scheduled):
+            self.results.latency[name].record(done - scheduled)
+            self.results.service[name].record(done - sent)
+            if error is not None:
+                self.results.errors[name][error] += 1
+
+        if error is not None:
+            raise StepError(error)
+        return response
+
+
+def read_token(response: Response, token_field: str) -> str:
+    match = re.search(rf'name="{re.escape(token_field)}" value="([^"]*)"', response.text)
+    if match is None:
+        raise StepError('missing form token', recorded=False)
+    return match.group(1)
+
+
+def user_name_of(number: int) -> str:
+    return f'LT{multiprocessing.current_process().pid % 100000:d}_{number:d}'
+
+
+async def register(config: Config, client: AsyncClient, user_name: str):
+    form = await client.get(f'{config.base_url}/users/register')
+    await client.post(f'{config.base_url}/users/register', data={
+        config.token_field: read_token(form, config.token_field),
+        'user_name': user_name,
+        'full_name': 'load test',
+        'password': config.password,
+    })
+
+
+async def scenario_get(run: Run, client: AsyncClient, _user_name: str, scheduled: float):
+    config = run.config
+    if config.method == 'GET':
+        await run.step('request', scheduled, lambda: client.get(config.base_url))
+    else:
+        await run.step('request', scheduled, lambda: client.request(config.method, config.base_url,
+                                                                     data=config.data),
+                       expected=(200, 201, 204, 302))
+
+
+async def scenario_flow(run: Run, client: AsyncClient, user_name: str, scheduled: float):
+    config = run.config
+    client.cookies.clear()
+
+    form = await run.step('login form', scheduled, lambda: client.get(f'{config.base_url}/users/login'))
+    token = read_token(form, config.token_field)
+
+    # Failed logins render the form again, only the redirect is a success
+    await run.step('login', scheduled, lambda: client.post(f'{config.base_url}/users/login', data={
+        config.token_field: token,
+        'user_name': user_name,
+        'password': config.password,
+    }), expected=(302,))
+
+    await run.step('feed', scheduled, lambda: client.get(f'{config.base_url}/posts/'))
+
+    form = await run.step('create form', scheduled, lambda: client.get(f'{config.base_url}/posts/create'))
+    token = read_token(form, config.token_field)
+
+    await run.step('create', scheduled, lambda: client.post(f'{config.base_url}/posts/create', data={
+        config.token_field: token,
+        'title': 'load test post title',
+        'content': 'load test post content',
+    }), expected=(302,))
+
+
+SCENARIOS = dict(get=scenario_get, flow=scenario_flow)
+
+
+async def iteration(run: Run, client: AsyncClient, user_name: str, scheduled: float):
+    started = perf_counter()
+    try:
+        await SCENARIOS[run.config.scenario](run, client, user_name, scheduled)
+    except StepError as err:
+        if not err.recorded and run.recording(scheduled):
+            run.results.errors['iteration'][str(err)] += 1
+        return
+
+    if run.config.scenario != 'get' and run.recording(scheduled):
+        run.results.latency['iteration'].record(perf_counter() - scheduled)
+        run.results.service['iteration'].record(perf_counter() - started)
+
+
+async def fixed_rate(run: Run, clients: List[AsyncClient], user_names: List[str], end: float):
+    """
+    Start iterations on a fixed schedule, waiting for a free client without moving the schedule
+    """
+    idle: asyncio.Queue = asyncio.Queue()
+    for index in range(len(clients)):
+        idle.put_nowait(index)
+
+    async def scheduled_iteration(scheduled: float):
+        index = await idle.get()
+        try:
+            await iteration(run, clients[index], user_names[index], scheduled)
+        finally:
+            idle.put_nowait(index)
+
+    tasks = set()
+    number = 0
+    while True:
+        scheduled = run.start + number / run.config.rate
+        if scheduled >= end:
+            break
+
+        await asyncio.sleep(max(scheduled - perf_counter(), 0))
+        task = asyncio.create_task(scheduled_iteration(scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        number += 1
+
+    await asyncio.gather(*tasks)
+
+
+async def fixed_concurrency(run: Run, clients: List[AsyncClient], user_names: List[str], end: float):
+    """
+    Run a virtual user per client, each one starting its next iteration on its pace or when the previous ended
+    """
+    async def virtual_user(index: int):
+        scheduled = run.start
+        while scheduled < end:
+            await asyncio.sleep(max(scheduled - perf_counter(), 0))
+            await iteration(run, clients[index], user_names[index], scheduled)
+            scheduled = scheduled + run.config.pace if run.config.pace else perf_counter()
+
+    await asyncio.gather(*[virtual_user(index) for index in range(len(clients))])
+
+
+async def task_load(config: Config, first_user: int, results: multiprocessing.Queue):
+    clients_count = config.concurrency
+    limits = Limits(max_connections=clients_count, max_keepalive_connections=clients_count)
+    clients = [AsyncClient(timeout=config.timeout, limits=limits) for _ in range(clients_count)]
+    user_names = [config.user_name or user_name_of(first_user + index) for index in range(clients_count)]
+
+    try:
+        if config.scenario == 'flow' and not config.user_name:
+            await asyncio.gather(*[register(config, client, user_name)
+                                   for client, user_name in zip(clients, user_names)])
+
+        run = Run(config, perf_counter())
+        end = run.start + config.warmup + config.duration
+        if config.rate:
+            await fixed_rate(run, clients, user_names, end)
+        else:
+            await fixed_concurrency(run, clients, user_names, end)
+
+        run.results.elapsed = perf_counter() - run.start - config.warmup
+    finally:
+        await asyncio.gather(*[client.aclose() for client in clients])
+
+    results.put(run.results)
+
+
+def fork_worker(config: Config, first_user: int, results: multiprocessing.Queue):
+    asyncio.run(task_load(config, first_user, results))
+
+
+def report(results: Results, rate: float, pace: float):
+    header = f'{"step":<12} {"count":>8} {"rps":>8} {"mean":>9} ' + \
+             ' '.join(f'{"p" + format(percentile, "g"):>9}' for percentile in PERCENTILES) + f' {"max":>9}'
+
+    for title, histograms in (('latency from schedule (ms)', results.latency),
+                              ('service time (ms)', results.service)):
+        click.echo(f'\n{title}')
+        click.echo(header)
+        for step, histogram in histograms.items():
+            click.echo(f'{step:<12} {histogram.total:>8d} {histogram.total / max(results.elapsed, 1e-9):>8.1f} '
+                       f'{histogram.mean():>9.2f} ' +
+                       ' '.join(f'{histogram.percentile(percentile):>9.2f}' for percentile in PERCENTILES) +
+                       f' {histogram.max / 1000:>9.2f}')
+
+    errors = [(step, error, count) for step, counter in results.errors.items() for error, count in counter.items()]
+    click.echo('\nerrors')
+    if not errors:
+        click.echo('none')
+    for step, error, count in sorted(errors, key=lambda entry: entry[2], reverse=True):
+        click.echo(f'{step:<12} {error:<24} {count:>8d}')
+
+    if not rate and not pace:
+        click.echo('\nno --pace given: fixed concurrency latency is not corrected for coordinated omission')
+
+
+@click.command('loadtest')
+@click.option('-w', '--workers', type=click.INT, default=multiprocessing.cpu_count(),
+              help='Number of processes sending requests')
+@click.option('-r', '--rate', type=click.FLOAT, default=0, help='Iterations per second of all the workers')
+@click.option('-c', '--concurrency', type=click.INT, default=16,
+              help='Virtual users of all the workers, the most iterations in flight on fixed rate')
+@click.option('--pace', type=click.FLOAT, default=0,
+              help='Seconds between iterations of a virtual user on fixed concurrency')
+@click.option('--duration', type=click.FLOAT, default=30, help='Seconds of measurement')
+@click.option('--warmup', type=click.FLOAT, default=5, help='Seconds before measuring')
+@click.option('--timeout', type=click.FLOAT, default=30, help='Request timeout in seconds')
+@click.option('-s', '--scenario', type=click.Choice(sorted(SCENARIOS)), default='get')
+@click.option('-m', '--method', default='GET', help='Request method of the get scenario')
+@click.option('-d', '--data', multiple=True, help='Data in form-data format to send, If request is GET is ignored')
+@click.option('-u', '--user-name', default='', help='User of the flow scenario, registers a user per client if empty')
+@click.option('-p', '--password', default='load-test-password', help='Password of the flow scenario users')
+@click.option('--token-field', default='csfr', help='Form field of the form security token')
+@click.argument('endpoint', required=True)
+def main(workers, rate, concurrency, pace, duration, warmup, timeout, scenario, method, data, user_name, password,
+         token_field, endpoint):
+    workers = max(min(workers, concurrency), 1)
+    results = multiprocessing.Queue()
+    processes = []
+
+    for number in range(workers):
+        config = Config(
+            base_url=endpoint.rstrip('/') if scenario == 'flow' else endpoint,
+            scenario=scenario,
+            method=method,
+            data=dict([entry.split('=', 1) for entry in data]),
+            user_name=user_name,
+            password=password,
+            token_field=token_field,
+            rate=rate / workers,
+            concurrency=concurrency // workers + (1 if number < concurrency % workers else 0),
+            pace=pace,
+            duration=duration,
+            warmup=warmup,
+            timeout=timeout,
+        )
+        processes.append(multiprocessing.Process(target=fork_worker, args=(config, number * concurrency, results)))
+
+    merged = Results()
+    try:
+        for process in processes:
+            process.start()
+        for _ in processes:
+            merged.merge(results.get())
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.kill()
+        return
+
+    report(merged, rate, pace)
+
+
+if __name__ == '__main__':
+    main()
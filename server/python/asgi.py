@@ -0,0 +1,262 @@
+"""
+ASGI entry point
+
+The ``/api`` routes of ``routes.aio`` run on the event loop with the asyncio repositories, so a worker keeps serving
+them while their queries or the Turnstile verification wait, and its concurrency is not bounded by its threads. Every
+other request goes to the Flask application of ``main.py`` on a pool of ``ASGI_WSGI_THREADS`` threads, which share
+the ``DB_POOL_SIZE`` connections of the worker. Repository providers without an asyncio version serve everything
+through Flask. Run it with uvicorn, from ``server/python``::
+
+    uvicorn asgi:application --workers 4 --port 5000
+
+Responses are buffered, no route of the application streams.
+"""
+from io import BytesIO
+from os import environ as env
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import sys
+
+import anyio
+import anyio.to_thread
+from flask import Flask, Response
+
+from main import app, CONFIG_REPOSITORY_PROVIDER
+from infrastructure.repositories import USER_REPOSITORY_PROVIDERS, POST_REPOSITORY_PROVIDERS, \
+    ASYNC_USER_REPOSITORY_PROVIDERS, ASYNC_POST_REPOSITORY_PROVIDERS, POST_ARCHIVE_PROVIDERS, ARCHIVE_AGE_DAYS
+from infrastructure.utils import partitions
+from infrastructure.utils.metrics import metrics
+from infrastructure.utils.mysql_async import close_async_pool
+from infrastructure.utils.ratelimit import RateLimitMiddleware
+from routes.aio import ROUTES
+from routes.api import error_response
+
+Scope = Dict
+Receive = Callable[[], Awaitable[Dict]]
+Send = Callable[[Dict], Awaitable[None]]
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+
+    return b''.join(chunks)
+
+
+def _environ(scope: Scope, body: bytes) -> dict:
+    """
+    WSGI environment of an ASGI request
+    :param scope: Connection scope
+    :param body: Request body
+    :return: Environment
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path'][len(root_path):] if scope['path'].startswith(root_path) else scope['path']
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+
+    return environ
+
+
+async def _send(send: Send, status: int, headers: List[Tuple[str, str]], body: bytes):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WsgiBridge:
+    """
+    Serve a WSGI application from an ASGI server on a bounded pool of threads
+    """
+
+    def __init__(self, wsgi_app: Callable, threads: int):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+
+    def _run(self, environ: dict) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        started = []
+        chunks = []
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            started[:] = [(int(status.split(' ', 1)[0]), headers)]
+            return chunks.append
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            chunks.extend(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+        status, headers = started[0]
+        return status, headers, b''.join(chunks)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if self._limiter is None:
+            # Limiters belong to the event loop of the worker
+            self._limiter = anyio.CapacityLimiter(self.threads)
+
+        environ = _environ(scope, await _read_body(receive))
+        status, headers, body = await anyio.to_thread.run_sync(self._run, environ, limiter=self._limiter)
+        await _send(send, status, headers, body)
+
+
+class Application:
+    """
+    ASGI application serving the asyncio routes natively and the rest with the Flask application
+    """
+
+    def __init__(self, flask_app: Flask, native: bool, threads: int):
+        self.flask_app = flask_app
+        self.native = native
+        self.bridge = WsgiBridge(flask_app.wsgi_app, threads)
+        # Native routes are limited like the others, without running the Flask middlewares
+        self.limiter = flask_app.wsgi_app if isinstance(flask_app.wsgi_app, RateLimitMiddleware) else None
+        self._rotation = None
+
+    def _ensure_tables(self):
+        # The asyncio repositories expect the tables, users first for the foreign keys of the posts
+        registries = [USER_REPOSITORY_PROVIDERS, POST_REPOSITORY_PROVIDERS]
+        if ARCHIVE_AGE_DAYS > 0:
+            registries.append(POST_ARCHIVE_PROVIDERS)
+
+        for providers in registries:
+            repository = providers[CONFIG_REPOSITORY_PROVIDER]()
+            if not repository.table_exists:
+                repository.create_table()
+
+    async def _lifespan(self, receive: Receive, send: Send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.native:
+                    await anyio.to_thread.run_sync(self._ensure_tables)
+                if partitions.ENABLED:
+                    # Every worker rotates, one at a time, the others skip their turn
+                    self._rotation = partitions.start_rotation()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._rotation is not None:
+                    self._rotation.set()
+                await close_async_pool()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _match(self, scope: Scope) -> Optional[Tuple[Callable[..., Awaitable[Response]], Dict[str, str]]]:
+        if not self.native:
+            return None
+
+        for method, pattern, route in ROUTES:
+            if scope['method'] == method:
+                match = pattern.match(scope['path'])
+                if match is not None:
+                    return route, match.groupdict()
+
+        return None
+
+    async def _serve(self, route: Callable[..., Awaitable[Response]], params: Dict[str, str], scope: Scope,
+                     receive: Receive, send: Send):
+        environ = _environ(scope, await _read_body(receive))
+
+        if self.limiter is not None:
+            rejected = []
+
+            def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+                rejected.append((status, headers))
+
+            body = self.limiter.admit(environ, start_response)
+            if body is not None:
+                status, headers = rejected[0]
+                await _send(send, int(status.split(' ', 1)[0]), headers, b''.join(body))
+                return
+
+        start = perf_counter()
+        try:
+            # Flask contexts are context variables, every request runs on its own task. Pushing the context opens the
+            # session, a short read of the session file
+            context = self.flask_app.request_context(environ)
+            context.push()
+            error = None
+            try:
+                response = await route(**params)
+            except AssertionError as assertion:
+                response = error_response(assertion)
+            except BaseException as unexpected:
+                error = unexpected
+                raise
+            finally:
+                # Runs the teardown of the unit of work, publishing the invalidations of the writes
+                context.pop(error)
+        finally:
+            if self.limiter is not None:
+                self.limiter.in_flight.leave()
+
+        endpoint = f'api.{route.__name__}'
+        metrics.observe('http_request_duration_seconds', perf_counter() - start, (('endpoint', endpoint),))
+        metrics.inc('http_requests_total', (('endpoint', endpoint), ('status', str(response.status_code))))
+        metrics.flush()
+
+        await _send(send, response.status_code, list(response.headers.items()), response.get_data())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        if scope['type'] != 'http':
+            return
+
+        matched = self._match(scope)
+        if matched is None:
+            await self.bridge(scope, receive, send)
+        else:
+            await self._serve(*matched, scope, receive, send)
+
+
+_native = CONFIG_REPOSITORY_PROVIDER in ASYNC_USER_REPOSITORY_PROVIDERS \
+    and CONFIG_REPOSITORY_PROVIDER in ASYNC_POST_REPOSITORY_PROVIDERS
+if _native:
+    app.config['ASYNC_USER_REPOSITORY'] = ASYNC_USER_REPOSITORY_PROVIDERS[CONFIG_REPOSITORY_PROVIDER]()
+    app.config['ASYNC_POST_REPOSITORY'] = ASYNC_POST_REPOSITORY_PROVIDERS[CONFIG_REPOSITORY_PROVIDER]()
+
+# The Flask routes check out a connection of the synchronous pool, which fails instead of waiting when exhausted
+application = Application(app, _native, int(env.get('ASGI_WSGI_THREADS', env.get('DB_POOL_SIZE', '10'))))
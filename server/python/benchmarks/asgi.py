@@ -0,0 +1,117 @@
+"""
+Benchmark of the ASGI entry point against the gunicorn deployment
+
+Opens a session on every deployment and keeps ``--connections`` concurrent clients reading the feed of ``/api/posts``
+for ``--duration`` seconds at each connection count, reporting requests per second, p50 and p99 latency and the
+failed requests. Start both deployments with the same workers against the same database, without the rate limiter::
+
+    RATE_LIMIT_ENABLED=0 GUNICORN_WORKER_MODE=sync GUNICORN_WORKERS=4 GUNICORN_BIND=127.0.0.1:5001 gunicorn
+    RATE_LIMIT_ENABLED=0 uvicorn asgi:application --workers 4 --port 5002
+
+and run from ``server/python``::
+
+    python -m benchmarks.asgi --connections 10,100,500,1000 http://127.0.0.1:5001 http://127.0.0.1:5002
+
+A single client process tops out at a few thousand requests per second, run several at once for faster servers.
+"""
+from statistics import quantiles
+from time import perf_counter
+from typing import Dict, List, Tuple
+import asyncio
+import os
+import re
+
+import click
+from httpx import AsyncClient, Limits, Response
+
+PASSWORD = 'benchmark-password'
+
+
+def _token(response: Response, key: str) -> str:
+    match = re.search(rf'name="{re.escape(key)}" value="([^"]*)"', response.text)
+    if match is None:
+        raise click.ClickException(f'missing form token on {response.url}, run with DOMAIN_FORM_SECURITY=CSRF')
+    return match.group(1)
+
+
+async def open_session(client: AsyncClient, base_url: str) -> Dict[str, str]:
+    """
+    Register a user and log in
+    :param client: HTTP client
+    :param base_url: Deployment URL
+    :return: Cookie header of the session
+    """
+    # The session cookie is secure, httpx does not send it back over plain HTTP
+    cookies: Dict[str, str] = dict()
+
+    async def visit(method: str, path: str, **kwargs) -> Response:
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in cookies.items())}
+        response = await client.request(method, f'{base_url}{path}', headers=headers, **kwargs)
+        cookies.update(response.cookies)
+        return response
+
+    user_name = f'ASGI{os.getpid():d}{int(perf_counter() * 1000) % 100000:d}'
+    form = await visit('GET', '/users/register')
+    await visit('POST', '/users/register', data=dict(
+        user_name=user_name, full_name='asgi benchmark', password=PASSWORD, csfr=_token(form, 'csfr'),
+    ))
+
+    form = await visit('GET', '/users/login')
+    await visit('POST', '/users/login', data=dict(user_name=user_name, password=PASSWORD, csfr=_token(form, 'csfr')))
+
+    response = await visit('GET', '/api/posts?limit=1')
+    if response.status_code != 200:
+        raise click.ClickException(f'login failed on {base_url}: {response.status_code:d} {response.text}')
+
+    return {'Cookie': '; '.join(f'{name}={value}' for name, value in cookies.items())}
+
+
+async def measure(base_url: str, connections: int, duration: float) -> Tuple[float, float, float, int]:
+    """
+    Read the feed from concurrent clients
+    :return: Requests per second, p50 and p99 latency in milliseconds, failed requests
+    """
+    limits = Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with AsyncClient(limits=limits, timeout=60) as client:
+        headers = await open_session(client, base_url)
+        latencies: List[float] = []
+        failures = 0
+        deadline = perf_counter() + duration
+
+        async def user():
+            nonlocal failures
+            while perf_counter() < deadline:
+                start = perf_counter()
+                try:
+                    response = await client.get(f'{base_url}/api/posts?limit=20', headers=headers)
+                    ok = response.status_code == 200
+                except Exception:
+                    ok = False
+                latencies.append(perf_counter() - start)
+                failures += not ok
+
+        start = perf_counter()
+        await asyncio.gather(*(user() for _ in range(connections)))
+        elapsed = perf_counter() - start
+
+    percentiles = quantiles(latencies, n=100, method='inclusive')
+    return len(latencies) / elapsed, percentiles[49] * 1000, percentiles[98] * 1000, failures
+
+
+@click.command('benchmark-asgi')
+@click.argument('urls', nargs=-1, required=True)
+@click.option('--connections', default='10,100,500,1000', help='Comma separated concurrent connection counts')
+@click.option('--duration', default=20.0, help='Seconds of every measure')
+def main(urls: Tuple[str, ...], connections: str, duration: float):
+    """
+    Compare the feed throughput of deployments at several connection counts
+    """
+    click.echo(f'{"deployment":<28} {"connections":>11} {"req/s":>10} {"p50":>10} {"p99":>10} {"failed":>7}')
+    for count in (int(value) for value in connections.split(',')):
+        for url in urls:
+            rate, p50, p99, failures = asyncio.run(measure(url.rstrip('/'), count, duration))
+            click.echo(f'{url:<28} {count:>11d} {rate:>10.1f} {p50:>8.2f}ms {p99:>8.2f}ms {failures:>7d}')
+
+
+if __name__ == '__main__':
+    main()
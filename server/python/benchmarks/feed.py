@@ -0,0 +1,82 @@
+"""
+Benchmark of the feed with large post bodies
+
+Seeds the posts with ``--body-size`` characters of content and reads feed pages of ``HOME_FEED_SIZE`` posts with the
+excerpt projection of the repositories and with the whole content, reporting pages per second, p50 and p99 latency
+and the characters of content loaded by a page. Run from ``server/python``::
+
+    python -m benchmarks.feed --size 10000 --body-sizes 1000,10000,60000
+"""
+from os import environ as env
+from statistics import quantiles
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+import click
+
+from benchmarks.repositories import prepare_schema, seed
+from infrastructure.repositories import POST_REPOSITORY_PROVIDERS
+from infrastructure.utils.mysql import get_connection
+
+_FULL_SQL = '''
+    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
+        FROM `posts`
+    ORDER BY `CREATION_DATE` DESC, `ID` DESC
+        LIMIT %s
+'''
+
+
+def full_page(limit: int) -> List[str]:
+    with get_connection() as conn:
+        with conn.cursor(prepared=True) as cursor:
+            cursor.execute(_FULL_SQL, (limit,))
+            return [row[2] for row in cursor.fetchall()]
+
+
+def measure(read_page: Callable[[], List[str]], iterations: int) -> Tuple[float, float, float, int]:
+    """
+    Read a feed page repeatedly
+    :return: Pages per second, p50 and p99 latency in milliseconds, characters of content of a page
+    """
+    latencies = []
+    characters = 0
+    for _ in range(iterations):
+        start = perf_counter()
+        contents = read_page()
+        latencies.append(perf_counter() - start)
+        characters = sum(len(content or '') for content in contents)
+
+    percentiles = quantiles(latencies, n=100, method='inclusive')
+    return len(latencies) / sum(latencies), percentiles[49] * 1000, percentiles[98] * 1000, characters
+
+
+@click.command('benchmark-feed')
+@click.option('--size', default=10000, help='Posts of the table')
+@click.option('--body-sizes', default='1000,10000,60000', help='Comma separated characters of content of every post')
+@click.option('--iterations', default=200, help='Pages read by every measure')
+def main(size: int, body_sizes: str, iterations: int):
+    """
+    Compare feed pages with excerpts and with whole contents
+    """
+    limit = int(env.get('HOME_FEED_SIZE', '100'))
+    prepare_schema()
+    seed(size)
+    repository = POST_REPOSITORY_PROVIDERS['MYSQL_SAFE']()
+
+    click.echo(f'{"body":>7} {"query":<8} {"pages/s":>10} {"p50":>10} {"p99":>10} {"characters":>11}')
+    for body_size in (int(value) for value in body_sizes.split(',')):
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('UPDATE `posts` SET `CONTENT` = REPEAT(%s, %s)', ('x', body_size))
+            conn.commit()
+
+        for name, read_page in (
+                ('excerpt', lambda: [post.content for post in repository.list(limit, 0)]),
+                ('full', lambda: full_page(limit)),
+        ):
+            rate, p50, p99, characters = measure(read_page, iterations)
+            click.echo(f'{body_size:>7d} {name:<8} {rate:>10.1f} {p50:>8.3f}ms {p99:>8.3f}ms {characters:>11d}')
+
+
+if __name__ == '__main__':
+    main()
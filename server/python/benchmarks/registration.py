@@ -0,0 +1,118 @@
+"""
+Benchmark of concurrent user registration
+
+Threads register users through the repositories at once, a share of them racing for the same user names, and report
+registrations per second, p50 and p99 latency, the duplicates rejected with ``ALREADY_EXISTS`` and the duplicate
+user names that reached the table, which must be none. Run from ``server/python``::
+
+    python -m benchmarks.registration --threads 16 --users 2000 --duplicates 0.2
+"""
+from concurrent.futures import ThreadPoolExecutor
+from os import environ as env
+from random import Random
+from statistics import quantiles
+from threading import Barrier
+from time import perf_counter
+from typing import List, Tuple
+
+import click
+
+from benchmarks.repositories import prepare_schema, seed, PASSWORD
+from domain.models import User
+from domain.providers import PasswordHasher
+from infrastructure.providers import PASSWORD_HASHER_PROVIDERS
+from infrastructure.repositories import USER_REPOSITORY_PROVIDERS
+from infrastructure.utils.mysql import get_connection
+
+# Pools refuse a checkout when they are exhausted, the connector allows 32 connections at most
+MAX_THREADS = 32
+
+
+def registrations(count: int, duplicates: float, random: Random) -> List[User]:
+    """
+    Users to register, ``duplicates`` of them reusing the name of another one
+    :param count: Registrations
+    :param duplicates: Share of registrations reusing a name
+    :param random: Random generator
+    :return: Users in registration order
+    """
+    names = [f'REG{index:d}' for index in range(count)]
+    for index in range(count):
+        if index and random.random() < duplicates:
+            names[index] = names[random.randrange(index)]
+
+    # Hashing the passwords is not part of the measure
+    return [User(name, 'registered user', PASSWORD) for name in names]
+
+
+def register(repository, users: List[User], barrier: Barrier) -> Tuple[List[float], int]:
+    barrier.wait()
+
+    latencies = []
+    rejected = 0
+    for user in users:
+        start = perf_counter()
+        try:
+            repository.create(user)
+        except AssertionError:
+            rejected += 1
+        latencies.append(perf_counter() - start)
+
+    return latencies, rejected
+
+
+def stored_duplicates() -> int:
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT COUNT(*) FROM (
+                    SELECT `USER_NAME` FROM `users` GROUP BY `USER_NAME` HAVING COUNT(*) > 1
+                ) AS `duplicates`
+            ''')
+            (count,) = cursor.fetchone()
+    return count
+
+
+@click.command('benchmark-registration')
+@click.option('--threads', default=16, help=f'Concurrent registrations, up to {MAX_THREADS:d}')
+@click.option('--users', default=2000, help='Registrations of every provider')
+@click.option('--duplicates', default=0.2, help='Share of registrations reusing a user name')
+@click.option('--providers', default='MYSQL_UNSAFE,MYSQL_SAFE', help='Comma separated repository providers')
+def main(threads: int, users: int, duplicates: float, providers: str):
+    """
+    Measure registration throughput under concurrent load
+    """
+    if not 0 < threads <= MAX_THREADS:
+        raise click.BadParameter(f'between 1 and {MAX_THREADS:d}', param_hint='--threads')
+
+    env['DB_POOL_SIZE'] = str(max(threads, int(env.get('DB_POOL_SIZE', '10'))))
+    PasswordHasher.provide_hasher(PASSWORD_HASHER_PROVIDERS[env.get('DOMAIN_PASSWORD_HASHER', 'SALT_SHA512')]())
+    prepare_schema()
+
+    models = registrations(users, duplicates, Random(0))
+    expected = users - len({model.user_name for model in models})
+
+    click.echo(f'{"provider":<14} {"reg/s":>10} {"p50":>10} {"p99":>10} {"rejected":>9} {"expected":>9} '
+               f'{"stored dup":>10}')
+    for provider in providers.split(','):
+        seed(0)
+        repository = USER_REPOSITORY_PROVIDERS[provider]()
+        barrier = Barrier(threads + 1)
+
+        with ThreadPoolExecutor(threads) as executor:
+            futures = [executor.submit(register, repository, models[index::threads], barrier)
+                       for index in range(threads)]
+            barrier.wait()
+            start = perf_counter()
+            outcomes = [future.result() for future in futures]
+            elapsed = perf_counter() - start
+
+        latencies = [latency for outcome in outcomes for latency in outcome[0]]
+        rejected = sum(outcome[1] for outcome in outcomes)
+        percentiles = quantiles(latencies, n=100, method='inclusive')
+        click.echo(f'{provider:<14} {users / elapsed:>10.1f} {percentiles[49] * 1000:>8.3f}ms '
+                   f'{percentiles[98] * 1000:>8.3f}ms {rejected:>9d} {expected:>9d} {stored_duplicates():>10d}')
+
+
+if __name__ == '__main__':
+    main()
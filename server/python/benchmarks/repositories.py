@@ -0,0 +1,249 @@
+"""
+Benchmarks of the MySQL repositories
+
+Every method of the user and post repositories runs against a scratch schema (``BENCHMARK_DB_NAME``, default
+``app_benchmark``) seeded with each table size, reporting operations per second, p50 and p99 latency, and the queries
+and round trips of a call. Run from ``server/python``::
+
+    python -m benchmarks.repositories --save benchmarks/baseline.json
+    python -m benchmarks.repositories --compare benchmarks/baseline.json
+
+The comparison fails when a method runs more queries or round trips than the baseline, or its p99 latency is worse
+than ``--threshold`` percent.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from datetime import date, timedelta
+from os import environ as env
+from random import Random
+from statistics import quantiles
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+import json
+
+import click
+import mysql.connector
+
+# Never touch the application schema, the pool reads the schema when it is created
+env['DB_NAME'] = env.get('BENCHMARK_DB_NAME', 'app_benchmark')
+
+from domain.models import User, Post
+from domain.providers import PasswordHasher
+from infrastructure.providers import PASSWORD_HASHER_PROVIDERS
+from infrastructure.repositories import USER_REPOSITORY_PROVIDERS, POST_REPOSITORY_PROVIDERS
+from infrastructure.utils.instrumentation import capture
+from infrastructure.utils.mysql import get_connection, get_schema, reset_pool
+
+PASSWORD = 'benchmark-password'
+
+Case = Callable[[object], object]
+Result = Dict[str, float]
+
+
+def prepare_schema():
+    connection = mysql.connector.connect(
+        host=env.get('DB_HOST', 'localhost'),
+        port=int(env.get('DB_PORT', '3306')),
+        user=env['DB_USER'],
+        password=env['DB_PASSWORD'],
+    )
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE DATABASE IF NOT EXISTS `{get_schema()}`')
+    finally:
+        connection.close()
+
+    reset_pool()
+
+
+def seed(size: int):
+    """
+    Recreate the tables with ``size`` users and posts, user and post ids go from 1 to ``size``
+    :param size: Rows of every table
+    """
+    users = USER_REPOSITORY_PROVIDERS['MYSQL_SAFE']()
+    posts = POST_REPOSITORY_PROVIDERS['MYSQL_SAFE']()
+    password = PasswordHasher.hash(PASSWORD)
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS `posts`, `users`')
+        conn.commit()
+
+    users.create_table()
+    posts.create_table()
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            for start in range(0, size, 1000):
+                rows = range(start, min(start + 1000, size))
+                cursor.executemany('''
+                    INSERT INTO `users` (`USER_NAME`, `FULL_NAME`, `PASSWORD`) VALUES (%s, %s, %s)
+                ''', [(f'BENCH{index:d}', f'benchmark user {index:d}', password) for index in rows])
+                cursor.executemany('''
+                    INSERT INTO `posts` (`TITLE`, `USER_NAME`, `CONTENT`, `CREATION_DATE`) VALUES (%s, %s, %s, %s)
+                ''', [(f'benchmark post {index:d}', f'BENCH{index % max(size // 10, 1):d}', 'content ' * 40,
+                       date.today() - timedelta(days=(size - index) // 100)) for index in rows])
+        conn.commit()
+
+
+def user_cases(size: int, random: Random) -> Dict[str, Case]:
+    created: List[int] = []
+    names = iter(range(1 << 30))
+
+    def create(repository) -> int:
+        _id = repository.create(User(f'NEW{next(names):d}', 'benchmark user', PASSWORD))
+        created.append(_id)
+        return _id
+
+    def update(repository):
+        index = random.randrange(size)
+        repository.update(index + 1, User(f'BENCH{index:d}', 'updated user'))
+
+    return {
+        'by_id': lambda repository: repository.by_id(random.randrange(size) + 1),
+        'by_user_id': lambda repository: repository.by_user_id(f'BENCH{random.randrange(size):d}'),
+        'by_login': lambda repository: repository.by_login(f'BENCH{random.randrange(size):d}', PASSWORD),
+        'list': lambda repository: repository.list(20, random.randrange(max(size - 20, 1))),
+        'create': create,
+        'update': update,
+        'delete': lambda repository: repository.delete(created.pop()),
+    }
+
+
+def post_cases(size: int, random: Random) -> Dict[str, Case]:
+    created: List[int] = []
+
+    def create(repository) -> int:
+        _id = repository.create(Post('benchmark new post', 'BENCH0', 'content'))
+        created.append(_id)
+        return _id
+
+    def update(repository):
+        repository.update(random.randrange(size) + 1, Post('benchmark updated post', 'BENCH0', 'content'))
+
+    return {
+        'by_id': lambda repository: repository.by_id(random.randrange(size) + 1),
+        'list': lambda repository: repository.list(20, 0),
+        'list_offset': lambda repository: repository.list(20, random.randrange(max(size - 20, 1))),
+        'filter': lambda repository: repository.filter(user_name=f'BENCH{random.randrange(max(size // 10, 1)):d}'),
+        'time_range': lambda repository: repository.time_range(since=date.today() - timedelta(days=7)),
+        'create': create,
+        'update': update,
+        'delete': lambda repository: repository.delete(created.pop()),
+    }
+
+
+def measure(repository: object, case: Case, iterations: int, warmup: int) -> Result:
+    for _ in range(warmup):
+        case(repository)
+
+    latencies = []
+    errors = 0
+    with capture() as captured:
+        start = perf_counter()
+        for _ in range(iterations):
+            call_start = perf_counter()
+            try:
+                case(repository)
+            except AssertionError:
+                errors += 1
+            latencies.append(perf_counter() - call_start)
+        elapsed = perf_counter() - start
+
+    percentiles = quantiles(latencies, n=100, method='inclusive')
+    return dict(
+        ops=iterations / elapsed,
+        p50=percentiles[49] * 1000,
+        p99=percentiles[98] * 1000,
+        queries=len(captured.queries) / iterations,
+        round_trips=captured.round_trips / iterations,
+        errors=errors,
+    )
+
+
+def run(sizes: List[int], providers: List[str], iterations: int, warmup: int) -> Dict[str, Result]:
+    results = dict()
+    for size in sizes:
+        seed(size)
+
+        for provider in providers:
+            random = Random(size)
+            suites: List[Tuple[str, object, Dict[str, Case]]] = [
+                ('users', USER_REPOSITORY_PROVIDERS[provider](), user_cases(size, random)),
+                ('posts', POST_REPOSITORY_PROVIDERS[provider](), post_cases(size, random)),
+            ]
+
+            for model, repository, cases in suites:
+                for method, case in cases.items():
+                    # Cases run in order, so every delete removes a row of the creates
+                    result = measure(repository, case, iterations, warmup)
+                    key = f'{size:d}/{provider}/{model}.{method}'
+                    results[key] = result
+                    click.echo(f'{key:<40} {result["ops"]:>10.1f} ops/s  p50 {result["p50"]:>8.3f}ms  '
+                               f'p99 {result["p99"]:>8.3f}ms  {result["queries"]:>5.2f} queries  '
+                               f'{result["round_trips"]:>5.2f} round trips'
+                               + (f'  {result["errors"]:d} errors' if result['errors'] else ''))
+
+    return results
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Result], threshold: float) -> bool:
+    """
+    Print the changes against a baseline
+    :return: Whether any method regressed
+    """
+    regressed = False
+    click.echo(f'\n{"benchmark":<40} {"ops/s":>16} {"p99":>16} {"queries":>12} {"round trips":>12}')
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        before = baseline[key]
+        ops = (result['ops'] / before['ops'] - 1) * 100
+        p99 = (result['p99'] / before['p99'] - 1) * 100 if before['p99'] else 0.0
+        worse = p99 > threshold or result['queries'] > before['queries'] \
+            or result['round_trips'] > before['round_trips']
+        regressed = regressed or worse
+
+        click.echo(f'{key:<40} {result["ops"]:>9.1f} {ops:>+5.1f}% {result["p99"]:>8.3f}ms {p99:>+5.1f}% '
+                   f'{before["queries"]:>5.2f}>{result["queries"]:<5.2f} '
+                   f'{before["round_trips"]:>5.2f}>{result["round_trips"]:<5.2f}' + ('  REGRESSION' if worse else ''))
+
+    return regressed
+
+
+@click.command('benchmark-repositories')
+@click.option('--sizes', default='100,10000', help='Comma separated table sizes')
+@click.option('--providers', default='MYSQL_UNSAFE,MYSQL_SAFE', help='Comma separated repository providers')
+@click.option('--iterations', default=200, help='Measured calls of every method')
+@click.option('--warmup', default=20, help='Calls of every method before measuring')
+@click.option('--save', type=click.Path(dir_okay=False), help='Write the results as a baseline')
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False),
+              help='Baseline to compare with')
+@click.option('--threshold', default=10.0, help='Percent of p99 latency increase reported as a regression')
+def main(sizes: str, providers: str, iterations: int, warmup: int, save: str, baseline_path: str, threshold: float):
+    """
+    Benchmark every repository method at several table sizes
+    """
+    hasher = PASSWORD_HASHER_PROVIDERS[env.get('DOMAIN_PASSWORD_HASHER', 'SALT_SHA512')]()
+    PasswordHasher.provide_hasher(hasher)
+
+    prepare_schema()
+    results = run([int(size) for size in sizes.split(',')], providers.split(','), iterations, warmup)
+
+    if save:
+        with open(save, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if baseline_path:
+        with open(baseline_path) as file:
+            if compare(results, json.load(file), threshold):
+                raise click.ClickException('regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark of the prepared statement cache
+
+Runs the hot statements of the safe repositories on one connection with the text protocol, with a statement
+prepared on every call and with the statement cache, reporting operations per second, the statements the server
+prepared (``Com_stmt_prepare``, a parse each) and the selects it ran (``Com_select``, a parse each with the text
+protocol) per call. Run from ``server/python``::
+
+    python -m benchmarks.statements --size 10000
+"""
+from os import environ as env
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, Tuple
+
+import click
+import mysql.connector
+
+from benchmarks.repositories import prepare_schema, seed
+from domain.providers import PasswordHasher
+from infrastructure.providers import PASSWORD_HASHER_PROVIDERS
+from infrastructure.repositories.posts import _LIST_PAGE_SQL
+from infrastructure.utils.mysql import get_pool
+from infrastructure.utils.statements import StatementCache
+
+STATEMENTS: Dict[str, Tuple[str, Callable[[Random, int], tuple]]] = {
+    'users.by_id': ('''
+        SELECT `USER_NAME`, `FULL_NAME`
+            FROM `users`
+        WHERE `ID` = %s
+            LIMIT 1
+    ''', lambda random, size: (random.randrange(size) + 1,)),
+    'users.by_user_id': ('''
+        SELECT `USER_NAME`, `FULL_NAME`
+            FROM `users`
+        WHERE `USER_NAME` = %s
+            LIMIT 1
+    ''', lambda random, size: (f'BENCH{random.randrange(size):d}',)),
+    'posts.by_id': ('''
+        SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
+            FROM `posts`
+        WHERE `ID` = %s
+    ''', lambda random, size: (random.randrange(size) + 1,)),
+    'posts.list': (_LIST_PAGE_SQL, lambda random, size: (20, 0)),
+}
+
+
+def server_parses(connection) -> Dict[str, int]:
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW SESSION STATUS WHERE `Variable_name` IN ('Com_stmt_prepare', 'Com_select')")
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def run_text(connection, sql: str, params: tuple):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        cursor.fetchall()
+
+
+def run_prepared(connection, sql: str, params: tuple):
+    cursor = connection.cursor(prepared=True)
+    try:
+        cursor.execute(sql, params)
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def measure(connection, fx: Callable, sql: str, make_params: Callable, size: int,
+            iterations: int) -> Tuple[float, float, float]:
+    random = Random(0)
+    before = server_parses(connection)
+
+    start = perf_counter()
+    for _ in range(iterations):
+        fx(connection, sql, make_params(random, size))
+    elapsed = perf_counter() - start
+
+    after = server_parses(connection)
+    prepares = after['Com_stmt_prepare'] - before['Com_stmt_prepare']
+    selects = after['Com_select'] - before['Com_select']
+    return iterations / elapsed, prepares / iterations, selects / iterations
+
+
+@click.command('benchmark-statements')
+@click.option('--size', default=10000, help='Rows of every table')
+@click.option('--iterations', default=2000, help='Executions of every statement and mode')
+def main(size: int, iterations: int):
+    """
+    Compare the text protocol, uncached and cached prepared statements
+    """
+    PasswordHasher.provide_hasher(PASSWORD_HASHER_PROVIDERS[env.get('DOMAIN_PASSWORD_HASHER', 'SALT_SHA512')]())
+    prepare_schema()
+    seed(size)
+
+    connection = mysql.connector.connect(**get_pool()._cnx_config)
+    cache = StatementCache(connection, len(STATEMENTS))
+
+    def run_cached(conn, sql: str, params: tuple):
+        cursor = cache.acquire(sql)
+        try:
+            cursor.execute(sql, params)
+            cursor.fetchall()
+        finally:
+            cache.release(sql, cursor)
+
+    click.echo(f'{"statement":<18} {"mode":<10} {"ops/s":>10} {"prepares/call":>14} {"selects/call":>13}')
+    try:
+        for name, (sql, make_params) in STATEMENTS.items():
+            for mode, fx in (('text', run_text), ('prepared', run_prepared), ('cached', run_cached)):
+                ops, prepares, selects = measure(connection, fx, sql, make_params, size, iterations)
+                click.echo(f'{name:<18} {mode:<10} {ops:>10.1f} {prepares:>14.3f} {selects:>13.3f}')
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
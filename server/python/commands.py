@@ -0,0 +1,242 @@
+from multiprocessing import get_context
+from datetime import date, datetime, timedelta
+from random import Random
+from time import perf_counter, sleep, time
+import os
+import tempfile
+
+import click
+from flask import current_app, url_for
+
+from infrastructure.repositories import POST_REPOSITORY_PROVIDERS, ARCHIVE_AGE_DAYS
+from infrastructure.utils import cache, partitions, static
+from infrastructure.utils.mysql import get_connection, get_maintenance_connection
+from infrastructure.utils.invalidation import InvalidationBus
+from infrastructure.utils.shared_memory import SharedSlots
+from infrastructure.utils.templates import warm_templates
+from infrastructure.utils.registry import import_times
+
+
+def _first_request_time(endpoint: str) -> float:
+    """
+    Measure the latency of a request to an endpoint
+    :param endpoint: Endpoint name
+    :return: Elapsed seconds
+    """
+    with current_app.test_request_context():
+        path = url_for(endpoint)
+
+    with current_app.test_client() as client:
+        start = perf_counter()
+        client.get(path)
+        return perf_counter() - start
+
+
+@click.command('compile-templates')
+@click.option('--report', is_flag=True, help='Measure cold versus warm first request latency')
+def compile_templates(report: bool):
+    """
+    Compile every template into the bytecode cache
+    """
+    environment = current_app.jinja_env
+    cold = None
+
+    if report:
+        environment.bytecode_cache.clear()
+        environment.cache.clear()
+        cold = _first_request_time('users.login_form')
+
+    for name, elapsed in sorted(warm_templates(environment).items()):
+        click.echo(f'{name}: {elapsed * 1000:.2f}ms')
+
+    if report:
+        environment.cache.clear()
+        warm = _first_request_time('users.login_form')
+
+        click.echo(f'first request (no bytecode cache): {cold * 1000:.2f}ms')
+        click.echo(f'first request (bytecode cache): {warm * 1000:.2f}ms')
+
+
+@click.command('build-static')
+@click.option('--vendor', 'download', is_flag=True, help='Download the missing third party assets first')
+def build_static(download: bool):
+    """
+    Fingerprint and precompress the static assets
+    """
+    source = static.source_dir(current_app)
+    if download:
+        for name in static.vendor(source):
+            click.echo(f'vendored {name}')
+
+    for name, built in sorted(static.build(source, static.build_dir()).items()):
+        path = os.path.join(static.build_dir(), built)
+        compressed = f', {os.path.getsize(path + ".gz"):d} bytes gzip' if os.path.exists(path + '.gz') else ''
+        click.echo(f'{name} -> {built} ({os.path.getsize(path):d} bytes{compressed})')
+
+
+@click.command('partition-posts')
+def partition_posts():
+    """
+    Partition the posts by month if they are not, and rotate the partitions. Run it daily
+    """
+    if not partitions.ENABLED:
+        raise click.ClickException('posts partitions are disabled, set POST_PARTITIONS_ENABLED=1')
+
+    if not POST_REPOSITORY_PROVIDERS['MYSQL_SAFE']().table_exists:
+        raise click.ClickException('the posts table does not exist yet')
+
+    # The named lock of the rotation must not stay on a pooled connection
+    with get_maintenance_connection() as conn:
+        partitions.partition_table(conn)
+        rotated = partitions.rotate(conn)
+        layout = partitions.partitions(conn)
+
+    if rotated is None:
+        raise click.ClickException('posts partitions are locked by another rotation')
+
+    created, dropped = rotated
+    for name in created:
+        click.echo(f'created {name}')
+    for name in dropped:
+        click.echo(f'dropped {name}')
+    for name, upper in layout:
+        click.echo(f'{name}: before {upper.isoformat() if upper is not None else "MAXVALUE"}')
+
+
+@click.command('explain-time-range')
+@click.argument('since', type=click.DateTime(['%Y-%m-%d']))
+@click.argument('until', type=click.DateTime(['%Y-%m-%d']))
+def explain_time_range(since: datetime, until: datetime):
+    """
+    Check that time_range only reads the partitions of its range
+    """
+    # The repositories are imported on first use
+    from infrastructure.repositories.posts import TIME_RANGE_SQL
+
+    since, until = since.date(), until.date()
+    with get_connection() as conn:
+        layout = partitions.partitions(conn)
+        with conn.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {TIME_RANGE_SQL}', dict(since=since, until=until))
+            row = cursor.fetchone()
+            read = row[cursor.column_names.index('partitions')]
+            cursor.fetchall()
+
+    if not layout:
+        raise click.ClickException('posts is not partitioned')
+
+    read = read.split(',') if read else []
+    expected = partitions.pruned(layout, since, until)
+    click.echo(f'read: {", ".join(read)}')
+    click.echo(f'expected: {", ".join(expected)}')
+
+    if read != expected:
+        raise click.ClickException(f'time_range reads {len(read):d} partitions instead of {len(expected):d}')
+
+
+@click.command('archive-posts')
+@click.option('--batch', default=1000, help='Posts moved by every transaction')
+def archive_posts(batch: int):
+    """
+    Move the posts older than POST_ARCHIVE_AGE_DAYS to the archive. Run it daily
+    """
+    if 'POST_ARCHIVE' not in current_app.config:
+        raise click.ClickException('the archive is disabled, set POST_ARCHIVE_AGE_DAYS with the MYSQL_SAFE provider')
+
+    before = date.today() - timedelta(days=ARCHIVE_AGE_DAYS)
+    start = perf_counter()
+    moved = current_app.config['POST_ARCHIVE'].archive(before, batch)
+    click.echo(f'archived {moved:d} posts created before {before.isoformat()} in {perf_counter() - start:.2f}s')
+
+
+@click.command('import-report')
+def import_report():
+    """
+    Show the import time of the modules loaded by the provider registries
+    """
+    timings = import_times()
+    for module_name, elapsed in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        click.echo(f'{module_name}: {elapsed * 1000:.2f}ms')
+
+    click.echo(f'total: {sum(timings.values()) * 1000:.2f}ms')
+
+
+def _check_writer(bus: InvalidationBus, store: SharedSlots, keys: int, writes: int, interval: float):
+    cache.publish_to(bus.publish)
+    random = Random(0)
+
+    for _ in range(writes):
+        key = random.randrange(keys)
+        version = store.update(key, lambda values: ((values[0] + 1,) + values[1:], values[0] + 1))
+        cache.invalidate('check', key)
+        # Only a change published before a worker polled has to be visible to it
+        store.update(key, lambda values: ((values[0], version, time()), None))
+        sleep(interval)
+
+
+def _check_reader(bus: InvalidationBus, store: SharedSlots, keys: int, duration: float, results):
+    entries = cache.named_cache('check', keys)
+    cache.listen('check')(entries.delete)
+    random = Random(os.getpid())
+    reads = stale = 0
+    worst = 0.0
+
+    deadline = time() + duration
+    while time() < deadline:
+        # Same order as a worker: apply the invalidations, then serve from the cache
+        started = time()
+        bus.poll()
+
+        key = random.randrange(keys)
+        version = entries.get(key)
+        if version is None:
+            version = store.read(key)[0]
+            entries.set(key, version)
+
+        _, published, published_at = store.read(key)
+        if version < published and published_at < started:
+            # Published before this read started and still served from the cache
+            stale += 1
+            worst = max(worst, started - published_at)
+        reads += 1
+
+    results.put((reads, stale, worst))
+
+
+@click.command('invalidation-check')
+@click.option('--workers', default=4, help='Reader processes')
+@click.option('--keys', default=64, help='Distinct cached keys')
+@click.option('--writes', default=2000, help='Updates published by the writer process')
+@click.option('--interval', default=0.001, help='Seconds between updates')
+@click.option('--log-size', default=4096, help='Entries of the invalidation log')
+def invalidation_check(workers: int, keys: int, writes: int, interval: float, log_size: int):
+    """
+    Run processes caching a shared store while another updates it, and fail if any served stale data
+    """
+    directory = tempfile.mkdtemp()
+    store = SharedSlots(os.path.join(directory, 'store'), keys, 3)
+    bus = InvalidationBus(SharedSlots(os.path.join(directory, 'log'), log_size + 1, 5))
+
+    context = get_context('fork')
+    results = context.Queue()
+    duration = writes * interval + 1
+
+    readers = [context.Process(target=_check_reader, args=(bus, store, keys, duration, results))
+               for _ in range(workers)]
+    writer = context.Process(target=_check_writer, args=(bus, store, keys, writes, interval))
+
+    for process in readers + [writer]:
+        process.start()
+
+    reads = stale = 0
+    worst = 0.0
+    for _ in readers:
+        process_reads, process_stale, process_worst = results.get()
+        reads, stale, worst = reads + process_reads, stale + process_stale, max(worst, process_worst)
+
+    for process in readers + [writer]:
+        process.join()
+
+    click.echo(f'{reads:d} reads, {stale:d} stale, worst staleness {worst * 1000:.3f}ms')
+    if stale:
+        raise click.ClickException('workers served data invalidated before their read started')
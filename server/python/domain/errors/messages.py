@@ -8,11 +8,13 @@ _MESSAGES = {
     _get_error_name(PATTERN_NOT_VALID): "field {0!s} does not match pattern {1!r}",
     _get_error_name(EMPTY): "field {0!s} can not be empty or null",
     _get_error_name(EQUALS): "field {0!s} not suffer change",
+    _get_error_name(UNKNOWN_FIELD): "field {0!s} does not exist",
     _get_error_name(INVALID_CREDENTIAL): "invalid credentials",
     _get_error_name(NOT_FOUND): "entity {0!s} with id {1!r} was not found",
     _get_error_name(ALREADY_EXISTS): "entity {0!s} with id {1!r} already exists",
     _get_error_name(PASSWORD_NOT_MATCH): "passwords must be match",
     _get_error_name(FORBIDDEN): "form is forbidden at the moment",
+    _get_error_name(TOO_MANY_ATTEMPTS): "too many failed attempts, try again in {0:d} seconds",
 }
 
 
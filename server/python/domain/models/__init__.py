@@ -1,6 +1,6 @@
 from __future__ import annotations
 import domain.errors as err
-from typing import Optional, Union, TypeVar, Generic
+from typing import Optional, Union, TypeVar, Generic, Set
 from abc import ABC, abstractmethod
 import re
 import datetime
@@ -52,6 +52,7 @@ class User(Exporter[dict]):
         # assert 4 <= len(user_name) <= 16, err.LENGTH_NOT_VALID.format(field='user_name', min=4, max=16)
         # assert _user_name_pattern.match(user_name) is not None, \
         #     err.PATTERN_NOT_VALID.format(field='user_name', pattern=_user_name_pattern.pattern)
+        self._track('user_name', user_name.upper())
         self._user_name = user_name.upper()
 
     @property
@@ -61,9 +62,21 @@ class User(Exporter[dict]):
     @full_name.setter
     def full_name(self, full_name: str) -> None:
         assert len(full_name) != 0, err.EMPTY.format(field='full_name')
+        self._track('full_name', full_name.lower())
         self._full_name = full_name.lower()
 
+    @property
+    def password(self) -> Optional[bytes]:
+        return self._password
+
+    @password.setter
+    def password(self, password: bytes) -> None:
+        self._track('password', password)
+        self._password = password
+
     def __init__(self, user_name: str, full_name: str, password: Optional[Union[str, bytes]] = None):
+        self._changes: Optional[Set[str]] = None
+        self._password = None
         self.user_name = user_name
         self.full_name = full_name
 
@@ -75,6 +88,20 @@ class User(Exporter[dict]):
                 assert 8 <= len(password), err.LENGTH_NOT_VALID.format(field='password', min=8, max=1000)
                 self.password = PasswordHasher.hash(password)
 
+        # Only changes after the construction are tracked
+        self._changes = set()
+
+    def _track(self, field: str, value) -> None:
+        if self._changes is not None and getattr(self, f'_{field}') != value:
+            self._changes.add(field)
+
+    def changes(self) -> Set[str]:
+        """
+        Fields set to a different value since the model was built
+        :return: Changed field names
+        """
+        return set(self._changes)
+
     @staticmethod
     def load(data: dict) -> User:
         return User(data['user_name'], data['full_name'])
@@ -124,7 +151,8 @@ class Post(Exporter[dict]):
 
     @title.setter
     def title(self, title: str) -> None:
-        assert 10 <= len(title) <= 150, err.LENGTH_NOT_VALID.format(field='title', min=10, max=150)
+        assert isinstance(title, str) and 10 <= len(title) <= 150, \
+            err.LENGTH_NOT_VALID.format(field='title', min=10, max=150)
         self._title = title
 
     @property
@@ -145,16 +173,40 @@ class Post(Exporter[dict]):
 
     @content.setter
     def content(self, content: str) -> None:
-        assert content is None or len(content) != 0, err.EMPTY.format(field='content')
+        assert content is None or isinstance(content, str) and len(content) != 0, err.EMPTY.format(field='content')
         self._content = content
 
+    @property
+    def content_length(self) -> int:
+        """
+        Length of the whole content, longer than ``content`` when the post was loaded with an excerpt
+        """
+        if self._content_length is not None:
+            return self._content_length
+        return len(self.content) if self.content is not None else 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.content is not None and len(self.content) < self.content_length
+
     def __init__(self, title: str, user_name: str, content: Optional[str] = None, _id: Optional[int] = None,
-                 date: Optional[datetime.date] = None):
+                 date: Optional[datetime.date] = None, content_length: Optional[int] = None):
         self.date = date
         self.id = _id
         self.title = title
         self.user_name = user_name
         self.content = content
+        self._content_length = content_length
+
+    def excerpt(self, length: int) -> Post:
+        """
+        Copy of the post with the first characters of its content only
+        :param length: Characters of the content to keep
+        :return: Post loaded with an excerpt
+        """
+        content = self.content[:length] if self.content is not None else None
+        return Post(title=self.title, user_name=self.user_name, content=content, _id=self.id, date=self.date,
+                    content_length=self.content_length)
 
     def export(self) -> dict:
         return dict(title=self.title, user_name=self.user_name, content=self.content)
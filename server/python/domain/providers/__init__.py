@@ -129,6 +129,26 @@ class FormSecurityProvider(ABC):
 
         raise NotImplementedError()
 
+    @classmethod
+    async def validate_async(cls, code: str) -> bool:
+        """
+        Validate de security code without blocking the event loop
+        :param code: Retrieved code
+        :return: Validation result
+        """
+        if cls._form_security_provider is None:
+            raise NotImplementedError()
+
+        return await cls._form_security_provider.do_validate_async(code)
+
+    async def do_validate_async(self, code: str) -> bool:
+        """
+        Implementation of ``FormSecurityProvider.validate_async``, providers waiting on the network override it
+        :param code: Retrieved code
+        :return: Validation result
+        """
+        return self.do_validate(code)
+
     @classmethod
     def get_target_key(cls) -> str:
         """
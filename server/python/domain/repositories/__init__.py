@@ -51,3 +51,90 @@ class PostRepository(Repository[Post], ABC):
     @abstractmethod
     def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
         raise NotImplementedError()
+
+    @abstractmethod
+    def page(self, limit: int, before: Optional[Tuple[date, int]] = None) -> List[Post]:
+        """
+        Posts of the feed following a known one, newest first
+        :param limit: Maximum posts to return
+        :param before: Creation date and id of the last post of the previous page, None for the first page
+        :return: Posts with their creation date, possibly with an excerpt of their content only
+        """
+        raise NotImplementedError()
+
+
+class PostArchiveRepository(ABC):
+    """
+    Posts moved out of the post repository once they are old, still readable by id and creation date
+    """
+
+    @abstractmethod
+    def archive(self, before: date, batch: int = 1000) -> int:
+        """
+        Move the posts created before a day from the post repository
+        :param before: First day of the posts to keep
+        :param batch: Posts moved by every transaction
+        :return: Moved posts
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def by_id(self, _id: int) -> Post:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
+        raise NotImplementedError()
+
+
+class AsyncRepository(Generic[T], ABC):
+    """
+    Generic repositories accessor interface for asyncio applications
+    """
+
+    @abstractmethod
+    async def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[T]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def by_id(self, _id: int) -> T:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def create(self, model: T) -> int:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def update(self, _id: int, model: T):
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def delete(self, _id: int):
+        raise NotImplementedError()
+
+
+class AsyncUserRepository(AsyncRepository[User], ABC):
+    @abstractmethod
+    async def by_login(self, user_name: str, password: str) -> Tuple[User, int]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def by_user_id(self, user_name: str) -> User:
+        raise NotImplementedError()
+
+
+class AsyncPostRepository(AsyncRepository[Post], ABC):
+    @abstractmethod
+    async def filter(self, user_name: Optional[str] = None, title: Optional[str] = None) -> List[Post]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def page(self, limit: int, before: Optional[Tuple[date, int]] = None) -> List[Post]:
+        """
+        Posts of the feed following a known one, newest first, see ``PostRepository.page``
+        """
+        raise NotImplementedError()
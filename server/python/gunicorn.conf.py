@@ -1,10 +1,111 @@
+"""
+Gunicorn configuration
+
+``GUNICORN_WORKER_MODE`` selects how every worker serves requests:
+
+* ``sync``: one request at a time, a slow query or Turnstile call blocks the worker
+* ``gthread``: ``GUNICORN_THREADS`` requests at a time on a thread pool
+* ``gevent``: up to ``GUNICORN_WORKER_CONNECTIONS`` cooperative requests, requires ``gevent`` to be installed
+
+The MySQL pool of every worker (``DB_POOL_SIZE``) is sized to the concurrency of the mode unless it is set
+explicitly, and the concurrency is capped to the pool, at most 32 connections: mysql.connector raises ``PoolError``
+on an exhausted pool instead of waiting, so a worker serving more requests than it has connections fails the extra
+ones with a 500. The pool is created lazily, the ``post_fork`` hook drops any pool inherited from the master when
+``preload_app`` is enabled.
+
+The default is ``gthread`` with 4 threads. Measured with ``attacks/ddos/loadtest.py -c 32 --duration 15 --warmup 3``
+against ``GET /users/login`` on ``GUNICORN_WORKERS=2`` (a single CPU, no database reachable, so the requests only
+render the login form and the numbers compare the per-request overhead of the modes, not waits on MySQL)::
+
+    mode                      req/s    p50 ms    p99 ms
+    sync                       37.4     803      1014
+    gthread (8 threads)        52.4     573      1114
+    gthread (4 threads)        47.1     819      1327
+    gevent (100 connections)   41.6     762      1098
+
+``gthread`` serves the most requests and overlaps the waits on MySQL and Turnstile, which ``sync`` cannot. ``gevent``
+overlaps more waits but patches the standard library. Without a database these numbers hide the failures of an
+exhausted pool: the gevent run served 100 connections per worker, and against MySQL every request past the 32nd
+pooled connection would have failed, which is why the connections are now capped to the pool. Re-run the
+comparison against a deployment with a database, for example::
+
+    GUNICORN_WORKER_MODE=sync gunicorn
+    GUNICORN_WORKER_MODE=gthread GUNICORN_THREADS=8 gunicorn
+    GUNICORN_WORKER_MODE=gevent GUNICORN_WORKER_CONNECTIONS=100 gunicorn
+
+driving each one with ``attacks/ddos/loadtest.py`` against ``/posts/`` and ``/users/login``.
+"""
 from dotenv import load_dotenv
+import sys
 import os
 
 load_dotenv()
 
+from infrastructure.utils.metrics import metrics
+
+_WORKER_MODES = ('sync', 'gthread', 'gevent')
+
+# mysql.connector does not allow pools bigger than this
+_MAX_POOL_SIZE = 32
+
+worker_mode = os.environ.get('GUNICORN_WORKER_MODE', 'gthread')
+assert worker_mode in _WORKER_MODES, f'unknown worker mode: {worker_mode}'
+
 wsgi_app = 'main:app'
 
 bind = os.environ.get('GUNICORN_BIND', 'unix:/run/app.sock')
-workers = os.environ.get('GUNICORN_WORKERS', 4)
-timeout = os.environ.get('GUNICORN_TIMEOUT', 30)
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+worker_class = worker_mode
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_mode == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+if worker_mode == 'gevent':
+    _concurrency = worker_connections
+else:
+    _concurrency = threads
+
+os.environ.setdefault('DB_POOL_SIZE', str(min(_concurrency, _MAX_POOL_SIZE)))
+
+# An exhausted pool raises instead of waiting, a worker never serves more requests at once than it has connections
+_pool_size = int(os.environ['DB_POOL_SIZE'])
+if worker_mode == 'gevent':
+    worker_connections = min(worker_connections, _pool_size)
+elif worker_mode == 'gthread':
+    threads = min(threads, _pool_size)
+
+
+def on_starting(server):
+    """
+    Remove the metrics of a previous run, their process ids may be reused
+    """
+    metrics.clear()
+
+
+def child_exit(server, worker):
+    """
+    Keep the counters of a finished worker
+    """
+    metrics.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    """
+    Rotate the monthly partitions of the posts from the worker, the rotations of the workers run one at a time
+    """
+    from infrastructure.utils import partitions
+
+    if partitions.ENABLED:
+        partitions.start_rotation()
+
+
+def post_fork(server, worker):
+    """
+    Drop the database pool inherited from the master, its sockets can not be shared between processes
+    """
+    if 'infrastructure.utils.mysql' in sys.modules:
+        sys.modules['infrastructure.utils.mysql'].reset_pool()
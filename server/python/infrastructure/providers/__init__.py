@@ -0,0 +1,14 @@
+from infrastructure.utils.registry import LazyRegistry
+
+PASSWORD_HASHER_PROVIDERS = LazyRegistry({
+    'NULL': 'infrastructure.providers.password:NullPasswordHasher',
+    'MD5': 'infrastructure.providers.password:MD5PasswordHasher',
+    'SALT_SHA512': 'infrastructure.providers.password:SaltSHA512PasswordHasher',
+})
+
+FORM_SECURITY_PROVIDERS = LazyRegistry({
+    'NULL': 'infrastructure.providers.form_security:NullFormSecurityProvider',
+    'CSRF': 'infrastructure.providers.form_security:CSFRFormSecurityProvider',
+    'JWT_HEADLESS': 'infrastructure.providers.form_security:HeadlessJWTFormSecurityProvider',
+    'CF_TURNSTILE': 'infrastructure.providers.form_security:TurnStileFormSecurityProvider.from_env',
+})
@@ -1,3 +1,4 @@
+from __future__ import annotations
 import datetime
 from typing import Union, Literal
 
@@ -5,15 +6,6 @@ from flask import session, current_app, request
 from domain.providers import FormSecurityProvider
 from infrastructure.utils import create_salt
 from os import environ as env
-import jwt
-import httpx
-
-FORM_SECURITY_PROVIDERS = {
-    'NULL': lambda: NullFormSecurityProvider(),
-    'CSRF': lambda: CSFRFormSecurityProvider(),
-    'JWT_HEADLESS': lambda: HeadlessJWTFormSecurityProvider(),
-    'CF_TURNSTILE': lambda: TurnStileFormSecurityProvider(env['CF_TURNSTILE_KEY'], env['CF_TURNSTILE_SECRET']),
-}
 
 
 class NullFormSecurityProvider(FormSecurityProvider):
@@ -72,6 +64,8 @@ class HeadlessJWTFormSecurityProvider(FormSecurityProvider):
         return (datetime.datetime.utcnow() + datetime.timedelta(minutes=15)).timestamp()
 
     def do_inject(self, ret_type: Union[Literal['input'], Literal['code']]) -> str:
+        import jwt
+
         token = jwt.encode(
             self._create_payload(),
             current_app.secret_key,
@@ -86,6 +80,8 @@ class HeadlessJWTFormSecurityProvider(FormSecurityProvider):
         return token
 
     def do_validate(self, code: str) -> bool:
+        import jwt
+
         if self.target_key in session:
             try:
                 payload = jwt.decode(code, current_app.secret_key, algorithms=['HS256'], verify=True)
@@ -110,6 +106,10 @@ class TurnStileFormSecurityProvider(FormSecurityProvider):
         self.api_key = api_key
         self.secret_key = secret_key
 
+    @classmethod
+    def from_env(cls) -> TurnStileFormSecurityProvider:
+        return cls(env['CF_TURNSTILE_KEY'], env['CF_TURNSTILE_SECRET'])
+
     target_key = 'cf-turnstile-response'
 
     def do_inject(self, ret_type: Union[Literal['input'], Literal['code']]) -> str:
@@ -119,9 +119,22 @@ class TurnStileFormSecurityProvider(FormSecurityProvider):
         '''
 
     def do_validate(self, code: str) -> bool:
+        import httpx
+
         response = httpx.post('https://challenges.cloudflare.com/turnstile/v0/siteverify', json={
             'secret': self.secret_key,
             'response': code,
         }).json()
 
         return response.get('success', False)
+
+    async def do_validate_async(self, code: str) -> bool:
+        import httpx
+
+        async with httpx.AsyncClient() as client:
+            response = (await client.post('https://challenges.cloudflare.com/turnstile/v0/siteverify', json={
+                'secret': self.secret_key,
+                'response': code,
+            })).json()
+
+        return response.get('success', False)
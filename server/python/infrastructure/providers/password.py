@@ -4,12 +4,6 @@ from hashlib import md5, sha512
 
 from infrastructure.utils import create_salt
 
-PASSWORD_HASHER_PROVIDERS = {
-    'NULL': lambda: NullPasswordHasher(),
-    'MD5': lambda: MD5PasswordHasher(),
-    'SALT_SHA512': lambda: SaltSHA512PasswordHasher(),
-}
-
 
 class NullPasswordHasher(PasswordHasher):
     """
@@ -1,6 +1,36 @@
 from abc import ABC, abstractmethod
+from os import environ as env
 from typing import Callable
 from functools import wraps
+from infrastructure.utils.registry import LazyRegistry
+
+# Characters of the content loaded by the feed queries, the whole content is only loaded by ``by_id``
+EXCERPT_LENGTH = int(env.get('POST_EXCERPT_LENGTH', '280'))
+# Days of posts kept in ``posts`` by the archival job, 0 disables the archive
+ARCHIVE_AGE_DAYS = int(env.get('POST_ARCHIVE_AGE_DAYS', '0'))
+
+USER_REPOSITORY_PROVIDERS = LazyRegistry({
+    'MYSQL_UNSAFE': 'infrastructure.repositories.users_unsafe:MysqlUnsafeRepository',
+    'MYSQL_SAFE': 'infrastructure.repositories.users:MysqlRepository',
+})
+
+POST_REPOSITORY_PROVIDERS = LazyRegistry({
+    'MYSQL_UNSAFE': 'infrastructure.repositories.posts_unsafe:MysqlUnsafeRepository',
+    'MYSQL_SAFE': 'infrastructure.repositories.posts:MysqlRepository',
+})
+
+# The ASGI application serves what these registries miss with the WSGI application
+ASYNC_USER_REPOSITORY_PROVIDERS = LazyRegistry({
+    'MYSQL_SAFE': 'infrastructure.repositories.aio:MysqlUserRepository',
+})
+
+ASYNC_POST_REPOSITORY_PROVIDERS = LazyRegistry({
+    'MYSQL_SAFE': 'infrastructure.repositories.aio:MysqlPostRepository',
+})
+
+POST_ARCHIVE_PROVIDERS = LazyRegistry({
+    'MYSQL_SAFE': 'infrastructure.repositories.archive:MysqlArchiveRepository',
+})
 
 
 class TableUnsafeEnsure(ABC):
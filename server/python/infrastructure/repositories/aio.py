@@ -0,0 +1,284 @@
+from __future__ import annotations
+from typing import Optional, List, Tuple
+from datetime import date, timedelta
+from mysql.connector import errors
+from domain.repositories import AsyncUserRepository, AsyncPostRepository
+from domain.models import User, Post
+import domain.errors as err
+from infrastructure.repositories import ARCHIVE_AGE_DAYS
+from infrastructure.repositories.archived import record_read
+from infrastructure.repositories.common import _COLUMNS, _EXCERPT, _changed_fields, _raise_duplicate
+from infrastructure.utils.cache import invalidate
+from infrastructure.utils.mysql_async import get_async_pool
+
+
+class MysqlUserRepository(AsyncUserRepository):
+    """
+    Users of ``users.MysqlRepository`` for asyncio applications, the table must exist
+    """
+
+    async def by_login(self, user_name: str, password: str) -> Tuple[User, int]:
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute('''
+                    SELECT `USER_NAME`, `FULL_NAME`, `PASSWORD`, `ID`
+                        FROM `users`
+                    WHERE `USER_NAME` = %(user_name)s
+                        LIMIT 1
+                ''', dict(user_name=user_name))
+
+                data = await cursor.fetchone()
+
+        if data is None:
+            raise AssertionError(err.INVALID_CREDENTIAL)
+
+        user = User(user_name=data[0], full_name=data[1], password=bytes(data[2]))
+        assert user.verify_password(password), err.INVALID_CREDENTIAL
+
+        return user, data[3]
+
+    async def by_user_id(self, user_name: str) -> User:
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute('''
+                    SELECT `USER_NAME`, `FULL_NAME`
+                        FROM `users`
+                    WHERE `USER_NAME` = %(user_name)s
+                        LIMIT 1
+                ''', dict(user_name=user_name))
+
+                data = await cursor.fetchone()
+
+        assert data is not None, err.NOT_FOUND.format(model='user', id=user_name)
+        return User(user_name=data[0], full_name=data[1])
+
+    async def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[User]:
+        sql = '''
+            SELECT `USER_NAME`, `FULL_NAME`
+                FROM `users`
+        '''
+        params = dict()
+
+        if limit is not None:
+            sql += ' LIMIT %(limit)s OFFSET %(offset)s'
+            params = dict(limit=limit, offset=offset or 0)
+
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                data = await cursor.fetchall()
+
+        return [User(user_name=row[0], full_name=row[1]) for row in data]
+
+    async def by_id(self, _id: int) -> User:
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute('''
+                    SELECT `USER_NAME`, `FULL_NAME`
+                        FROM `users`
+                    WHERE `ID` = %(id)s
+                        LIMIT 1
+                ''', dict(id=_id))
+
+                data = await cursor.fetchone()
+
+        assert data is not None, err.NOT_FOUND.format(model='user', id=_id)
+        return User(user_name=data[0], full_name=data[1])
+
+    async def create(self, model: User) -> int:
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                try:
+                    await cursor.execute('''
+                    INSERT INTO `users` (`USER_NAME`, `FULL_NAME`, `PASSWORD`)
+                        VALUES (%(user_name)s, %(full_name)s, %(password)s)
+                    ''', dict(
+                        user_name=model.user_name,
+                        full_name=model.full_name,
+                        password=model.password,
+                    ))
+                except errors.IntegrityError as error:
+                    _raise_duplicate(error, model)
+
+                return cursor.lastrowid
+
+    async def update(self, _id: int, model: User):
+        values = dict(user_name=model.user_name, full_name=model.full_name, password=model.password)
+        fields = [field for field in _changed_fields(model) if values[field] is not None]
+
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                # Column names come from _COLUMNS, never from the model
+                await cursor.execute('''
+                    UPDATE `users`
+                        SET {values!s}
+                        WHERE `ID` = %(id)s LIMIT 1
+                '''.format(values=', '.join(f'`{_COLUMNS[field]}` = %({field})s' for field in fields)),
+                    dict(values, id=_id))
+
+                # Matched rows, the connections use the FOUND_ROWS flag
+                assert cursor.rowcount != 0, err.NOT_FOUND.format(model='user', id=_id)
+
+        invalidate('users', _id)
+
+    async def delete(self, _id: int):
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute('''
+                    DELETE FROM `users`
+                        WHERE `ID` = %(id)s LIMIT 1''', dict(id=_id))
+
+                assert cursor.rowcount != 0, err.NOT_FOUND.format(model='user', id=_id)
+
+        invalidate('users', _id)
+
+
+class MysqlPostRepository(AsyncPostRepository):
+    """
+    Posts of ``posts.MysqlRepository`` for asyncio applications, the table must exist
+    """
+
+    async def _select(self, sql: str, params: dict) -> List[Post]:
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                data = await cursor.fetchall()
+
+        # Feed queries select the length of the content before the date
+        return [
+            Post(title=row[0], user_name=row[1], content=row[2], _id=row[3], date=row[5], content_length=row[4])
+            if len(row) == 6 else Post(title=row[0], user_name=row[1], content=row[2], _id=row[3], date=row[4])
+            for row in data
+        ]
+
+    async def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[Post]:
+        sql = '''
+            SELECT `TITLE`, `USER_NAME`, {excerpt!s}, `CREATION_DATE`
+                FROM `posts`
+            ORDER BY `CREATION_DATE` DESC, `ID` DESC
+        '''.format(excerpt=_EXCERPT)
+        params = dict()
+
+        if limit is not None:
+            sql += ' LIMIT %(limit)s OFFSET %(offset)s'
+            params = dict(limit=limit, offset=offset or 0)
+
+        return await self._select(sql, params)
+
+    async def page(self, limit: int, before: Optional[Tuple[date, int]] = None) -> List[Post]:
+        if before is None:
+            return await self._select('''
+                SELECT `TITLE`, `USER_NAME`, {excerpt!s}, `CREATION_DATE`
+                    FROM `posts`
+                ORDER BY `CREATION_DATE` DESC, `ID` DESC
+                    LIMIT %(limit)s
+            '''.format(excerpt=_EXCERPT), dict(limit=limit))
+
+        return await self._select('''
+            SELECT `TITLE`, `USER_NAME`, {excerpt!s}, `CREATION_DATE`
+                FROM `posts`
+            WHERE `CREATION_DATE` < %(date)s OR (`CREATION_DATE` = %(date)s AND `ID` < %(id)s)
+            ORDER BY `CREATION_DATE` DESC, `ID` DESC
+                LIMIT %(limit)s
+        '''.format(excerpt=_EXCERPT), dict(date=before[0], id=before[1], limit=limit))
+
+    async def by_id(self, _id: int) -> Post:
+        posts = await self._select('''
+            SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
+                FROM `posts`
+            WHERE `ID` = %(id)s
+        ''', dict(id=_id))
+
+        if ARCHIVE_AGE_DAYS > 0:
+            # Like archived.ArchivedPostRepository
+            if posts:
+                record_read('by_id', 'hot')
+            else:
+                posts = await self._select('''
+                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
+                        FROM `posts_archive`
+                    WHERE `ID` = %(id)s
+                ''', dict(id=_id))
+                record_read('by_id', 'hit' if posts else 'miss')
+
+        assert len(posts) != 0, err.NOT_FOUND.format(model='post', id=_id)
+        return posts[0]
+
+    async def create(self, model: Post) -> int:
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute('''
+                INSERT INTO `posts` (`TITLE`, `USER_NAME`, `CONTENT`)
+                    VALUES (%(title)s, %(user_name)s, %(content)s)
+                ''', dict(
+                    title=model.title,
+                    user_name=model.user_name,
+                    content=model.content,
+                ))
+
+                _id = cursor.lastrowid
+
+        invalidate('posts', _id)
+        return _id
+
+    async def update(self, _id: int, model: Post):
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute('''
+                    UPDATE `posts`
+                        SET `TITLE` = %(title)s, `CONTENT` = %(content)s
+                        WHERE `ID` = %(id)s
+                ''', dict(
+                    title=model.title,
+                    content=model.content,
+                    id=_id,
+                ))
+
+                assert cursor.rowcount != 0, err.NOT_FOUND.format(model='post', id=_id)
+
+        invalidate('posts', _id)
+
+    async def delete(self, _id: int):
+        async with get_async_pool().connection() as conn:
+            async with await conn.cursor() as cursor:
+                await cursor.execute('''
+                    DELETE FROM `posts`
+                        WHERE `ID` = %(id)s''', dict(id=_id))
+
+                assert cursor.rowcount != 0, err.NOT_FOUND.format(model='post', id=_id)
+
+        invalidate('posts', _id)
+
+    async def filter(self, user_name: Optional[str] = None, title: Optional[str] = None) -> List[Post]:
+        title = f'%{title}%' if title is not None else '%%'
+        user_name = f'%{user_name}%' if user_name is not None else '%%'
+
+        return await self._select('''
+            SELECT `TITLE`, `USER_NAME`, {excerpt!s}, `CREATION_DATE`
+                FROM `posts`
+            WHERE `TITLE` LIKE %(title)s OR `USER_NAME` LIKE %(user_name)s
+            ORDER BY `CREATION_DATE` DESC, `ID` DESC
+        '''.format(excerpt=_EXCERPT), dict(title=title, user_name=user_name))
+
+    async def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
+        params = dict(since=since or date.min, until=until or date.max)
+        posts = await self._select('''
+            SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
+                FROM `posts`
+            WHERE `CREATION_DATE` BETWEEN %(since)s AND %(until)s
+        ''', params)
+
+        if ARCHIVE_AGE_DAYS > 0:
+            if since is not None and since >= date.today() - timedelta(days=ARCHIVE_AGE_DAYS):
+                record_read('time_range', 'hot')
+            else:
+                seen = {post.id for post in posts}
+                archived = [post for post in await self._select('''
+                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
+                        FROM `posts_archive`
+                    WHERE `CREATION_DATE` BETWEEN %(since)s AND %(until)s
+                ''', params) if post.id not in seen]
+                record_read('time_range', 'hit' if archived else 'miss')
+                posts += archived
+
+        return posts
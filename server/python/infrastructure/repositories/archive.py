@@ -0,0 +1,138 @@
+from __future__ import annotations
+from typing import Optional, List
+from datetime import date
+from infrastructure.utils.mysql import get_connection as get_mysql_connection, \
+    get_read_connection as get_mysql_read_connection, get_schema
+from mysql.connector.pooling import PooledMySQLConnection
+from mysql.connector.cursor import CursorBase
+from domain.repositories import PostArchiveRepository
+from domain.models import Post
+import domain.errors as err
+from infrastructure.repositories import TableEnsure
+from infrastructure.utils.cache import reset_everywhere
+
+BY_ID_SQL = '''
+    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
+        FROM `posts_archive`
+    WHERE `ID` = %s
+'''
+
+
+class MysqlArchiveRepository(PostArchiveRepository, TableEnsure):
+    """
+    Archive of the old posts in ``posts_archive``, with compressed pages: the archived posts are rarely read and
+    never changed, and ``posts`` keeps the recent ones only, with a working set and a feed index that fit in memory
+    """
+
+    @TableEnsure.ensure_table_exists
+    def archive(self, before: date, batch: int = 1000) -> int:
+        moved = 0
+
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+
+                while True:
+                    # The bound on the creation date spares the other partitions of a partitioned table
+                    cursor.execute('''
+                        SELECT `ID`
+                            FROM `posts`
+                        WHERE `CREATION_DATE` < %s
+                        ORDER BY `CREATION_DATE`, `ID`
+                            LIMIT %s
+                        FOR UPDATE
+                    ''', (before, batch))
+                    ids = [row[0] for row in cursor.fetchall()]
+                    if not ids:
+                        conn.commit()
+                        if moved:
+                            # The feeds of every worker may still hold the moved posts
+                            reset_everywhere()
+                        return moved
+
+                    placeholders = ', '.join(['%s'] * len(ids))
+                    cursor.execute(f'''
+                        INSERT INTO `posts_archive` (`ID`, `TITLE`, `USER_NAME`, `CONTENT`, `CREATION_DATE`)
+                            SELECT `ID`, `TITLE`, `USER_NAME`, `CONTENT`, `CREATION_DATE`
+                                FROM `posts`
+                            WHERE `CREATION_DATE` < %s AND `ID` IN ({placeholders})
+                    ''', (before, *ids))
+                    cursor.execute(f'''
+                        DELETE FROM `posts`
+                            WHERE `CREATION_DATE` < %s AND `ID` IN ({placeholders})
+                    ''', (before, *ids))
+
+                    # Readers see a post in one of the tables, never in none
+                    conn.commit()
+                    moved += len(ids)
+
+    @TableEnsure.ensure_table_exists
+    def by_id(self, _id: int) -> Post:
+        with self.__read_connection as conn:
+            with conn.cursor(prepared=True) as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute(BY_ID_SQL, (_id,))
+
+                data = cursor.fetchone()
+                if data is None:
+                    raise AssertionError(err.NOT_FOUND.format(model='post', id=_id))
+
+                return Post(title=data[0], user_name=data[1], content=data[2], _id=data[3], date=data[4])
+
+    @TableEnsure.ensure_table_exists
+    def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
+        with self.__read_connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
+                        FROM `posts_archive`
+                    WHERE `CREATION_DATE` BETWEEN %(since)s AND %(until)s
+                ''', dict(since=since or date.min, until=until or date.max))
+
+                data = cursor.fetchall()
+                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3]) for row in data]
+
+    @property
+    def __connection(self) -> PooledMySQLConnection:
+        return get_mysql_connection()
+
+    @property
+    def __read_connection(self) -> PooledMySQLConnection:
+        return get_mysql_read_connection()
+
+    @property
+    def table_exists(self) -> bool:
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    SELECT
+                        COUNT(*)
+                    FROM `information_schema`.`TABLES`
+                        WHERE `TABLE_SCHEMA` = %(schema)s
+                          AND `TABLE_NAME` = %(table)s
+                ''', dict(schema=get_schema(), table='posts_archive'))
+
+                return cursor.fetchone()[0] > 0
+
+    def create_table(self):
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    CREATE TABLE `posts_archive` (
+                        `ID` INT NOT NULL PRIMARY KEY,
+                        `TITLE` VARCHAR(150) NOT NULL,
+                        `USER_NAME` VARCHAR(16) NOT NULL,
+                        `CONTENT` TEXT NULL,
+                        `CREATION_DATE` DATE NOT NULL,
+
+                        KEY `CREATION_DATE` (`CREATION_DATE`),
+                        FOREIGN KEY (`USER_NAME`) REFERENCES `users` (`USER_NAME`)
+                            ON DELETE CASCADE
+                            ON UPDATE CASCADE
+                    ) ROW_FORMAT=COMPRESSED;
+                ''')
+
+                conn.commit()
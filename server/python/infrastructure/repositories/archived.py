@@ -0,0 +1,84 @@
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Optional, List, Tuple
+from domain.repositories import PostRepository, PostArchiveRepository
+from domain.models import Post
+import domain.errors as err
+from infrastructure.utils.metrics import metrics
+
+metrics.describe('post_archive_reads_total', 'counter',
+                 'Post reads by method and result: hot when served without the archive, archive hit or miss')
+
+
+def record_read(method: str, result: str):
+    """
+    Count a read of the archived post repository
+    :param method: Repository method
+    :param result: ``hot``, ``hit`` or ``miss``
+    """
+    metrics.inc('post_archive_reads_total', (('method', method), ('result', result)))
+
+
+class ArchivedPostRepository(PostRepository):
+    """
+    Post repository reading the archive for the posts it no longer has
+
+    ``by_id`` reads the archive when the post is not found, and ``time_range`` when the range starts before
+    ``age_days`` ago, the newest posts the archival job may have moved. The other methods only see the recent posts.
+    A post being archived is read from ``posts`` before the archive, so it is always found in one of them.
+    """
+
+    def __init__(self, repository: PostRepository, archive: PostArchiveRepository, age_days: int):
+        self._repository = repository
+        self._archive = archive
+        self._age = timedelta(days=age_days)
+
+    def by_id(self, _id: int) -> Post:
+        try:
+            post = self._repository.by_id(_id)
+        except AssertionError as error:
+            if error.args[0] != err.NOT_FOUND.format(model='post', id=_id):
+                raise
+        else:
+            record_read('by_id', 'hot')
+            return post
+
+        try:
+            post = self._archive.by_id(_id)
+        except AssertionError:
+            record_read('by_id', 'miss')
+            raise
+
+        record_read('by_id', 'hit')
+        return post
+
+    def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
+        posts = self._repository.time_range(since, until)
+        if since is not None and since >= date.today() - self._age:
+            record_read('time_range', 'hot')
+            return posts
+
+        # Posts moved between both reads are in both
+        seen = {post.id for post in posts}
+        archived = [post for post in self._archive.time_range(since, until) if post.id not in seen]
+        record_read('time_range', 'hit' if archived else 'miss')
+
+        return posts + archived
+
+    def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[Post]:
+        return self._repository.list(limit, offset)
+
+    def create(self, model: Post) -> int:
+        return self._repository.create(model)
+
+    def update(self, _id: int, model: Post):
+        self._repository.update(_id, model)
+
+    def delete(self, _id: int):
+        self._repository.delete(_id)
+
+    def filter(self, user_name: Optional[str] = None, title: Optional[str] = None) -> List[Post]:
+        return self._repository.filter(user_name, title)
+
+    def page(self, limit: int, before: Optional[Tuple[date, int]] = None) -> List[Post]:
+        return self._repository.page(limit, before)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+from typing import Optional, List, Tuple, Callable, Hashable
+from domain.repositories import UserRepository
+from domain.models import User
+from infrastructure.utils.cache import LRUCache, SingleFlight, named_cache, listen
+
+
+class CachedUserRepository(UserRepository):
+    """
+    Read-through cache of ``by_id`` and ``by_user_id`` in front of another user repository
+
+    Entries are dropped on every ``users`` invalidation, which the repositories publish on update and delete
+    """
+
+    def __init__(self, repository: UserRepository, max_size: int = 4096, ttl: float = 30.0):
+        self._repository = repository
+        self._by_id = named_cache('users_by_id', max_size, ttl)
+        self._by_name = named_cache('users_by_name', max_size, ttl)
+        self._flight = SingleFlight()
+        self._generation = 0
+
+        listen('users')(self._invalidate)
+
+    def _invalidate(self, _id: int):
+        self._generation += 1
+
+        user = self._by_id.pop(_id)
+        if user is not None:
+            self._by_name.delete(user.user_name)
+        else:
+            # The previous user name is unknown, it may be cached
+            self._by_name.clear()
+
+    def _load(self, cache: LRUCache, key: Hashable, fx: Callable[[], User]) -> User:
+        user = cache.get(key)
+        if user is None:
+            def load() -> User:
+                generation = self._generation
+                loaded = fx()
+                # Do not cache a value read before a concurrent invalidation
+                if generation == self._generation:
+                    cache.set(key, loaded)
+                return loaded
+
+            user = self._flight.do((id(cache), key), load)
+
+        # Callers may change the model, never share the cached instance
+        return User.load(user.export())
+
+    def by_id(self, _id: int) -> User:
+        return self._load(self._by_id, _id, lambda: self._repository.by_id(_id))
+
+    def by_user_id(self, user_name: str) -> User:
+        return self._load(self._by_name, user_name.upper(), lambda: self._repository.by_user_id(user_name))
+
+    def by_login(self, user_name: str, password: str) -> Tuple[User, int]:
+        return self._repository.by_login(user_name, password)
+
+    def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[User]:
+        return self._repository.list(limit, offset)
+
+    def create(self, model: User) -> int:
+        return self._repository.create(model)
+
+    def update(self, _id: int, model: User):
+        self._repository.update(_id, model)
+
+    def delete(self, _id: int):
+        self._repository.delete(_id)
@@ -0,0 +1,37 @@
+"""
+Helpers shared by the safe and the unsafe MySQL repositories, which live in their own modules so only the selected
+one is imported
+"""
+from typing import List
+from mysql.connector import errors, errorcode
+from domain.models import User
+import domain.errors as err
+from infrastructure.repositories import EXCERPT_LENGTH
+
+
+_COLUMNS = dict(user_name='USER_NAME', full_name='FULL_NAME', password='PASSWORD')
+
+
+def _changed_fields(model: User) -> List[str]:
+    """
+    Fields to write on an update, every field when the model was not changed since it was built
+    :param model: User to write
+    :return: Field names
+    """
+    changes = model.changes()
+    return [field for field in _COLUMNS if field in changes or not changes]
+
+
+def _raise_duplicate(error: errors.IntegrityError, model: User):
+    """
+    Map a duplicate user name, rejected by the unique key of ``USER_NAME``, to ``ALREADY_EXISTS``
+    :param error: Error of the insert
+    :param model: Inserted user
+    """
+    if error.errno == errorcode.ER_DUP_ENTRY:
+        raise AssertionError(err.ALREADY_EXISTS.format(model='user', id=model.user_name)) from error
+    raise error
+
+
+# Feeds only transfer and render an excerpt of the content, with its length to tell whether there is more
+_EXCERPT = 'LEFT(`CONTENT`, {length:d}), `ID`, CHAR_LENGTH(`CONTENT`)'.format(length=EXCERPT_LENGTH)
@@ -1,211 +1,73 @@
 from __future__ import annotations
-from typing import Optional, List
-from infrastructure.utils.mysql import get_pool as get_mysql_pool, get_schema
+from typing import Optional, List, Tuple
+from infrastructure.utils.mysql import get_connection as get_mysql_connection, \
+    get_read_connection as get_mysql_read_connection, get_schema
 from mysql.connector.pooling import PooledMySQLConnection
 from mysql.connector.cursor import CursorBase
 from domain.repositories import PostRepository, T
 from domain.models import Post
 from datetime import date
 import domain.errors as err
-from infrastructure.repositories import TableUnsafeEnsure, TableEnsure
-
-
-class MysqlUnsafeRepository(PostRepository, TableUnsafeEnsure):
-    TABLE_NAME = 'posts'
-
-    @property
-    def __connection(self) -> PooledMySQLConnection:
-        return get_mysql_pool().get_connection()
-
-    @property
-    def table_exists(self) -> bool:
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                    SELECT
-                        COUNT(*)
-                    FROM `information_schema`.`TABLES`
-                        WHERE `TABLE_SCHEMA` = '{schema!s}'
-                          AND `TABLE_NAME` = '{table!s}'
-                '''.format(schema=get_schema(), table=self.TABLE_NAME))
-
-                return cursor.fetchone()[0] > 0
-
-    def create_table(self):
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                    CREATE TABLE `posts` (
-                        `ID` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
-                        `TITLE` VARCHAR(150) NOT NULL,
-                        `USER_NAME` VARCHAR(16) NOT NULL,
-                        `CONTENT` TEXT NULL,
-                        `CREATION_DATE` DATE NOT NULL DEFAULT CURRENT_TIMESTAMP
-                    ); 
-                ''')
-
-                conn.commit()
-
-    @TableUnsafeEnsure.ensure_table_exists
-    def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[Post]:
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
-                        FROM `{table!s}`
-                    ORDER BY `CREATION_DATE` DESC, `ID` DESC
-                '''.format(table=self.TABLE_NAME))
-
-                data = cursor.fetchall()
-                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3]) for row in data]
-
-    @TableUnsafeEnsure.ensure_table_exists
-    def by_id(self, _id: int) -> Post:
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
-                        FROM `{table!s}`
-                    WHERE `ID` = {id:d}
-                '''.format(table=self.TABLE_NAME, id=_id))
-
-                data = cursor.fetchone()
-                assert data is not None, err.NOT_FOUND.format(model='post', id=_id)
-                return Post(title=data[0], user_name=data[1], content=data[2], _id=data[3], date=data[4])
-
-    @TableUnsafeEnsure.ensure_table_exists
-    def create(self, model: Post) -> int:
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                INSERT INTO `{table!s}` (`TITLE`, `USER_NAME`, `CONTENT`)
-                    VALUES ('{title!s}', '{user_name!s}', {content!s})
-                '''.format(
-                    table=self.TABLE_NAME,
-                    title=model.title,
-                    user_name=model.user_name,
-                    content='NULL' if model.content is None else f"'{model.content!s}'",
-                ))
-
-                conn.commit()
-
-                return cursor.lastrowid
-
-    @TableUnsafeEnsure.ensure_table_exists
-    def update(self, _id: int, model: Post):
-        _ = self.by_id(_id)
-
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                    UPDATE `{table!s}`
-                        SET `TITLE` = '{title!s}', `CONTENT` = {content!s}
-                        WHERE `ID` = {id:d}
-                '''.format(
-                    table=self.TABLE_NAME,
-                    title=model.title,
-                    content='NULL' if model.content is None else f"'{model.content!s}'",
-                    id=_id,
-                ))
-
-                conn.commit()
-
-    @TableUnsafeEnsure.ensure_table_exists
-    def delete(self, _id: int):
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                    DELETE FROM `{table!s}`
-                        WHERE `ID` = {id:d}'''.format(table=self.TABLE_NAME, id=_id))
-
-                if cursor.rowcount == 0:
-                    conn.rollback()
-                    raise AssertionError(err.NOT_FOUND.format(model='post', id=_id))
-
-                conn.commit()
-
-    @TableUnsafeEnsure.ensure_table_exists
-    def filter(self, user_name: Optional[str] = None, title: Optional[str] = None) -> List[Post]:
-        title = title or ''
-        user_name = user_name or ''
-
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-                cursor.execute('''
-                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
-                        FROM `{table!s}`
-                    WHERE `TITLE` LIKE '%{title!s}%' OR `USER_NAME` LIKE '%{user_name!s}%'
-                    ORDER BY `CREATION_DATE` DESC, `ID` DESC
-                '''.format(table=self.TABLE_NAME, title=title, user_name=user_name))
-
-                data = cursor.fetchall()
-                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3]) for row in data]
-
-    @TableUnsafeEnsure.ensure_table_exists
-    def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
-        if since is None:
-            since = date.min
-
-        if until is None:
-            until = date.max
-
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
-                cursor: CursorBase = cursor
-
-                cursor.execute('''
-                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
-                        FROM `{table!s}`
-                    WHERE `CREATION_DATE` BETWEEN '{since!s}' AND '{until!s}' 
-                '''.format(table=self.TABLE_NAME, since=since, until=until))
-
-                data = cursor.fetchall()
-                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3]) for row in data]
+from infrastructure.repositories import TableEnsure
+from infrastructure.repositories.common import _EXCERPT
+from infrastructure.utils import partitions
+from infrastructure.utils.cache import invalidate
+
+
+# Prepared statements are cached by their SQL, the feed query has a constant text for each variant
+_LIST_SQL = '''
+    SELECT `TITLE`, `USER_NAME`, {excerpt!s}
+        FROM `posts`
+    ORDER BY `CREATION_DATE` DESC, `ID` DESC
+'''.format(excerpt=_EXCERPT)
+_LIST_PAGE_SQL = _LIST_SQL + ' LIMIT %s OFFSET %s'
+_PAGE_SQL = '''
+    SELECT `TITLE`, `USER_NAME`, {excerpt!s}, `CREATION_DATE`
+        FROM `posts`
+    ORDER BY `CREATION_DATE` DESC, `ID` DESC
+        LIMIT %s
+'''.format(excerpt=_EXCERPT)
+_PAGE_BEFORE_SQL = '''
+    SELECT `TITLE`, `USER_NAME`, {excerpt!s}, `CREATION_DATE`
+        FROM `posts`
+    WHERE `CREATION_DATE` < %s OR (`CREATION_DATE` = %s AND `ID` < %s)
+    ORDER BY `CREATION_DATE` DESC, `ID` DESC
+        LIMIT %s
+'''.format(excerpt=_EXCERPT)
+# Checked by ``flask explain-time-range`` against the partitions of the range
+TIME_RANGE_SQL = '''
+    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
+        FROM `posts`
+    WHERE `CREATION_DATE` BETWEEN %(since)s AND %(until)s
+'''
 
 
 class MysqlRepository(PostRepository, TableEnsure):
     @TableEnsure.ensure_table_exists
     def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[Post]:
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
+        with self.__read_connection as conn:
+            with conn.cursor(prepared=True) as cursor:
                 cursor: CursorBase = cursor
 
-                sql = '''
-                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
-                        FROM `posts`
-                    ORDER BY `CREATION_DATE` DESC, `ID` DESC
-                '''
-
-                data = dict()
-
-                if limit is not None:
-                    sql += ' LIMIT %(limit)s OFFSET'
-                    data['limit'] = limit
-                    data['offset'] = offset or 0
-
-                cursor.execute(sql, data)
+                if limit is None:
+                    cursor.execute(_LIST_SQL)
+                else:
+                    cursor.execute(_LIST_PAGE_SQL, (limit, offset or 0))
 
                 data = cursor.fetchall()
-                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3]) for row in data]
+                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3], content_length=row[4])
+                        for row in data]
 
     @TableEnsure.ensure_table_exists
     def by_id(self, _id: int) -> Post:
-        with self.__connection as conn:
-            with conn.cursor() as cursor:
+        with self.__read_connection as conn:
+            with conn.cursor(prepared=True) as cursor:
                 cursor: CursorBase = cursor
                 cursor.execute('''
                     SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`, `CREATION_DATE`
                         FROM `posts`
-                    WHERE `ID` = %(id)s
-                ''', dict(id=_id))
+                    WHERE `ID` = %s
+                ''', (_id,))
 
                 data = cursor.fetchone()
                 assert data is not None, err.NOT_FOUND.format(model='post', id=_id)
@@ -226,8 +88,10 @@ class MysqlRepository(PostRepository, TableEnsure):
                 ))
 
                 conn.commit()
+                _id = cursor.lastrowid
 
-                return cursor.lastrowid
+        invalidate('posts', _id)
+        return _id
 
     @TableEnsure.ensure_table_exists
     def update(self, _id: int, model: Post):
@@ -248,6 +112,8 @@ class MysqlRepository(PostRepository, TableEnsure):
 
                 conn.commit()
 
+        invalidate('posts', _id)
+
     @TableEnsure.ensure_table_exists
     def delete(self, _id: int):
         with self.__connection as conn:
@@ -263,23 +129,41 @@ class MysqlRepository(PostRepository, TableEnsure):
 
                 conn.commit()
 
+        invalidate('posts', _id)
+
+    @TableEnsure.ensure_table_exists
+    def page(self, limit: int, before: Optional[Tuple[date, int]] = None) -> List[Post]:
+        with self.__read_connection as conn:
+            with conn.cursor(prepared=True) as cursor:
+                cursor: CursorBase = cursor
+
+                if before is None:
+                    cursor.execute(_PAGE_SQL, (limit,))
+                else:
+                    cursor.execute(_PAGE_BEFORE_SQL, (before[0], before[0], before[1], limit))
+
+                data = cursor.fetchall()
+                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3], content_length=row[4],
+                             date=row[5]) for row in data]
+
     @TableEnsure.ensure_table_exists
     def filter(self, user_name: Optional[str] = None, title: Optional[str] = None) -> List[Post]:
         title = f'%{title}%' if title is not None else '%%'
         user_name = f'%{user_name}%' if user_name is not None else '%%'
 
-        with self.__connection as conn:
+        with self.__read_connection as conn:
             with conn.cursor() as cursor:
                 cursor: CursorBase = cursor
                 cursor.execute('''
-                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
+                    SELECT `TITLE`, `USER_NAME`, {excerpt!s}
                         FROM `posts`
                     WHERE `TITLE` LIKE %(title)s OR `USER_NAME` LIKE %(user_name)s
                     ORDER BY `CREATION_DATE` DESC, `ID` DESC
-                ''', dict(title=title, user_name=user_name))
+                '''.format(excerpt=_EXCERPT), dict(title=title, user_name=user_name))
 
                 data = cursor.fetchall()
-                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3]) for row in data]
+                return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3], content_length=row[4])
+                        for row in data]
 
     @TableEnsure.ensure_table_exists
     def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
@@ -289,22 +173,22 @@ class MysqlRepository(PostRepository, TableEnsure):
         if until is None:
             until = date.max
 
-        with self.__connection as conn:
+        with self.__read_connection as conn:
             with conn.cursor() as cursor:
                 cursor: CursorBase = cursor
 
-                cursor.execute('''
-                    SELECT `TITLE`, `USER_NAME`, `CONTENT`, `ID`
-                        FROM `posts`
-                    WHERE `CREATION_DATE` BETWEEN %(since)s AND %(until)s 
-                ''', dict(since=since, until=until))
+                cursor.execute(TIME_RANGE_SQL, dict(since=since, until=until))
 
                 data = cursor.fetchall()
                 return [Post(title=row[0], user_name=row[1], content=row[2], _id=row[3]) for row in data]
 
     @property
     def __connection(self) -> PooledMySQLConnection:
-        return get_mysql_pool().get_connection()
+        return get_mysql_connection()
+
+    @property
+    def __read_connection(self) -> PooledMySQLConnection:
+        return get_mysql_read_connection()
 
     @property
     def table_exists(self) -> bool:
@@ -332,7 +216,8 @@ class MysqlRepository(PostRepository, TableEnsure):
                         `USER_NAME` VARCHAR(16) NOT NULL,
                         `CONTENT` TEXT NULL,
                         `CREATION_DATE` DATE NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                        
+
+                        KEY `FEED` (`CREATION_DATE`, `ID`),
                         FOREIGN KEY (`USER_NAME`) REFERENCES `users` (`USER_NAME`)
                             ON DELETE CASCADE
                             ON UPDATE CASCADE
@@ -340,3 +225,6 @@ class MysqlRepository(PostRepository, TableEnsure):
                 ''')
 
                 conn.commit()
+
+            if partitions.ENABLED:
+                partitions.partition_table(conn)
@@ -0,0 +1,170 @@
+from __future__ import annotations
+from threading import Lock
+from time import monotonic
+from typing import Optional, List, Set, Tuple
+from datetime import date
+from domain.repositories import PostRepository
+from domain.models import Post
+import domain.errors as err
+from infrastructure.repositories import EXCERPT_LENGTH
+from infrastructure.utils.cache import listen, on_reset
+from infrastructure.utils.unit_of_work import on_commit
+
+
+def _copy(post: Post) -> Post:
+    return post.excerpt(EXCERPT_LENGTH)
+
+
+class TimelinePostRepository(PostRepository):
+    """
+    Materialized timeline of the most recent posts in front of another post repository
+
+    ``list`` is served from an in-memory ring of the newest ``size`` posts, with an excerpt of their content like the
+    feed queries, loaded from the database on the first read after boot and kept up to date on create, update and
+    delete once their request commits. Posts changed by other workers are refreshed from their ``posts``
+    invalidations, the whole ring is reloaded after a ``users`` invalidation, as renaming or deleting a user changes
+    or deletes their posts, and every ``refresh`` seconds to bound the drift.
+
+    The ring is ordered by descending id: ``CREATION_DATE`` is always the insertion date, so it follows the ids.
+    """
+
+    def __init__(self, repository: PostRepository, size: int = 100, refresh: float = 60.0):
+        self._repository = repository
+        self._size = size
+        self._refresh = refresh
+        self._ring: Optional[List[Post]] = None
+        self._complete = False
+        self._loaded = 0.0
+        self._dirty: Set[int] = set()
+        self._lock = Lock()
+
+        listen('posts')(self._invalidate)
+        listen('users')(self._invalidate_users)
+        on_reset(self._reset)
+
+    def _invalidate(self, _id: int):
+        with self._lock:
+            self._dirty.add(_id)
+
+    def _invalidate_users(self, _id: int):
+        self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self._loaded = 0.0
+
+    def rebuild(self):
+        """
+        Reload the ring from the database
+        """
+        posts = self._repository.list(self._size + 1, 0)
+
+        with self._lock:
+            self._ring = posts[:self._size]
+            self._complete = len(posts) <= self._size
+            self._loaded = monotonic()
+            self._dirty.clear()
+
+    def _ensure_fresh(self):
+        if self._ring is None or monotonic() - self._loaded >= self._refresh:
+            self.rebuild()
+            return
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+
+        for _id in dirty:
+            try:
+                self._upsert(self._repository.by_id(_id))
+            except AssertionError as error:
+                if error.args[0] != err.NOT_FOUND.format(model='post', id=_id):
+                    raise
+                self._remove(_id)
+
+    def _upsert(self, post: Post):
+        with self._lock:
+            if self._ring is None:
+                return
+
+            ring = [entry for entry in self._ring if entry.id != post.id]
+            if not self._complete and len(ring) == len(self._ring) and ring and post.id < ring[-1].id:
+                # Older than the ring, it is not part of the timeline
+                return
+
+            index = next((index for index, entry in enumerate(ring) if entry.id < post.id), len(ring))
+            ring.insert(index, post.excerpt(EXCERPT_LENGTH))
+
+            if len(ring) > self._size:
+                self._complete = False
+            self._ring = ring[:self._size]
+
+    def _remove(self, _id: int):
+        with self._lock:
+            if self._ring is None:
+                return
+
+            ring = [entry for entry in self._ring if entry.id != _id]
+            if len(ring) != len(self._ring) and not self._complete:
+                # The next post is unknown until the ring is reloaded
+                self._loaded = 0.0
+            self._ring = ring
+
+    def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[Post]:
+        self._ensure_fresh()
+
+        offset = offset or 0
+        ring, complete = self._ring, self._complete
+        if complete or (limit is not None and offset + limit <= len(ring)):
+            end = None if limit is None else offset + limit
+            return [_copy(post) for post in ring[offset:end]]
+
+        return self._repository.list(limit, offset)
+
+    def create(self, model: Post) -> int:
+        _id = self._repository.create(model)
+        post = Post(title=model.title, user_name=model.user_name, content=model.content, _id=_id, date=date.today())
+        on_commit(lambda: self._created(post))
+
+        return _id
+
+    def _created(self, post: Post):
+        if self._ring is not None:
+            self._upsert(post)
+            with self._lock:
+                self._dirty.discard(post.id)
+
+    def update(self, _id: int, model: Post):
+        self._repository.update(_id, model)
+        on_commit(lambda: self._updated(_id, model))
+
+    def _updated(self, _id: int, model: Post):
+        if self._ring is not None:
+            with self._lock:
+                self._ring = [
+                    Post(title=model.title, user_name=entry.user_name, content=model.content, _id=_id, date=entry.date)
+                    .excerpt(EXCERPT_LENGTH) if entry.id == _id else entry
+                    for entry in self._ring
+                ]
+                self._dirty.discard(_id)
+
+    def delete(self, _id: int):
+        self._repository.delete(_id)
+        on_commit(lambda: self._deleted(_id))
+
+    def _deleted(self, _id: int):
+        if self._ring is not None:
+            self._remove(_id)
+            with self._lock:
+                self._dirty.discard(_id)
+
+    def by_id(self, _id: int) -> Post:
+        return self._repository.by_id(_id)
+
+    def filter(self, user_name: Optional[str] = None, title: Optional[str] = None) -> List[Post]:
+        return self._repository.filter(user_name, title)
+
+    def time_range(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Post]:
+        return self._repository.time_range(since, until)
+
+    def page(self, limit: int, before: Optional[Tuple[date, int]] = None) -> List[Post]:
+        return self._repository.page(limit, before)
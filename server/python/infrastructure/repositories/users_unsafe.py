@@ -0,0 +1,223 @@
+from __future__ import annotations
+from typing import Optional, List, Tuple
+from infrastructure.utils.mysql import get_connection as get_mysql_connection, \
+    get_read_connection as get_mysql_read_connection, get_schema
+from mysql.connector.pooling import PooledMySQLConnection
+from mysql.connector.cursor import CursorBase
+from mysql.connector import errors
+from domain.repositories import UserRepository
+from domain.models import User
+import domain.errors as err
+from infrastructure.repositories import TableUnsafeEnsure
+from infrastructure.repositories.common import _COLUMNS, _changed_fields, _raise_duplicate
+from infrastructure.utils.cache import invalidate
+
+
+class MysqlUnsafeRepository(UserRepository, TableUnsafeEnsure):
+    TABLE_NAME = 'users'
+    _unique_user_name = False
+
+    @property
+    def __connection(self) -> PooledMySQLConnection:
+        return get_mysql_connection()
+
+    @property
+    def __read_connection(self) -> PooledMySQLConnection:
+        return get_mysql_read_connection()
+
+    @property
+    def table_exists(self) -> bool:
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    SELECT
+                        COUNT(*)
+                    FROM `information_schema`.`TABLES`
+                        WHERE `TABLE_SCHEMA` = '{schema!s}'
+                          AND `TABLE_NAME` = '{table!s}'
+                '''.format(schema=get_schema(), table=self.TABLE_NAME))
+
+                return cursor.fetchone()[0] > 0
+
+    def create_table(self):
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    CREATE TABLE `users` (
+                        `ID` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+                        `USER_NAME` VARCHAR(16) NOT NULL UNIQUE,
+                        `FULL_NAME` VARCHAR(255) NOT NULL,
+                        `PASSWORD` BLOB NULL
+                    ); 
+                ''')
+
+                conn.commit()
+
+    @TableUnsafeEnsure.ensure_table_exists
+    def by_login(self, user_name: str, password: str) -> Tuple[User, int]:
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+
+                cursor.execute('''
+                    SELECT `USER_NAME`, `FULL_NAME`, `PASSWORD`, `ID`
+                        FROM `{table!s}`
+                    WHERE `USER_NAME` = '{user_name!s}'
+                '''.format(table=self.TABLE_NAME, user_name=user_name))
+
+                data = cursor.fetchone()
+                if data is None:
+                    raise AssertionError(err.INVALID_CREDENTIAL)
+
+                user = User(user_name=data[0], full_name=data[1], password=data[2])
+                assert user.verify_password(password), err.INVALID_CREDENTIAL
+
+                return user, data[3]
+
+    @TableUnsafeEnsure.ensure_table_exists
+    def list(self, limit: Optional[int] = None, offset: Optional[int] = None) -> List[User]:
+        with self.__read_connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                sql = '''
+                    SELECT `USER_NAME`, `FULL_NAME`
+                        FROM `{table!s}`
+                '''.format(table=self.TABLE_NAME)
+
+                if limit is not None:
+                    sql += ' LIMIT {limit!s} OFFSET {offset!s}'.format(limit=limit, offset=offset or 0)
+
+                cursor.execute(sql)
+
+                data = cursor.fetchall()
+                return [User(user_name=row[0], full_name=row[1]) for row in data]
+
+    @TableUnsafeEnsure.ensure_table_exists
+    def by_id(self, _id: int) -> User:
+        with self.__read_connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    SELECT `USER_NAME`, `FULL_NAME`
+                        FROM `{table!s}`
+                    WHERE `ID` = {id:d}
+                '''.format(table=self.TABLE_NAME, id=_id))
+
+                data = cursor.fetchone()
+                assert data is not None, err.NOT_FOUND.format(model='user', id=_id)
+                return User(user_name=data[0], full_name=data[1])
+
+    @property
+    def __unique_user_name(self) -> bool:
+        # Tables created before the key was declared accept duplicate user names
+        if not self._unique_user_name:
+            with self.__connection as conn:
+                with conn.cursor() as cursor:
+                    cursor: CursorBase = cursor
+                    cursor.execute('''
+                        SELECT `INDEX_NAME`
+                            FROM `information_schema`.`STATISTICS`
+                        WHERE `TABLE_SCHEMA` = '{schema!s}'
+                          AND `TABLE_NAME` = '{table!s}'
+                          AND `NON_UNIQUE` = 0
+                        GROUP BY `INDEX_NAME`
+                            HAVING COUNT(*) = 1 AND MAX(`COLUMN_NAME`) = 'USER_NAME'
+                    '''.format(schema=get_schema(), table=self.TABLE_NAME))
+
+                    self._unique_user_name = len(cursor.fetchall()) > 0
+
+        return self._unique_user_name
+
+    @TableUnsafeEnsure.ensure_table_exists
+    def create(self, model: User) -> int:
+        if not self.__unique_user_name:
+            try:
+                _ = self.by_user_id(model.user_name)
+            except AssertionError:
+                # User no exists
+                pass
+            else:
+                raise AssertionError(err.ALREADY_EXISTS.format(model='user', id=model.user_name))
+
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                try:
+                    cursor.execute('''
+                    INSERT INTO `{table!s}` (`USER_NAME`, `FULL_NAME`, `PASSWORD`)
+                        VALUES ('{user_name!s}', '{full_name!s}', CONVERT('{password!s}' USING BINARY))
+                    '''.format(
+                        table=self.TABLE_NAME,
+                        user_name=model.user_name,
+                        full_name=model.full_name,
+                        password=model.password.decode(),
+                    ))
+                except errors.IntegrityError as error:
+                    _raise_duplicate(error, model)
+
+                conn.commit()
+                return cursor.lastrowid
+
+    @TableUnsafeEnsure.ensure_table_exists
+    def update(self, _id: int, model: User):
+        values = dict(
+            user_name="'{0!s}'".format(model.user_name),
+            full_name="'{0!s}'".format(model.full_name),
+            password=None if model.password is None else "CONVERT('{0!s}' USING BINARY)".format(
+                model.password.decode()),
+        )
+        fields = [field for field in _changed_fields(model) if values[field] is not None]
+
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    UPDATE `{table!s}`
+                        SET {values!s}
+                        WHERE `ID` = {id:d}
+                '''.format(
+                    table=self.TABLE_NAME,
+                    values=', '.join('`{0!s}` = {1!s}'.format(_COLUMNS[field], values[field]) for field in fields),
+                    id=_id,
+                ))
+
+                if cursor.rowcount == 0:
+                    raise AssertionError(err.NOT_FOUND.format(model='user', id=_id))
+
+                conn.commit()
+
+        invalidate('users', _id)
+
+    @TableUnsafeEnsure.ensure_table_exists
+    def delete(self, _id: int):
+        with self.__connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    DELETE FROM `{table!s}`
+                        WHERE `ID` = {id:d}'''.format(table=self.TABLE_NAME, id=_id))
+
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    raise AssertionError(err.NOT_FOUND.format(model='user', id=_id))
+
+                conn.commit()
+
+        invalidate('users', _id)
+
+    @TableUnsafeEnsure.ensure_table_exists
+    def by_user_id(self, user_name: str) -> User:
+        with self.__read_connection as conn:
+            with conn.cursor() as cursor:
+                cursor: CursorBase = cursor
+                cursor.execute('''
+                    SELECT `USER_NAME`, `FULL_NAME`
+                        FROM `{table!s}`
+                    WHERE `USER_NAME` = '{user_name!s}'
+                '''.format(table=self.TABLE_NAME, user_name=user_name))
+
+                data = cursor.fetchone()
+                assert data is not None, err.NOT_FOUND.format(model='user', id=user_name)
+                return User(user_name=data[0], full_name=data[1])
@@ -1,6 +1,7 @@
 
 import string
 import secrets
+import os
 
 
 def create_salt(length: int = 10) -> str:
@@ -10,4 +11,20 @@ def create_salt(length: int = 10) -> str:
     :return: Return a random string
     """
     base = string.ascii_letters + string.digits
-    return ''.join([secrets.choice(base) for _ in range(length)])
\ No newline at end of file
+    return ''.join([secrets.choice(base) for _ in range(length)])
+
+
+def is_process_alive(pid: int) -> bool:
+    """
+    Check if a process exists
+    :param pid: Process id
+    :return: Process existence
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
@@ -0,0 +1,255 @@
+from collections import OrderedDict, defaultdict
+from threading import Event, Lock, RLock
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+
+_listeners: Dict[str, List[Callable[[Any], None]]] = defaultdict(list)
+_reset_listeners: List[Callable[[], None]] = []
+_publishers: List[Callable[[str, Any], None]] = []
+_named_caches: Dict[str, 'LRUCache'] = dict()
+
+
+class LRUCache:
+    """
+    Thread safe in-memory cache with a least recently used eviction policy and an optional time to live
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a cached value and mark it as recently used
+        :param key: Cache key
+        :param default: Value returned on a cache miss
+        :return: Cached value or default
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or (entry[0] is not None and entry[0] < monotonic()):
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store a value, evicting the least recently used entries when full
+        :param key: Cache key
+        :param value: Value to store
+        """
+        expires = monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """
+        Remove a value from the cache if present
+        :param key: Cache key
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove a value from the cache and return it
+        :param key: Cache key
+        :param default: Value returned if the key is not cached or expired
+        :return: Removed value or default
+        """
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            if entry is _MISSING or (entry[0] is not None and entry[0] < monotonic()):
+                return default
+
+            return entry[1]
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]):
+        """
+        Remove every value whose key matches a predicate
+        :param predicate: Key filter
+        """
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Cache usage counters
+        :return: Hits, misses, hit ratio and current size
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                ratio=self.hits / total if total else 0.0,
+                size=len(self._data),
+            )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent loads of the same key, only the first caller runs the load and the others wait for it
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: Dict[Hashable, list] = dict()
+
+    def do(self, key: Hashable, fx: Callable[[], Any]) -> Any:
+        """
+        Run a load once for all the concurrent callers of a key
+        :param key: Load key
+        :param fx: Load function
+        :return: Result of the load
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                # Event, result, error
+                call = self._calls[key] = [Event(), None, None]
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = fx()
+            return call[1]
+        except BaseException as err:
+            call[2] = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+
+def listen(namespace: str) -> Callable:
+    """
+    Decorator to register a callback on invalidations of a namespace
+    :param namespace: Namespace of the invalidated entities (ex. ``posts``)
+    :return: Decorator
+    """
+    def decorator(fx: Callable[[Any], None]) -> Callable[[Any], None]:
+        _listeners[namespace].append(fx)
+        return fx
+
+    return decorator
+
+
+def on_reset(fx: Callable[[], None]) -> Callable[[], None]:
+    """
+    Decorator to register a callback run when every cached entry must be dropped
+    :param fx: Callback
+    :return: Callback
+    """
+    _reset_listeners.append(fx)
+    return fx
+
+
+def publish_to(fx: Callable[[str, Any], None]):
+    """
+    Forward the invalidations of this process to other processes
+    :param fx: Function receiving the namespace and key of every invalidation
+    """
+    _publishers.append(fx)
+
+
+def notify(namespace: str, key: Any):
+    """
+    Run the listeners of this process for an invalidation, without publishing it
+    :param namespace: Namespace of the entity (ex. ``posts``)
+    :param key: Entity identifier
+    """
+    for fx in _listeners[namespace]:
+        fx(key)
+
+
+def invalidate(namespace: str, key: Any):
+    """
+    Notify that an entity changed, so every cache depending on it must drop it
+    :param namespace: Namespace of the entity (ex. ``posts``)
+    :param key: Entity identifier
+    """
+    notify(namespace, key)
+
+    for fx in _publishers:
+        fx(namespace, key)
+
+
+def reset():
+    """
+    Drop every cached entry of this process, used when invalidations were lost
+    """
+    for cache in _named_caches.values():
+        cache.clear()
+
+    for fx in _reset_listeners:
+        fx()
+
+
+def reset_everywhere():
+    """
+    Drop every cached entry of every process, used after changes too wide for the invalidations of their entities
+    """
+    reset()
+
+    # Other processes reset on an invalidation without an integer key
+    for fx in _publishers:
+        fx('*', None)
+
+
+def namespaces() -> List[str]:
+    """
+    Namespaces with registered listeners
+    :return: Namespace names
+    """
+    return list(_listeners)
+
+
+def cache_stats() -> List[Tuple[str, Dict[str, float]]]:
+    """
+    Collect stats of the named caches
+    :return: List of cache name and stats
+    """
+    return [(name, cache.stats()) for name, cache in _named_caches.items()]
+
+
+def named_cache(name: str, max_size: Optional[int] = None, ttl: Optional[float] = None) -> LRUCache:
+    """
+    Get or create a process wide cache registered by name
+    :param name: Cache name, used for metrics
+    :param max_size: Maximum entries of the cache
+    :param ttl: Seconds an entry is valid, forever if not provided
+    :return: Cache instance
+    """
+    if name not in _named_caches:
+        _named_caches[name] = LRUCache(max_size or 1024, ttl)
+
+    return _named_caches[name]
@@ -0,0 +1,293 @@
+"""
+Query instrumentation of the MySQL connections
+
+Every statement is recorded with its normalized SQL, duration, returned rows and calling repository method.
+Statements slower than ``SLOW_QUERY_MS`` are logged with their ``EXPLAIN`` output, and requests running the same
+statement ``QUERY_N_PLUS_ONE_THRESHOLD`` times or more are flagged as N+1 patterns.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from os import environ as env
+from threading import local
+from time import perf_counter
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional
+import logging
+import re
+import sys
+
+from flask import Flask, g, has_request_context, request
+
+from infrastructure.utils.metrics import metrics
+from infrastructure.utils.statements import forget_statements, prepared_cursor
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(env.get('SLOW_QUERY_MS', '200'))
+N_PLUS_ONE_THRESHOLD = int(env.get('QUERY_N_PLUS_ONE_THRESHOLD', '5'))
+
+_literals = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+_whitespace = re.compile(r'\s+')
+_write = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+_session_state = re.compile(r'^\s*SET\b|\bGET_LOCK\s*\(|\bCREATE\s+TEMPORARY\b|\bLOCK\s+TABLES\b|:=|\bINTO\s+@',
+                            re.IGNORECASE)
+_captures = local()
+
+metrics.describe('db_query_duration_seconds', 'histogram', 'Query latency by repository method')
+metrics.describe('db_query_rows_total', 'counter', 'Rows returned or affected by repository method')
+metrics.describe('db_queries_per_request', 'histogram', 'Queries run by a request', (0, 1, 2, 3, 5, 8, 13, 21, 34))
+
+
+class Query(NamedTuple):
+    sql: str
+    duration: float
+    rows: int
+    caller: str
+
+
+class Capture:
+    """
+    Queries and round trips of the current thread while capturing
+    """
+
+    def __init__(self):
+        self.queries: List[Query] = []
+        self.round_trips = 0
+
+
+@contextmanager
+def capture() -> Iterator[Capture]:
+    """
+    Capture the queries of the current thread outside of a request, as the benchmarks do
+
+    Round trips count the statements, commits and rollbacks, plus the ping of a pool checkout and the session
+    reset when the connection returns to the pool
+    :return: Capture filled until the block exits
+    """
+    if not hasattr(_captures, 'active'):
+        _captures.active = []
+
+    current = Capture()
+    _captures.active.append(current)
+    try:
+        yield current
+    finally:
+        _captures.active.remove(current)
+
+
+def _round_trip(count: int = 1):
+    for current in getattr(_captures, 'active', ()):
+        current.round_trips += count
+
+
+def normalize(sql: str) -> str:
+    """
+    Replace literals and collapse whitespace, so the same statement with other values is grouped
+    :param sql: SQL statement
+    :return: Normalized statement
+    """
+    return _whitespace.sub(' ', _literals.sub('?', sql)).strip()
+
+
+class InstrumentedCursor:
+    """
+    Cursor proxy recording every executed statement
+    """
+
+    def __init__(self, cursor, connection: 'InstrumentedConnection'):
+        self._cursor = cursor
+        self._connection = connection
+        self._pending: Optional[tuple] = None
+        self._slow: List[tuple] = []
+
+    def execute(self, operation: str, params: Any = (), *args, **kwargs):
+        self._finish()
+
+        caller = sys._getframe(1)
+        owner = caller.f_locals.get('self')
+        caller_name = f'{type(owner).__module__}.{type(owner).__name__}.{caller.f_code.co_name}' \
+            if owner is not None else caller.f_code.co_name
+
+        start = perf_counter()
+        result = self._cursor.execute(operation, params, *args, **kwargs)
+        self._pending = (operation, params, perf_counter() - start, caller_name)
+
+        if self._connection.on_write is not None and _write.match(operation):
+            self._connection.on_write()
+
+        if _session_state.search(operation):
+            self._connection.session_changed = True
+
+        return result
+
+    def close(self):
+        self._finish()
+        result = self._cursor.close()
+
+        for operation, params, query in self._slow:
+            self._connection.explain(operation, params, query)
+        self._slow = []
+
+        return result
+
+    def _finish(self):
+        if self._pending is None:
+            return
+
+        operation, params, duration, caller = self._pending
+        self._pending = None
+
+        query = Query(normalize(operation), duration, max(self._cursor.rowcount, 0), caller)
+        _record(query)
+
+        if duration * 1000 >= SLOW_QUERY_MS:
+            self._slow.append((operation, params, query))
+
+    def __enter__(self) -> 'InstrumentedCursor':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, item: str):
+        return getattr(self._cursor, item)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class InstrumentedConnection:
+    """
+    Connection proxy creating instrumented cursors
+    """
+
+    def __init__(self, connection, on_write: Optional[Callable[[], None]] = None):
+        self._connection = connection
+        self.on_write = on_write
+        self.session_changed = False
+        _round_trip()
+
+    def commit(self):
+        _round_trip()
+        return self._connection.commit()
+
+    def rollback(self):
+        _round_trip()
+        return self._connection.rollback()
+
+    def close(self):
+        pool = getattr(self._connection, '_cnx_pool', None)
+        if pool is not None:
+            if pool.reset_session:
+                _round_trip()
+            elif self.session_changed:
+                # Named locks, variables and temporary tables would leak to the next checkout
+                self._reset_session()
+            elif self._connection.in_transaction:
+                # Without the session reset, end the snapshot of the reads before another checkout
+                self.rollback()
+
+        return self._connection.close()
+
+    def _reset_session(self):
+        _round_trip()
+        raw = getattr(self._connection, '_cnx', self._connection)
+        try:
+            raw.reset_session()
+        except Exception:
+            # The pool reconnects a disconnected connection on its next checkout
+            logger.exception('session reset of a pooled connection failed')
+            raw.disconnect()
+        finally:
+            forget_statements(raw)
+            self.session_changed = False
+
+    def cursor(self, *args, **kwargs) -> InstrumentedCursor:
+        if kwargs == dict(prepared=True) and not args:
+            return InstrumentedCursor(prepared_cursor(self._connection), self)
+
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self)
+
+    def explain(self, operation: str, params: Any, query: Query):
+        """
+        Log a slow query with its execution plan
+        :param operation: Original statement
+        :param params: Original parameters
+        :param query: Recorded query
+        """
+        plan = None
+        if query.sql.upper().startswith('SELECT'):
+            try:
+                with self._connection.cursor(buffered=True) as cursor:
+                    cursor.execute('EXPLAIN ' + operation, params)
+                    columns = [column[0] for column in cursor.description]
+                    plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            except Exception as err:
+                plan = f'EXPLAIN failed: {err}'
+
+        logger.warning('slow query (%.1fms, %d rows) in %s: %s\nplan: %r',
+                       query.duration * 1000, query.rows, query.caller, query.sql, plan)
+
+    def __enter__(self) -> 'InstrumentedConnection':
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, item: str):
+        return getattr(self._connection, item)
+
+
+def instrument(connection, on_write: Optional[Callable[[], None]] = None) -> InstrumentedConnection:
+    """
+    Wrap a connection with query instrumentation
+    :param connection: Database connection
+    :param on_write: Callback run after every write statement
+    :return: Instrumented connection
+    """
+    return InstrumentedConnection(connection, on_write)
+
+
+def _record(query: Query):
+    labels = (('caller', query.caller),)
+    metrics.observe('db_query_duration_seconds', query.duration, labels)
+    metrics.inc('db_query_rows_total', labels, query.rows)
+
+    _round_trip()
+    for current in getattr(_captures, 'active', ()):
+        current.queries.append(query)
+
+    if has_request_context():
+        if 'queries' not in g:
+            g.queries = []
+        g.queries.append(query)
+
+
+def request_queries() -> List[Query]:
+    """
+    Queries run by the current request
+    :return: Recorded queries
+    """
+    if has_request_context():
+        return g.get('queries', [])
+
+    return []
+
+
+def _report_request(_error: Optional[BaseException]):
+    queries = g.get('queries', [])
+    metrics.observe('db_queries_per_request', len(queries))
+
+    for sql, count in Counter(query.sql for query in queries).items():
+        if count >= N_PLUS_ONE_THRESHOLD:
+            callers = sorted({query.caller for query in queries if query.sql == sql})
+            logger.warning('possible N+1 on %s: %d executions of %r from %s',
+                           request.endpoint, count, sql, ', '.join(callers))
+
+
+def init_app(app: Flask):
+    """
+    Report the queries of every request
+    :param app: Flask application
+    """
+    app.teardown_request(_report_request)
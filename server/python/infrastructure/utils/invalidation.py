@@ -0,0 +1,149 @@
+"""
+Cache invalidations shared by every gunicorn worker
+
+Invalidations are appended to a ring log on shared memory: slot zero holds the last sequence number and the other
+slots the entries. Every worker reads the entries it did not apply yet before handling a request, so a request
+never reads a cache entry invalidated before it started. A worker falling behind the whole ring drops all its
+caches instead, and so does a worker waiting more than ``INVALIDATION_STALL_SECONDS`` for an entry whose sequence
+was taken by a publisher that died before writing it.
+"""
+from hashlib import blake2b
+from os import environ as env
+from threading import Lock
+from time import monotonic, time
+from typing import Any, Dict, Optional
+import os
+
+from flask import Flask
+
+from infrastructure.utils import cache
+from infrastructure.utils.metrics import metrics
+from infrastructure.utils.shared_memory import SharedSlots, Values, shared_path
+from infrastructure.utils.unit_of_work import after_commit
+
+metrics.describe('cache_invalidation_lag_seconds', 'histogram', 'Delay until a worker applies an invalidation',
+                 (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+metrics.describe('cache_invalidation_resets_total', 'counter', 'Caches dropped after losing invalidations')
+
+_FIELDS = 5  # sequence, publisher pid, namespace, key, publish time
+_RESET = 0
+
+
+def _namespace_code(namespace: str) -> int:
+    # 48 bits are exact on a double
+    return int.from_bytes(blake2b(namespace.encode(), digest_size=6).digest(), 'little') or 1
+
+
+class InvalidationBus:
+    """
+    Publisher and consumer of the shared invalidation log
+    """
+
+    def __init__(self, slots: SharedSlots, stall: float = 1.0):
+        self._slots = slots
+        self._capacity = slots.slots - 1
+        self._stall = stall
+        self._cursor = self._head()
+        self._stalled: Optional[float] = None
+        self._names: Dict[int, str] = dict()
+        self._lock = Lock()
+
+    def _head(self) -> int:
+        return int(self._slots.read(0)[0])
+
+    def publish(self, namespace: str, key: Any):
+        """
+        Append an invalidation to the log
+        :param namespace: Namespace of the entity
+        :param key: Entity identifier, other workers drop every cache when it is not an integer
+        """
+        code = _namespace_code(namespace) if isinstance(key, int) else _RESET
+        key = key if isinstance(key, int) else 0
+
+        sequence = self._slots.update(0, lambda values: ((values[0] + 1,) + values[1:], int(values[0]) + 1))
+        entry = (sequence, os.getpid(), code, key, time())
+        self._slots.update(1 + sequence % self._capacity, lambda _values: (entry, None))
+
+    def poll(self):
+        """
+        Apply the invalidations published by other workers since the last poll
+        """
+        if self._head() == self._cursor:
+            return
+
+        with self._lock:
+            head = self._head()
+            while self._cursor < head:
+                expected = self._cursor + 1
+                values: Values = self._slots.update(1 + expected % self._capacity, lambda values: (values, values))
+                sequence, pid, code, key, published = values
+
+                if sequence < expected:
+                    # The publisher did not write the entry yet, or died before writing it
+                    now = monotonic()
+                    if self._stalled is None:
+                        self._stalled = now
+                    if now - self._stalled < self._stall:
+                        break
+
+                    metrics.inc('cache_invalidation_resets_total')
+                    cache.reset()
+                    self._stalled = None
+                    self._cursor = expected
+                    continue
+
+                self._stalled = None
+                if sequence > expected:
+                    # Overwritten before being read, some invalidations were lost
+                    metrics.inc('cache_invalidation_resets_total')
+                    cache.reset()
+                    self._cursor = head
+                    break
+
+                self._cursor = expected
+                if pid != os.getpid():
+                    self._apply(int(code), int(key), published)
+
+    def _apply(self, code: int, key: int, published: float):
+        metrics.observe('cache_invalidation_lag_seconds', max(time() - published, 0.0))
+
+        if code == _RESET:
+            cache.reset()
+            return
+
+        if code not in self._names:
+            self._names = {_namespace_code(namespace): namespace for namespace in cache.namespaces()}
+
+        # Namespaces without listeners on this worker have nothing to drop
+        if code in self._names:
+            cache.notify(self._names[code], key)
+
+
+def create_bus(name: str = 'webapp-invalidations') -> InvalidationBus:
+    """
+    Open the invalidation log shared by the workers
+    :param name: Shared memory file name
+    :return: Bus instance
+    """
+    size = int(env.get('INVALIDATION_LOG_SIZE', '4096'))
+    return InvalidationBus(SharedSlots(shared_path(name), size + 1, _FIELDS),
+                           float(env.get('INVALIDATION_STALL_SECONDS', '1')))
+
+
+def init_app(app: Flask):
+    """
+    Publish the invalidations of this worker and apply the others before every request
+    :param app: Flask application
+    """
+    if env.get('INVALIDATION_BUS_ENABLED', '1') != '1':
+        return
+
+    bus = create_bus()
+
+    def publish(namespace: str, key: Any):
+        # Other workers, and other threads reloading in between, must not read the row before it is committed
+        after_commit(lambda: cache.notify(namespace, key))
+        after_commit(lambda: bus.publish(namespace, key))
+
+    cache.publish_to(publish)
+    app.before_request(bus.poll)
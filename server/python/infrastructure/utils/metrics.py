@@ -0,0 +1,270 @@
+"""
+Metrics collector shared by every gunicorn worker
+
+Every process keeps its metrics in memory and dumps them periodically into ``<METRICS_DIR>/<pid>.json``,
+the exporter merges the files of every worker. Counters and histograms of finished workers are kept into
+``<METRICS_DIR>/finished.json``, gauges are only exported for live workers.
+"""
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, Iterable, List, Tuple
+from os import environ as env
+import fcntl
+import json
+import os
+
+from infrastructure.utils import is_process_alive
+
+Labels = Tuple[Tuple[str, str], ...]
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_FINISHED_FILE = 'finished.json'
+
+
+class Metrics:
+    """
+    Process local metrics registry dumped into a directory shared by the workers
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._types: Dict[str, str] = dict()
+        self._help: Dict[str, str] = dict()
+        self._buckets: Dict[str, Tuple[float, ...]] = dict()
+        self._counters: Dict[Tuple[str, Labels], float] = dict()
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = dict()
+        self._gauges: Dict[Tuple[str, Labels], float] = dict()
+        self._collectors: List[Callable[[], Iterable[Tuple[str, Labels, float]]]] = []
+        self._lock = Lock()
+        self._last_flush = 0.0
+
+    def describe(self, name: str, metric_type: str, description: str, buckets: Tuple[float, ...] = BUCKETS):
+        """
+        Declare a metric
+        :param name: Metric name
+        :param metric_type: One of ``counter``, ``gauge`` or ``histogram``
+        :param description: Help text of the metric
+        :param buckets: Upper bounds of the buckets of a histogram
+        """
+        self._types[name] = metric_type
+        self._help[name] = description
+        self._buckets[name] = buckets
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1):
+        with self._lock:
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        """
+        Add an observation into a histogram
+        :param name: Metric name
+        :param value: Observed value
+        :param labels: Metric labels
+        """
+        buckets = self._buckets.get(name, BUCKETS)
+        with self._lock:
+            key = (name, labels)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Buckets, +Inf, sum
+                histogram = self._histograms[key] = [0] * (len(buckets) + 2)
+
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def set_gauge(self, name: str, value: float, labels: Labels = ()):
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    def collector(self, fx: Callable[[], Iterable[Tuple[str, Labels, float]]]) -> Callable:
+        """
+        Register a function evaluated on every flush which returns gauges as ``(name, labels, value)``
+        :param fx: Collector function
+        :return: Same function
+        """
+        self._collectors.append(fx)
+        return fx
+
+    def flush(self, force: bool = False):
+        """
+        Dump the metrics of the process into the shared directory
+        :param force: Ignore the flush interval
+        """
+        now = monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+
+        self._last_flush = now
+        for fx in self._collectors:
+            for name, labels, value in fx():
+                self.set_gauge(name, value, labels)
+
+        with self._lock:
+            snapshot = dict(
+                counters=[[name, labels, value] for (name, labels), value in self._counters.items()],
+                histograms=[[name, labels, value] for (name, labels), value in self._histograms.items()],
+                gauges=[[name, labels, value] for (name, labels), value in self._gauges.items()],
+            )
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid():d}.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(path + '.tmp', path)
+
+    def mark_process_dead(self, pid: int):
+        """
+        Move the counters and histograms of a finished worker into the finished workers file
+        :param pid: Process id of the worker
+        """
+        path = os.path.join(self.directory, f'{pid:d}.json')
+        if not os.path.exists(path):
+            return
+
+        with self._locked_directory():
+            finished = _read_snapshot(os.path.join(self.directory, _FINISHED_FILE))
+            finished.pop('gauges', None)
+            merged = _merge([finished, _read_snapshot(path)], gauges=False)
+
+            target = os.path.join(self.directory, _FINISHED_FILE)
+            with open(target + '.tmp', 'w') as file:
+                json.dump(merged, file)
+            os.replace(target + '.tmp', target)
+            os.remove(path)
+
+    def clear(self):
+        """
+        Remove the metrics of a previous run
+        """
+        if not os.path.isdir(self.directory):
+            return
+
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
+
+    def render(self) -> str:
+        """
+        Merge the metrics of every worker into the Prometheus text format
+        :return: Exposition text
+        """
+        self.flush(force=True)
+
+        with self._locked_directory():
+            snapshots = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+
+                snapshot = _read_snapshot(os.path.join(self.directory, name))
+                if name != _FINISHED_FILE and not is_process_alive(int(name[:-len('.json')])):
+                    snapshot.pop('gauges', None)
+                snapshots.append(snapshot)
+
+        merged = _merge(snapshots, gauges=True)
+        lines = []
+        described = set()
+
+        def header(metric: str):
+            if metric in described:
+                return
+            described.add(metric)
+            if metric in self._help:
+                lines.append(f'# HELP {metric} {self._help[metric]}')
+            lines.append(f'# TYPE {metric} {self._types.get(metric, "untyped")}')
+
+        for metric, labels, value in sorted(merged['counters']):
+            header(metric)
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        for metric, labels, value in sorted(merged['gauges']):
+            header(metric)
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        for metric, labels, value in sorted(merged['histograms']):
+            header(metric)
+            cumulative = 0
+            for bound, count in zip(self._buckets.get(metric, BUCKETS) + (float('inf'),), value[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{_format_labels(labels, le=le)} {cumulative}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {value[-1]}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _locked_directory(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return _FileLock(os.path.join(self.directory, '.lock'))
+
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _read_snapshot(path: str) -> dict:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def _merge(snapshots: List[dict], gauges: bool) -> dict:
+    counters: Dict[Tuple[str, Labels], float] = dict()
+    histograms: Dict[Tuple[str, Labels], List[float]] = dict()
+    merged_gauges: Dict[Tuple[str, Labels], float] = dict()
+
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+
+        for name, labels, value in snapshot.get('histograms', []):
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], value)]
+            else:
+                histograms[key] = list(value)
+
+        if gauges:
+            for name, labels, value in snapshot.get('gauges', []):
+                key = (name, tuple(map(tuple, labels)))
+                merged_gauges[key] = merged_gauges.get(key, 0) + value
+
+    return dict(
+        counters=[[name, labels, value] for (name, labels), value in counters.items()],
+        histograms=[[name, labels, value] for (name, labels), value in histograms.items()],
+        gauges=[[name, labels, value] for (name, labels), value in merged_gauges.items()],
+    )
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+
+    escaped = (f'{key}="{_escape(str(value))}"' for key, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics(env.get('METRICS_DIR', 'metrics'), float(env.get('METRICS_FLUSH_INTERVAL', '1')))
@@ -1,19 +1,44 @@
-from mysql.connector import pooling
-from typing import Optional
+from mysql.connector import pooling, errors, connect
+from mysql.connector.abstracts import MySQLConnectionAbstract
+from mysql.connector.constants import ClientFlag
+from typing import Optional, Tuple, List, Dict, Union
 from os import environ as env
+from time import monotonic, time
+from itertools import count
+from flask import has_request_context, session, g
+from infrastructure.utils.instrumentation import instrument, InstrumentedConnection
+from infrastructure.utils.unit_of_work import SharedConnection, current_unit
+from infrastructure.utils import statements
 
 _pool: Optional[pooling.MySQLConnectionPool] = None
+_replica_pools: Dict[int, pooling.MySQLConnectionPool] = dict()
+_replica_down_until: Dict[int, float] = dict()
+_replica_turn = count()
+
+_STICKY_KEY = '_db_primary_until'
 
 get_schema = lambda: env["DB_NAME"]
 
 
+def _replica_hosts() -> List[Tuple[str, int]]:
+    hosts = []
+    for entry in env.get("DB_REPLICA_HOSTS", "").split(","):
+        if entry.strip():
+            host, _, port = entry.strip().partition(":")
+            hosts.append((host, int(port or "3306")))
+
+    return hosts
+
+
 def get_pool() -> pooling.MySQLConnectionPool:
     global _pool
     if _pool is None:
         _pool = pooling.MySQLConnectionPool(
-            pool_size=10,
+            pool_size=int(env.get("DB_POOL_SIZE", "10")),
             pool_name="webapp",
-            pool_reset_session=True,
+            # The session reset deallocates the cached prepared statements
+            pool_reset_session=statements.CACHE_SIZE <= 0,
+            client_flags=[ClientFlag.FOUND_ROWS],
             host=env.get("DB_HOST", "localhost"),
             port=int(env.get("DB_PORT", "3306")),
             user=env["DB_USER"],
@@ -22,3 +47,133 @@ def get_pool() -> pooling.MySQLConnectionPool:
         )
 
     return _pool
+
+
+def get_replica_pool(index: int) -> pooling.MySQLConnectionPool:
+    """
+    Pool of a read replica configured on ``DB_REPLICA_HOSTS``
+    :param index: Replica index
+    :return: Replica pool
+    """
+    if index not in _replica_pools:
+        host, port = _replica_hosts()[index]
+        _replica_pools[index] = pooling.MySQLConnectionPool(
+            pool_size=int(env.get("DB_POOL_SIZE", "10")),
+            pool_name=f"webapp-replica-{index:d}",
+            pool_reset_session=statements.CACHE_SIZE <= 0,
+            client_flags=[ClientFlag.FOUND_ROWS],
+            host=host,
+            port=port,
+            user=env["DB_USER"],
+            password=env["DB_PASSWORD"],
+            database=get_schema(),
+        )
+
+    return _replica_pools[index]
+
+
+def mark_written():
+    """
+    Keep the reads of the session on the primary while the replicas may not have its writes
+    """
+    if has_request_context():
+        g.db_written = True
+        session[_STICKY_KEY] = time() + float(env.get("DB_REPLICA_STICKY_SECONDS", "5"))
+
+
+def _is_sticky() -> bool:
+    if not has_request_context():
+        return False
+
+    return g.get('db_written', False) or session.get(_STICKY_KEY, 0) > time()
+
+
+def _checkout() -> InstrumentedConnection:
+    return instrument(get_pool().get_connection(), on_write=mark_written)
+
+
+def _checkout_replica() -> Optional[InstrumentedConnection]:
+    replicas = len(_replica_hosts())
+
+    start = next(_replica_turn)
+    for offset in range(replicas):
+        index = (start + offset) % replicas
+        if _replica_down_until.get(index, 0) > monotonic():
+            continue
+
+        try:
+            return instrument(get_replica_pool(index).get_connection())
+        except errors.PoolError:
+            # Exhausted pool, the replica is healthy
+            continue
+        except errors.Error:
+            _replica_pools.pop(index, None)
+            _replica_down_until[index] = monotonic() + float(env.get("DB_REPLICA_RETRY_SECONDS", "30"))
+
+    return None
+
+
+def get_connection() -> Union[InstrumentedConnection, SharedConnection]:
+    """
+    Connection of the primary pool with query instrumentation, shared by the request when in one
+    :return: Connection, returned to the pool on close
+    """
+    unit = current_unit()
+    if unit is not None:
+        return unit.connection("primary", _checkout)
+
+    return _checkout()
+
+
+def get_read_connection() -> Union[InstrumentedConnection, SharedConnection]:
+    """
+    Connection for reads, from a replica unless the session wrote recently or every replica is down
+    :return: Connection, returned to the pool on close
+    """
+    if not _replica_hosts() or _is_sticky():
+        return get_connection()
+
+    unit = current_unit()
+    if unit is not None:
+        connection = unit.connection("replica", _checkout_replica)
+    else:
+        connection = _checkout_replica()
+
+    return get_connection() if connection is None else connection
+
+
+def get_maintenance_connection() -> MySQLConnectionAbstract:
+    """
+    Connection to the primary outside the pools, for the maintenance statements that would hold a connection of the
+    requests for a while
+    :return: Connection, closed on exit
+    """
+    return connect(
+        client_flags=[ClientFlag.FOUND_ROWS],
+        host=env.get("DB_HOST", "localhost"),
+        port=int(env.get("DB_PORT", "3306")),
+        user=env["DB_USER"],
+        password=env["DB_PASSWORD"],
+        database=get_schema(),
+    )
+
+
+def reset_pool():
+    """
+    Forget the current pools without closing their connections, used after a fork
+    """
+    global _pool
+    _pool = None
+    _replica_pools.clear()
+    _replica_down_until.clear()
+
+
+def pool_stats() -> Optional[Tuple[int, int]]:
+    """
+    Usage of the current pool
+    :return: Pool size and idle connections, or None if the pool was not created
+    """
+    if _pool is None:
+        return None
+
+    return _pool.pool_size, _pool._cnx_queue.qsize()
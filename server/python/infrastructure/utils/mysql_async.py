@@ -0,0 +1,99 @@
+"""
+Asyncio MySQL connections for the ASGI application
+
+``mysql.connector.aio`` has no pool, so every process keeps at most ``ASGI_DB_POOL_SIZE`` connections to the primary
+and coroutines wait for a free one instead of failing when all are checked out. Connections run in autocommit mode, the
+repositories only run single statement writes and a read never sees a snapshot older than its own query.
+"""
+from contextlib import asynccontextmanager
+from os import environ as env
+from typing import AsyncIterator, List, Optional
+import asyncio
+
+from mysql.connector import errors
+from mysql.connector.constants import ClientFlag
+import mysql.connector.aio
+
+from infrastructure.utils.mysql import get_schema
+
+
+class AsyncPool:
+    """
+    Bounded set of asyncio connections, opened on demand
+    """
+
+    def __init__(self, size: int, **config):
+        self.size = size
+        self._config = config
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List = []
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator:
+        """
+        Check out a connection, waiting while the pool is exhausted
+        :return: Connection, returned to the pool on exit
+        """
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await mysql.connector.aio.connect(**self._config)
+            try:
+                yield connection
+            except (AssertionError, errors.IntegrityError, errors.ProgrammingError, errors.DataError):
+                # Rejected by the repository or the server, the connection is still usable
+                self._idle.append(connection)
+                raise
+            except BaseException:
+                # Cancelled or broken in the middle of a command
+                await _discard(connection)
+                raise
+            else:
+                self._idle.append(connection)
+
+    async def close(self):
+        """
+        Close the idle connections
+        """
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await _discard(connection)
+
+
+async def _discard(connection):
+    try:
+        await connection.close()
+    except errors.Error:
+        pass
+
+
+_pool: Optional[AsyncPool] = None
+
+
+def get_async_pool() -> AsyncPool:
+    """
+    Pool of the running event loop, there is one loop by process
+    :return: Pool instance
+    """
+    global _pool
+    if _pool is None:
+        _pool = AsyncPool(
+            int(env.get("ASGI_DB_POOL_SIZE", "32")),
+            autocommit=True,
+            client_flags=[ClientFlag.FOUND_ROWS],
+            host=env.get("DB_HOST", "localhost"),
+            port=int(env.get("DB_PORT", "3306")),
+            user=env["DB_USER"],
+            password=env["DB_PASSWORD"],
+            database=get_schema(),
+        )
+
+    return _pool
+
+
+async def close_async_pool():
+    """
+    Close the pool of the process, if any
+    """
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
@@ -0,0 +1,278 @@
+"""
+Monthly range partitions of ``posts`` on ``CREATION_DATE``
+
+Enabled with ``POST_PARTITIONS_ENABLED=1``, ``posts`` is created with a partition for every month from the current
+one to ``POST_PARTITIONS_AHEAD`` months later, and a last ``p_future`` partition for the later dates. Queries on a
+``CREATION_DATE`` range, like ``time_range`` and the pages of the feed, only read the partitions of the range, and the
+feed index of every partition stays as small as a month of posts.
+
+Rotation creates the partitions of the coming months by splitting ``p_future`` and, when
+``POST_PARTITIONS_RETENTION`` is set, drops the partitions older than that many months with their posts. It runs
+when the table is created, with ``flask partition-posts``, which also converts an existing table, and every
+``POST_PARTITIONS_ROTATE_SECONDS`` in every server worker: a named lock lets one worker rotate at a time, the others
+skip their turn instead of waiting, and the rotations use a connection of their own instead of one of the pool.
+With the archive enabled by ``POST_ARCHIVE_AGE_DAYS``, the retention only drops the partitions emptied by
+``flask archive-posts`` and keeps the others until their posts are archived. Every worker drops its caches after a
+drop, the posts of the dropped partitions have no invalidations of their own.
+
+MySQL requires the partitioning column in every unique key and does not support foreign keys on partitioned tables:
+the primary key becomes (``ID``, ``CREATION_DATE``), a lookup by id probes every partition, and the cascades of the
+``users`` foreign key are run by triggers instead.
+"""
+from datetime import date
+from os import environ as env
+from threading import Thread, Event
+from typing import List, Optional, Tuple
+import logging
+
+from infrastructure.repositories import ARCHIVE_AGE_DAYS
+from infrastructure.utils import cache
+from infrastructure.utils.mysql import get_maintenance_connection, get_schema
+
+logger = logging.getLogger(__name__)
+
+ENABLED = env.get('POST_PARTITIONS_ENABLED', '0') == '1'
+AHEAD = int(env.get('POST_PARTITIONS_AHEAD', '3'))
+RETENTION = int(env.get('POST_PARTITIONS_RETENTION', '0'))
+ROTATE_SECONDS = float(env.get('POST_PARTITIONS_ROTATE_SECONDS', '86400'))
+
+FUTURE = 'p_future'
+
+_LOCK = 'posts_partitions'
+_LOCK_TIMEOUT = 60
+
+# Upper bound of a partition, None for MAXVALUE
+Partition = Tuple[str, Optional[date]]
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'p{month.year:04d}{month.month:02d}'
+
+
+def _definitions(months: List[date]) -> str:
+    definitions = [
+        f"PARTITION `{partition_name(month)}` VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+        for month in months
+    ]
+    definitions.append(f'PARTITION `{FUTURE}` VALUES LESS THAN (MAXVALUE)')
+    return ', '.join(definitions)
+
+
+def partitions(conn) -> List[Partition]:
+    """
+    Partitions of ``posts`` in order
+    :param conn: Connection
+    :return: Name and upper bound of every partition, empty when the table is not partitioned
+    """
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            SELECT `PARTITION_NAME`, `PARTITION_DESCRIPTION`
+                FROM `information_schema`.`PARTITIONS`
+            WHERE `TABLE_SCHEMA` = %(schema)s
+              AND `TABLE_NAME` = 'posts'
+              AND `PARTITION_NAME` IS NOT NULL
+            ORDER BY `PARTITION_ORDINAL_POSITION`
+        ''', dict(schema=get_schema()))
+        rows = cursor.fetchall()
+
+    return [(name, None if bound == 'MAXVALUE' else date.fromisoformat(bound.strip("'"))) for name, bound in rows]
+
+
+def pruned(layout: List[Partition], since: date, until: date) -> List[str]:
+    """
+    Partitions a query on a ``CREATION_DATE`` range has to read
+    :param layout: Partitions of the table
+    :param since: First day of the range
+    :param until: Last day of the range
+    :return: Partition names
+    """
+    names = []
+    lower = date.min
+    for name, upper in layout:
+        if lower <= until and (upper is None or since < upper):
+            names.append(name)
+        lower = upper or date.max
+
+    return names
+
+
+def _create_triggers(cursor):
+    cursor.execute('''
+        SELECT `TRIGGER_NAME`
+            FROM `information_schema`.`TRIGGERS`
+        WHERE `TRIGGER_SCHEMA` = %(schema)s
+          AND `EVENT_OBJECT_TABLE` = 'users'
+    ''', dict(schema=get_schema()))
+    existing = {row[0] for row in cursor.fetchall()}
+
+    if 'users_posts_update' not in existing:
+        cursor.execute('''
+            CREATE TRIGGER `users_posts_update` AFTER UPDATE ON `users` FOR EACH ROW
+                UPDATE `posts` SET `USER_NAME` = NEW.`USER_NAME`
+                WHERE `USER_NAME` = OLD.`USER_NAME` AND NEW.`USER_NAME` <> OLD.`USER_NAME`
+        ''')
+
+    if 'users_posts_delete' not in existing:
+        cursor.execute('''
+            CREATE TRIGGER `users_posts_delete` AFTER DELETE ON `users` FOR EACH ROW
+                DELETE FROM `posts` WHERE `USER_NAME` = OLD.`USER_NAME`
+        ''')
+
+
+def _has_key(cursor, name: str) -> bool:
+    cursor.execute('''
+        SELECT COUNT(*)
+            FROM `information_schema`.`STATISTICS`
+        WHERE `TABLE_SCHEMA` = %(schema)s
+          AND `TABLE_NAME` = 'posts'
+          AND `INDEX_NAME` = %(name)s
+    ''', dict(schema=get_schema(), name=name))
+    return cursor.fetchone()[0] > 0
+
+
+def _is_empty(cursor, name: str) -> bool:
+    cursor.execute(f'SELECT EXISTS(SELECT 1 FROM `posts` PARTITION (`{name}`))')
+    return cursor.fetchone()[0] == 0
+
+
+def partition_table(conn):
+    """
+    Partition ``posts`` by month if it is not, from the month of its oldest post. The table is rebuilt, which takes a
+    while on a large table
+    :param conn: Connection
+    """
+    if partitions(conn):
+        return
+
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            SELECT `CONSTRAINT_NAME`
+                FROM `information_schema`.`REFERENTIAL_CONSTRAINTS`
+            WHERE `CONSTRAINT_SCHEMA` = %(schema)s
+              AND `TABLE_NAME` = 'posts'
+        ''', dict(schema=get_schema()))
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE `posts` DROP FOREIGN KEY `{constraint}`')
+
+        # The index of the foreign key stays when there was one, the triggers look up the posts of a user with it
+        keys = ['DROP PRIMARY KEY', 'ADD PRIMARY KEY (`ID`, `CREATION_DATE`)']
+        if not _has_key(cursor, 'USER_NAME'):
+            keys.append('ADD KEY `USER_NAME` (`USER_NAME`)')
+        cursor.execute(f'ALTER TABLE `posts` {", ".join(keys)}')
+
+        cursor.execute('SELECT MIN(`CREATION_DATE`) FROM `posts`')
+        oldest = cursor.fetchone()[0] or date.today()
+
+        first, last = month_start(oldest), add_months(month_start(date.today()), AHEAD)
+        months = [first]
+        while months[-1] < last:
+            months.append(add_months(months[-1], 1))
+
+        cursor.execute(f'ALTER TABLE `posts` PARTITION BY RANGE COLUMNS(`CREATION_DATE`) ({_definitions(months)})')
+
+        _create_triggers(cursor)
+
+    conn.commit()
+
+
+def rotate(conn, today: Optional[date] = None, wait: float = _LOCK_TIMEOUT) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Create the partitions of the coming months and drop the ones past the retention, holding a named lock so the
+    workers rotating at once do it only once
+    :param conn: Connection
+    :param today: Current day
+    :param wait: Seconds to wait for another rotation to finish
+    :return: Created and dropped partition names, or None when another rotation holds the lock
+    """
+    today = today or date.today()
+
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT GET_LOCK(%s, %s)', (_LOCK, wait))
+        if cursor.fetchone()[0] != 1:
+            return None
+
+        try:
+            layout = partitions(conn)
+            if not layout:
+                return [], []
+
+            created = []
+            bounds = [upper for _, upper in layout if upper is not None]
+            month = max(bounds) if bounds else month_start(today)
+            while month <= add_months(month_start(today), AHEAD):
+                created.append(month)
+                month = add_months(month, 1)
+
+            if created:
+                cursor.execute(f'''
+                    ALTER TABLE `posts` REORGANIZE PARTITION `{FUTURE}` INTO ({_definitions(created)})
+                ''')
+
+            dropped = []
+            if RETENTION > 0:
+                cutoff = add_months(month_start(today), -RETENTION)
+                dropped = [name for name, upper in layout if upper is not None and upper <= cutoff]
+                # A table keeps one partition at least
+                dropped = dropped[:len(layout) - 1]
+
+            if ARCHIVE_AGE_DAYS > 0:
+                kept = [name for name in dropped if not _is_empty(cursor, name)]
+                for name in kept:
+                    logger.warning('kept partition %s of posts past the retention until its posts are archived', name)
+                dropped = [name for name in dropped if name not in kept]
+
+            if dropped:
+                cursor.execute(f'ALTER TABLE `posts` DROP PARTITION {", ".join(f"`{name}`" for name in dropped)}')
+                cache.reset_everywhere()
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (_LOCK,))
+            cursor.fetchall()
+
+    return [partition_name(month) for month in created], dropped
+
+
+def rotate_partitions():
+    """
+    Rotate the partitions unless another worker is rotating them, logging the changes
+    """
+    with get_maintenance_connection() as conn:
+        rotated = rotate(conn, wait=0)
+
+    if rotated is None:
+        return
+
+    created, dropped = rotated
+
+    for name in created:
+        logger.info('created partition %s of posts', name)
+    for name in dropped:
+        logger.info('dropped partition %s of posts', name)
+
+
+def start_rotation(interval: float = ROTATE_SECONDS) -> Event:
+    """
+    Rotate the partitions now and every ``interval`` seconds on a daemon thread
+    :param interval: Seconds between rotations
+    :return: Event stopping the rotations when set
+    """
+    stopped = Event()
+
+    def run():
+        while not stopped.is_set():
+            try:
+                rotate_partitions()
+            except Exception:
+                logger.exception('rotation of the posts partitions failed')
+            stopped.wait(interval)
+
+    Thread(target=run, name='posts-partitions', daemon=True).start()
+    return stopped
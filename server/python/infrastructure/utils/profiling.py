@@ -0,0 +1,163 @@
+"""
+On demand profiling of single requests
+
+A request is profiled when it sends the ``X-Profile`` header with ``PROFILE_TOKEN`` or when it is picked by
+``PROFILE_SAMPLE_RATE``. The profile is written as a ``.pstats`` file (readable by ``pstats``, ``snakeviz`` or
+``flameprof``) into ``PROFILE_DIR``, which keeps at most ``PROFILE_MAX_FILES`` profiles.
+
+Profiled requests, or every request when ``SERVER_TIMING=1``, answer a ``Server-Timing`` header with the time
+spent on the database, the templates and the providers.
+"""
+from cProfile import Profile
+from functools import wraps
+from os import environ as env
+from random import random
+from time import perf_counter, time
+from typing import Callable, Iterable
+import hmac
+import os
+import re
+
+from flask import Flask, Response, before_render_template, g, has_request_context, request, template_rendered
+
+from infrastructure.utils.instrumentation import request_queries
+
+_ENVIRON_KEY = 'profiling.enabled'
+_unsafe_path = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class ProfilerMiddleware:
+    """
+    WSGI middleware profiling the selected requests
+    """
+
+    def __init__(self, app: Callable, directory: str, token: str = '', sample_rate: float = 0.0,
+                 max_files: int = 50):
+        self.app = app
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+
+    def _is_selected(self, environ: dict) -> bool:
+        header = environ.get('HTTP_X_PROFILE')
+        # compare_digest only takes ASCII strings, any header value compares as bytes
+        if self.token and header is not None and hmac.compare_digest(header.encode(), self.token.encode()):
+            return True
+
+        return self.sample_rate > 0 and random() < self.sample_rate
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        if not self._is_selected(environ):
+            return self.app(environ, start_response)
+
+        environ[_ENVIRON_KEY] = True
+        profile = Profile()
+        profile.enable()
+        try:
+            iterable = self.app(environ, start_response)
+            try:
+                body = list(iterable)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            profile.disable()
+            self._save(profile, environ)
+
+        return body
+
+    def _save(self, profile: Profile, environ: dict):
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = _unsafe_path.sub('_', environ.get('PATH_INFO', '/')).strip('_') or 'root'
+        name = f'{time():.6f}-{environ.get("REQUEST_METHOD", "GET")}-{path[:80]}.pstats'
+        profile.dump_stats(os.path.join(self.directory, name))
+
+        profiles = sorted(entry for entry in os.listdir(self.directory) if entry.endswith('.pstats'))
+        for entry in profiles[:max(len(profiles) - self.max_files, 0)]:
+            os.remove(os.path.join(self.directory, entry))
+
+
+def add_timing(category: str, elapsed: float):
+    """
+    Add time spent by the current request on a category of the ``Server-Timing`` header
+    :param category: Category name
+    :param elapsed: Elapsed seconds
+    """
+    if has_request_context():
+        if 'timings' not in g:
+            g.timings = dict()
+        g.timings[category] = g.timings.get(category, 0.0) + elapsed
+
+
+def timed(category: str, fx: Callable) -> Callable:
+    """
+    Wrap a function to account its time on a ``Server-Timing`` category
+    :param category: Category name
+    :param fx: Function to wrap
+    :return: Wrapped function
+    """
+    @wraps(fx)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return fx(*args, **kwargs)
+        finally:
+            add_timing(category, perf_counter() - start)
+
+    return wrapper
+
+
+def time_provider(provider: object, *methods: str):
+    """
+    Account the time of the implementation methods of a provider instance
+    :param provider: Provider instance
+    :param methods: Method names to wrap
+    """
+    for method in methods:
+        setattr(provider, method, timed('provider', getattr(provider, method)))
+
+
+def _before_render(_app: Flask, **_extra):
+    depth = g.get('template_depth', 0)
+    if depth == 0:
+        g.template_start = perf_counter()
+    g.template_depth = depth + 1
+
+
+def _after_render(_app: Flask, **_extra):
+    g.template_depth = g.get('template_depth', 1) - 1
+    if g.template_depth == 0 and 'template_start' in g:
+        add_timing('tpl', perf_counter() - g.template_start)
+
+
+def _server_timing(response: Response) -> Response:
+    if not (request.environ.get(_ENVIRON_KEY) or env.get('SERVER_TIMING', '0') == '1'):
+        return response
+
+    timings = dict(g.get('timings', dict()))
+    timings['db'] = sum(query.duration for query in request_queries())
+
+    response.headers['Server-Timing'] = ', '.join(
+        f'{category};dur={elapsed * 1000:.2f}' for category, elapsed in timings.items()
+    )
+    return response
+
+
+def init_app(app: Flask):
+    """
+    Install the profiler middleware and the ``Server-Timing`` header
+    :param app: Flask application
+    """
+    app.wsgi_app = ProfilerMiddleware(
+        app.wsgi_app,
+        directory=env.get('PROFILE_DIR', 'profiles'),
+        token=env.get('PROFILE_TOKEN', ''),
+        sample_rate=float(env.get('PROFILE_SAMPLE_RATE', '0')),
+        max_files=int(env.get('PROFILE_MAX_FILES', '50')),
+    )
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.after_request(_server_timing)
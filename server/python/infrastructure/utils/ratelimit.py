@@ -0,0 +1,240 @@
+"""
+Rate limiting and load shedding shared by every gunicorn worker
+
+Enabled with ``RATE_LIMIT_ENABLED=1``. The middleware runs before Flask, so rejected requests never load a session,
+touch the database or hash a password. Every client IP has a token bucket for all its requests, and POST requests
+also take from a bucket of the client IP and one of the session cookie. Requests over ``SHED_MAX_INFLIGHT``
+concurrent requests across all the workers are shed.
+
+The client IP is only known when the server is reached directly over TCP, or behind a proxy with
+``RATE_LIMIT_TRUST_FORWARDED=1``. Otherwise every client would share the bucket of the proxy or of the unix socket,
+so requests without a known client only take from the session bucket.
+"""
+from math import ceil
+from os import environ as env
+from time import monotonic
+from typing import Callable, Iterable, List, Optional, Tuple
+import os
+
+from flask import Flask
+from werkzeug.http import parse_cookie
+from werkzeug.wsgi import ClosingIterator
+
+from infrastructure.utils import is_process_alive
+from infrastructure.utils.metrics import metrics
+from infrastructure.utils.shared_memory import SharedSlots, Values, fingerprint, shared_path
+
+metrics.describe('http_rejected_total', 'counter', 'Requests rejected before reaching the app by reason')
+
+TRUST_FORWARDED = env.get('RATE_LIMIT_TRUST_FORWARDED', '0') == '1'
+
+
+def client_address(environ: dict) -> Optional[str]:
+    """
+    Address of the client of a request
+    :param environ: WSGI environment
+    :return: Client address, None when it is unknown or only the address of a proxy
+    """
+    forwarded = environ.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        if not TRUST_FORWARDED:
+            return None
+
+        # Last address is the one appended by our own proxy
+        return forwarded.rsplit(',', 1)[-1].strip() or None
+
+    # Empty on a unix socket
+    return environ.get('REMOTE_ADDR') or None
+
+
+class TokenBuckets:
+    """
+    Token buckets stored on shared slots
+
+    A slot stores a fingerprint of its key, the tokens, the last update and when the bucket is full again. A key
+    probes ``probes`` slots from its hashed one for its own, then for a free one or one whose bucket is full again,
+    which holds nothing worth keeping. When every probed slot is in use, the least recently updated one is taken over.
+    """
+
+    def __init__(self, slots: SharedSlots, probes: int = 4):
+        self._slots = slots
+        self.probes = probes
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """
+        Take a token from the bucket of a key
+        :param key: Bucket key
+        :param rate: Tokens refilled per second
+        :param burst: Bucket capacity
+        :return: Zero if a token was taken, otherwise seconds until a token is available
+        """
+        key_fingerprint = fingerprint(key)
+
+        def take_token(values: Values, claim: bool) -> Tuple[Values, Optional[float]]:
+            owner, tokens, updated, full_at = values
+            now = monotonic()
+            if owner != key_fingerprint:
+                if not claim and owner != 0 and updated <= now < full_at:
+                    return values, None
+                tokens = burst
+            elif updated == 0 or updated > now:
+                tokens = burst
+            else:
+                tokens = min(burst, tokens + (now - updated) * rate)
+
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+
+            return (key_fingerprint, tokens, now, now + (burst - tokens) / rate), wait
+
+        first = self._slots.index(key)
+        indexes = [(first + probe) % self._slots.slots for probe in range(self.probes)]
+
+        # The slot of the key first, a free slot earlier in the probes would give it a new bucket
+        owned = [index for index in indexes if self._slots.read(index)[0] == key_fingerprint]
+        for index in owned + indexes:
+            wait = self._slots.update(index, lambda values: take_token(values, False))
+            if wait is not None:
+                return wait
+
+        oldest = min(indexes, key=lambda index: self._slots.read(index)[2])
+        return self._slots.update(oldest, lambda values: take_token(values, True))
+
+
+class InFlight:
+    """
+    Concurrent requests of every worker, each worker owns a slot with its process id and requests in flight
+    """
+
+    def __init__(self, slots: SharedSlots):
+        self._slots = slots
+        self._pid: Optional[int] = None
+        self._index: Optional[int] = None
+
+    def _claim(self) -> int:
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._index
+
+        def release_dead(values: Values) -> Tuple[Values, None]:
+            owner = int(values[0])
+            if owner != 0 and not is_process_alive(owner):
+                return (0, 0), None
+            return values, None
+
+        def claim(values: Values) -> Tuple[Values, bool]:
+            if values[0] == 0:
+                return (pid, 0), True
+            return values, False
+
+        for index in range(self._slots.slots):
+            self._slots.update(index, release_dead)
+
+        for index in range(self._slots.slots):
+            if self._slots.update(index, claim):
+                self._pid, self._index = pid, index
+                return index
+
+        raise RuntimeError('no in flight slots left for the worker')
+
+    def total(self) -> int:
+        return int(sum(count for owner, count in self._slots if owner))
+
+    def enter(self):
+        self._slots.update(self._claim(), lambda values: ((values[0], values[1] + 1), None))
+
+    def leave(self):
+        self._slots.update(self._claim(), lambda values: ((values[0], max(values[1] - 1, 0)), None))
+
+
+class RateLimitMiddleware:
+    """
+    WSGI middleware rejecting requests over the limits with a fast 429 or 503 response
+    """
+
+    def __init__(self, app: Callable, buckets: TokenBuckets, in_flight: InFlight, session_cookie: str,
+                 rate: float, burst: float, post_rate: float, post_burst: float, max_in_flight: int):
+        self.app = app
+        self.buckets = buckets
+        self.in_flight = in_flight
+        self.session_cookie = session_cookie
+        self.rate = rate
+        self.burst = burst
+        self.post_rate = post_rate
+        self.post_burst = post_burst
+        self.max_in_flight = max_in_flight
+
+    def admit(self, environ: dict, start_response: Callable) -> Optional[List[bytes]]:
+        """
+        Take the tokens of a request, the caller leaves ``in_flight`` once an admitted request is served
+        :param environ: WSGI environment of the request
+        :param start_response: WSGI callable starting the rejection
+        :return: Body of the rejection, or None when the request is admitted
+        """
+        client = client_address(environ)
+
+        wait = self.buckets.take(f'ip:{client}', self.rate, self.burst) if client else 0.0
+        if not wait and environ.get('REQUEST_METHOD') == 'POST':
+            if client:
+                wait = self.buckets.take(f'post-ip:{client}', self.post_rate, self.post_burst)
+
+            session_id = parse_cookie(environ.get('HTTP_COOKIE')).get(self.session_cookie)
+            if not wait and session_id:
+                wait = self.buckets.take(f'post-session:{session_id}', self.post_rate, self.post_burst)
+
+        if wait:
+            return _reject(start_response, '429 Too Many Requests', wait, 'rate_limit')
+
+        if self.max_in_flight and self.in_flight.total() >= self.max_in_flight:
+            return _reject(start_response, '503 Service Unavailable', 1, 'load_shedding')
+
+        self.in_flight.enter()
+        return None
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        rejection = self.admit(environ, start_response)
+        if rejection is not None:
+            return rejection
+
+        try:
+            return ClosingIterator(self.app(environ, start_response), self.in_flight.leave)
+        except BaseException:
+            self.in_flight.leave()
+            raise
+
+
+def _reject(start_response: Callable, status: str, retry_after: float, reason: str) -> List[bytes]:
+    metrics.inc('http_rejected_total', (('reason', reason),))
+
+    body = status.split(' ', 1)[1].encode()
+    start_response(status, [
+        ('Content-Type', 'text/plain; charset=utf-8'),
+        ('Content-Length', str(len(body))),
+        ('Retry-After', str(max(ceil(retry_after), 1))),
+    ])
+    return [body]
+
+
+def init_app(app: Flask):
+    """
+    Install the rate limiter as the outermost middleware
+    :param app: Flask application
+    """
+    if env.get('RATE_LIMIT_ENABLED', '0') != '1':
+        return
+
+    app.wsgi_app = RateLimitMiddleware(
+        app.wsgi_app,
+        buckets=TokenBuckets(SharedSlots(shared_path('webapp-ratelimit'),
+                                         int(env.get('RATE_LIMIT_SLOTS', '65536')), 4)),
+        in_flight=InFlight(SharedSlots(shared_path('webapp-inflight'), 256, 2)),
+        session_cookie=app.config.get('SESSION_COOKIE_NAME', 'session'),
+        rate=float(env.get('RATE_LIMIT_RATE', '20')),
+        burst=float(env.get('RATE_LIMIT_BURST', '40')),
+        post_rate=float(env.get('RATE_LIMIT_POST_RATE', '0.5')),
+        post_burst=float(env.get('RATE_LIMIT_POST_BURST', '5')),
+        max_in_flight=int(env.get('SHED_MAX_INFLIGHT', '0')),
+    )
@@ -0,0 +1,45 @@
+from importlib import import_module
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, Mapping
+import sys
+
+_import_times: Dict[str, float] = dict()
+
+
+class LazyRegistry(Mapping[str, Callable[..., Any]]):
+    """
+    Registry of implementations by name, the module of an implementation is imported only when it is resolved
+
+    Entries are references with the format ``package.module:attribute``
+    """
+
+    def __init__(self, entries: Dict[str, str]):
+        self._entries = entries
+
+    def __getitem__(self, name: str) -> Callable[..., Any]:
+        module_name, attributes = self._entries[name].split(':', 1)
+
+        if module_name not in sys.modules:
+            start = perf_counter()
+            import_module(module_name)
+            _import_times[module_name] = perf_counter() - start
+
+        target = sys.modules[module_name]
+        for attribute in attributes.split('.'):
+            target = getattr(target, attribute)
+
+        return target
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def import_times() -> Dict[str, float]:
+    """
+    Import time of the modules loaded by the registries
+    :return: Seconds spent importing each module
+    """
+    return dict(_import_times)
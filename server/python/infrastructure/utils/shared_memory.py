@@ -0,0 +1,92 @@
+from hashlib import blake2b
+from threading import Lock
+from typing import Callable, Iterator, Tuple, TypeVar
+from os import environ as env
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+
+R = TypeVar('R')
+Values = Tuple[float, ...]
+
+
+def shared_path(name: str) -> str:
+    """
+    Path of a file shared by every worker, on memory when ``/dev/shm`` is available
+    :param name: File name
+    :return: File path
+    """
+    default = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(env.get('SHARED_MEMORY_DIR', default), name)
+
+
+def fingerprint(key: str) -> float:
+    """
+    Fingerprint of a key stored in a slot to tell it from the other keys hashed to the same slot
+    :param key: Key
+    :return: Positive integer below 2 ** 52, exact on a double
+    """
+    return float((int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'little') >> 12) + 1)
+
+
+class SharedSlots:
+    """
+    Fixed table of float slots mapped on a file shared by every worker
+
+    Every slot is locked independently, keys are hashed into the slots so unrelated keys may share a slot unless the
+    slot stores their ``fingerprint``
+    """
+
+    def __init__(self, path: str, slots: int, fields: int):
+        self.slots = slots
+        self._struct = struct.Struct(f'{fields:d}d')
+        self._lock = Lock()
+
+        size = slots * self._struct.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._mmap = mmap.mmap(self._fd, size)
+
+    def index(self, key: str) -> int:
+        """
+        Slot of a key
+        :param key: Key to hash
+        :return: Slot index
+        """
+        return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'little') % self.slots
+
+    def update(self, index: int, fx: Callable[[Values], Tuple[Values, R]]) -> R:
+        """
+        Atomically read and write a slot across threads and processes
+        :param index: Slot index
+        :param fx: Function receiving the slot values and returning the new values and a result
+        :return: Result of the function
+        """
+        size = self._struct.size
+        offset = index * size
+
+        # POSIX record locks exclude other processes, the thread lock excludes threads of this process
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, size, offset)
+            try:
+                values, result = fx(self._struct.unpack_from(self._mmap, offset))
+                self._struct.pack_into(self._mmap, offset, *values)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, size, offset)
+
+        return result
+
+    def read(self, index: int) -> Values:
+        """
+        Read a slot without locking
+        :param index: Slot index
+        :return: Slot values
+        """
+        return self._struct.unpack_from(self._mmap, index * self._struct.size)
+
+    def __iter__(self) -> Iterator[Values]:
+        for index in range(self.slots):
+            yield self.read(index)
@@ -0,0 +1,152 @@
+"""
+Server side prepared statements cached by connection
+
+Cursors opened with ``prepared=True`` keep their statement prepared on the connection after they close, so the
+next execution of the same SQL on that connection skips the parse. The cache belongs to the underlying connection,
+so it survives pool checkouts, and keeps at most ``PREPARED_STATEMENT_CACHE_SIZE`` statements, closing the least
+recently used. Keep the size times the connections of every worker under the ``max_prepared_stmt_count`` of the
+server.
+
+Resetting the session deallocates the prepared statements, so the pools do not reset sessions while the cache is
+enabled and connections returning to the pool roll back their open transaction instead. A connection that ran a
+statement changing the session, like ``SET``, ``GET_LOCK`` or ``CREATE TEMPORARY TABLE``, still resets it when
+returning to the pool and forgets its statements. Maintenance statements use their own connection outside the pools.
+
+Prepared statements use ``%s`` placeholders with a sequence of parameters.
+"""
+from collections import OrderedDict
+from os import environ as env
+from threading import Lock
+from typing import Any
+from weakref import WeakKeyDictionary
+
+from mysql.connector import errors
+
+from infrastructure.utils.metrics import metrics
+
+CACHE_SIZE = int(env.get('PREPARED_STATEMENT_CACHE_SIZE', '32'))
+
+metrics.describe('db_prepared_statements_total', 'counter', 'Prepared statement cache lookups by result')
+
+_caches: WeakKeyDictionary = WeakKeyDictionary()
+_caches_lock = Lock()
+
+
+class StatementCache:
+    """
+    Least recently used prepared cursors of a connection, keyed by their SQL
+    """
+
+    def __init__(self, connection, max_size: int):
+        self._connection = connection
+        self._connection_id = connection.connection_id
+        self._cursors: OrderedDict = OrderedDict()
+        self.max_size = max_size
+
+    def acquire(self, sql: str):
+        """
+        Take the prepared cursor of a statement, or a new one
+        :param sql: Statement
+        :return: Prepared cursor
+        """
+        if self._connection.connection_id != self._connection_id:
+            # Reconnected, the server forgot the statements
+            self._cursors.clear()
+            self._connection_id = self._connection.connection_id
+
+        cursor = self._cursors.pop(sql, None)
+        if cursor is not None:
+            metrics.inc('db_prepared_statements_total', (('result', 'hit'),))
+            return cursor
+
+        metrics.inc('db_prepared_statements_total', (('result', 'miss'),))
+        return self._connection.cursor(prepared=True)
+
+    def release(self, sql: str, cursor):
+        """
+        Return a prepared cursor to the cache, closing the least recently used ones over the limit
+        :param sql: Statement of the cursor
+        :param cursor: Prepared cursor
+        """
+        if getattr(cursor, 'with_rows', False):
+            # Unread rows block the next command of the connection
+            try:
+                cursor.fetchall()
+            except errors.InterfaceError:
+                pass
+
+        # Two cursors ran the statement at once, only one stays prepared
+        displaced = self._cursors.pop(sql, None)
+        if displaced is not None and displaced is not cursor:
+            displaced.close()
+
+        self._cursors[sql] = cursor
+        while len(self._cursors) > self.max_size:
+            _, evicted = self._cursors.popitem(last=False)
+            evicted.close()
+            metrics.inc('db_prepared_statements_total', (('result', 'evict'),))
+
+
+class CachedCursor:
+    """
+    Prepared cursor proxy taking the statement from the connection cache on execute and returning it on close
+    """
+
+    def __init__(self, cache: StatementCache):
+        self._cache = cache
+        self._sql = None
+        self._cursor = None
+
+    def execute(self, operation: str, params: Any = (), *args, **kwargs):
+        self._release()
+        self._sql, self._cursor = operation, self._cache.acquire(operation)
+        return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def close(self):
+        self._release()
+
+    def _release(self):
+        if self._cursor is not None:
+            cursor, self._cursor = self._cursor, None
+            self._cache.release(self._sql, cursor)
+
+    def __enter__(self) -> 'CachedCursor':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, item: str):
+        return getattr(self._cursor, item)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+def prepared_cursor(connection):
+    """
+    Prepared cursor of a pooled connection, cached when enabled
+    :param connection: Pooled connection
+    :return: Cursor
+    """
+    if CACHE_SIZE <= 0:
+        return connection.cursor(prepared=True)
+
+    # The pooled connection is a new wrapper on every checkout, the cache belongs to the connection it wraps
+    raw = getattr(connection, '_cnx', connection)
+    with _caches_lock:
+        if raw not in _caches:
+            _caches[raw] = StatementCache(raw, CACHE_SIZE)
+        cache = _caches[raw]
+
+    return CachedCursor(cache)
+
+
+def forget_statements(connection):
+    """
+    Forget the cached statements of a connection after its session was reset
+    :param connection: Pooled connection
+    """
+    raw = getattr(connection, '_cnx', connection)
+    with _caches_lock:
+        _caches.pop(raw, None)
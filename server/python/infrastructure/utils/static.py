@@ -0,0 +1,224 @@
+"""
+Fingerprinted static assets
+
+Every file of ``static/`` is copied to ``STATIC_BUILD_DIR`` with the hash of its content in the name, next to a
+gzip version when it is smaller, and ``manifest.json`` maps the original names to the fingerprinted ones. A file
+changing gets a new URL, so the assets are served with an immutable cache policy of one year. ``url_for('static')``
+resolves the fingerprinted names.
+
+The assets are kept in memory and served by a WSGI middleware, before Flask loads a session. Third party assets are
+committed under ``static/vendor`` with their licenses, ``flask build-static --vendor`` downloads the missing ones of
+``VENDOR_ASSETS`` and their upstream URL is used until then.
+"""
+from hashlib import blake2b
+from mimetypes import guess_type
+from os import environ as env
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import gzip
+import json
+import logging
+import os
+import tempfile
+
+from flask import Flask, url_for
+
+logger = logging.getLogger(__name__)
+
+VENDOR_ASSETS = {
+    'vendor/chota.min.css': 'https://unpkg.com/chota@0.9.2/dist/chota.min.css',
+    'vendor/alpine.min.js': 'https://unpkg.com/alpinejs@3.14.5/dist/cdn.min.js',
+}
+
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MANIFEST = 'manifest.json'
+
+_COMPRESSIBLE = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html')
+
+
+def _write(path: str, content: bytes):
+    # Workers building at once never read a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    """
+    Name of an asset with the hash of its content before the extension
+    :param name: Relative path of the asset
+    :param content: Content of the asset
+    :return: Fingerprinted relative path
+    """
+    digest = blake2b(content, digest_size=8).hexdigest()
+    base, extension = os.path.splitext(name)
+    return f'{base}.{digest}{extension}'
+
+
+def build(source: str, output: str) -> Dict[str, str]:
+    """
+    Write the fingerprinted and precompressed assets of a directory
+    :param source: Directory of the assets
+    :param output: Directory of the built assets
+    :return: Fingerprinted relative path of every asset
+    """
+    manifest = dict()
+    for root, _, files in os.walk(source):
+        for file_name in sorted(files):
+            if file_name.startswith('.'):
+                continue
+
+            path = os.path.join(root, file_name)
+            name = os.path.relpath(path, source).replace(os.sep, '/')
+            with open(path, 'rb') as file:
+                content = file.read()
+
+            built = fingerprint(name, content)
+            manifest[name] = built
+
+            target = os.path.join(output, built)
+            if os.path.exists(target):
+                continue
+
+            _write(target, content)
+            if built.endswith(_COMPRESSIBLE):
+                compressed = gzip.compress(content, 9, mtime=0)
+                if len(compressed) < len(content):
+                    _write(f'{target}.gz', compressed)
+
+    _write(os.path.join(output, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def vendor(source: str) -> List[str]:
+    """
+    Download the missing third party assets
+    :param source: Directory of the assets
+    :return: Downloaded assets
+    """
+    import httpx
+
+    downloaded = []
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(source, name)
+        if not os.path.exists(path):
+            response = httpx.get(url, follow_redirects=True)
+            response.raise_for_status()
+            _write(path, response.content)
+            downloaded.append(name)
+
+    return downloaded
+
+
+class Asset:
+    """
+    Built asset served from memory
+    """
+
+    def __init__(self, name: str, content: bytes, compressed: Optional[bytes]):
+        self.content = content
+        self.compressed = compressed
+        self.content_type = guess_type(name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.etag = f'"{os.path.splitext(name)[0].rsplit(".", 1)[-1]}"'
+
+
+def _accepts_gzip(header: str) -> bool:
+    for coding in header.split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '').lower() not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+
+    return False
+
+
+class StaticFiles:
+    """
+    WSGI middleware serving the built assets with a long lived cache policy
+    """
+
+    def __init__(self, app: Callable, output: str, manifest: Dict[str, str], prefix: str = '/static/'):
+        self.app = app
+        self.prefix = prefix
+        self.assets: Dict[str, Asset] = dict()
+
+        for built in manifest.values():
+            with open(os.path.join(output, built), 'rb') as file:
+                content = file.read()
+
+            compressed = None
+            if os.path.exists(os.path.join(output, f'{built}.gz')):
+                with open(os.path.join(output, f'{built}.gz'), 'rb') as file:
+                    compressed = file.read()
+
+            self.assets[built] = Asset(built, content, compressed)
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefix) or environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return self.app(environ, start_response)
+
+        asset = self.assets.get(path[len(self.prefix):])
+        if asset is None:
+            return self.app(environ, start_response)
+
+        headers: List[Tuple[str, str]] = [
+            ('Cache-Control', CACHE_CONTROL),
+            ('ETag', asset.etag),
+            ('Vary', 'Accept-Encoding'),
+        ]
+
+        if asset.etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', headers)
+            return []
+
+        body = asset.content
+        if asset.compressed is not None and _accepts_gzip(environ.get('HTTP_ACCEPT_ENCODING', '')):
+            body = asset.compressed
+            headers.append(('Content-Encoding', 'gzip'))
+
+        headers += [('Content-Type', asset.content_type), ('Content-Length', str(len(body)))]
+        start_response('200 OK', headers)
+        return [] if environ['REQUEST_METHOD'] == 'HEAD' else [body]
+
+
+def source_dir(app: Flask) -> str:
+    return os.path.join(app.root_path, 'static')
+
+
+def build_dir() -> str:
+    return env.get('STATIC_BUILD_DIR', 'static_build')
+
+
+def init_app(app: Flask):
+    """
+    Build the assets, serve them and resolve their fingerprinted names on ``url_for('static')``
+    :param app: Flask application, created with ``static_folder=None``
+    """
+    manifest = build(source_dir(app), build_dir())
+    for name, url in VENDOR_ASSETS.items():
+        if name not in manifest:
+            logger.warning('%s is not vendored, serving it from %s', name, url)
+
+    app.wsgi_app = StaticFiles(app.wsgi_app, build_dir(), manifest)
+    app.add_url_rule('/static/<path:filename>', endpoint='static', build_only=True)
+
+    @app.url_defaults
+    def _fingerprint(endpoint: str, values: dict):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def asset_url(filename: str) -> str:
+        """
+        URL of an asset, the upstream one while a third party asset is not vendored
+        :param filename: Path of the asset under ``static/``
+        :return: URL
+        """
+        if filename not in manifest and filename in VENDOR_ASSETS:
+            return VENDOR_ASSETS[filename]
+
+        return url_for('static', filename=filename)
+
+    app.add_template_global(asset_url, 'asset_url')
@@ -0,0 +1,30 @@
+from os import makedirs
+from time import perf_counter
+from typing import Dict
+
+from jinja2 import Environment, FileSystemBytecodeCache
+
+
+def use_bytecode_cache(environment: Environment, directory: str):
+    """
+    Store the compiled templates into a directory shared by every worker
+    :param environment: Jinja environment of the app
+    :param directory: Directory of the bytecode cache
+    """
+    makedirs(directory, exist_ok=True)
+    environment.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def warm_templates(environment: Environment) -> Dict[str, float]:
+    """
+    Load every template, compiling the ones missing on the bytecode cache
+    :param environment: Jinja environment of the app
+    :return: Load time in seconds of every template
+    """
+    timings = dict()
+    for name in environment.list_templates():
+        start = perf_counter()
+        environment.get_template(name)
+        timings[name] = perf_counter() - start
+
+    return timings
@@ -0,0 +1,136 @@
+from os import environ as env
+from time import monotonic
+from typing import List, Optional, Tuple
+
+from infrastructure.utils.metrics import metrics
+from infrastructure.utils.shared_memory import SharedSlots, Values, fingerprint, shared_path
+
+metrics.describe('login_failures_total', 'counter', 'Failed login attempts')
+metrics.describe('login_throttled_total', 'counter',
+                 'Login attempts rejected before the user query and the password verification')
+
+
+class LoginThrottle:
+    """
+    Failed login counter per user name and per client shared by every worker
+
+    After ``threshold`` failures every new failure doubles the time the user name or client must wait before
+    its next attempt, failures older than ``window`` seconds are forgotten. Clients without a known address, like
+    every client behind an untrusted proxy, are only throttled by user name: a shared counter would lock out the
+    whole site after a few failures
+
+    A slot stores a fingerprint of its key like ``TokenBuckets``, so keys hashed to the same slot never share their
+    failures: a key probes ``probes`` slots for its own, then for a free or forgotten one, and takes over the least
+    recently failed one as a last resort
+    """
+
+    def __init__(self, slots: SharedSlots, threshold: int = 3, base_delay: float = 1.0, max_delay: float = 900.0,
+                 window: float = 900.0, probes: int = 4):
+        self._slots = slots
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.probes = probes
+
+    @staticmethod
+    def _keys(user_name: str, client: Optional[str]) -> Tuple[str, ...]:
+        if client is None:
+            return f'user:{user_name.upper()}',
+
+        return f'user:{user_name.upper()}', f'client:{client}'
+
+    def _indexes(self, key: str) -> List[int]:
+        first = self._slots.index(key)
+        return [(first + probe) % self._slots.slots for probe in range(self.probes)]
+
+    def _owned(self, key: str) -> Optional[int]:
+        owner = fingerprint(key)
+        return next((index for index in self._indexes(key) if self._slots.read(index)[0] == owner), None)
+
+    def retry_after(self, user_name: str, client: Optional[str]) -> float:
+        """
+        Time to wait before a new attempt of a user name from a client
+        :param user_name: Attempted user name
+        :param client: Client address, None when it is unknown
+        :return: Seconds to wait, zero when the attempt is allowed
+        """
+        now = monotonic()
+        wait = 0.0
+        for key in self._keys(user_name, client):
+            index = self._owned(key)
+            if index is None:
+                continue
+
+            _, _, blocked_until, last = self._slots.read(index)
+            # A failure after now was counted on another boot of the monotonic clock
+            if last > now:
+                continue
+            wait = max(wait, min(blocked_until - now, self.max_delay))
+
+        if wait > 0:
+            metrics.inc('login_throttled_total')
+
+        return wait
+
+    def failure(self, user_name: str, client: Optional[str]):
+        """
+        Register a failed attempt
+        :param user_name: Attempted user name
+        :param client: Client address, None when it is unknown
+        """
+        metrics.inc('login_failures_total')
+
+        def register(values: Values, owner: float, claim: bool) -> Tuple[Values, bool]:
+            current, failures, blocked_until, last = values
+            now = monotonic()
+            forgotten = last == 0 or last > now or (now - last > self.window and blocked_until <= now)
+            if current != owner:
+                if not claim and current != 0 and not forgotten:
+                    return values, False
+                failures = 0
+            elif forgotten:
+                failures = 0
+
+            failures += 1
+            blocked_until = 0.0
+            if failures >= self.threshold:
+                blocked_until = now + min(self.base_delay * 2 ** (failures - self.threshold), self.max_delay)
+
+            return (owner, failures, blocked_until, now), True
+
+        for key in self._keys(user_name, client):
+            owner = fingerprint(key)
+            indexes = self._indexes(key)
+            owned = [index for index in indexes if self._slots.read(index)[0] == owner]
+            if any(self._slots.update(index, lambda values: register(values, owner, False))
+                   for index in owned + indexes):
+                continue
+
+            oldest = min(indexes, key=lambda index: self._slots.read(index)[3])
+            self._slots.update(oldest, lambda values: register(values, owner, True))
+
+    def success(self, user_name: str):
+        """
+        Forget the failures of a user name after a successful login
+        :param user_name: Logged user name
+        """
+        key = self._keys(user_name, None)[0]
+        owner = fingerprint(key)
+
+        def forget(values: Values) -> Tuple[Values, None]:
+            return ((0, 0, 0, 0) if values[0] == owner else values), None
+
+        index = self._owned(key)
+        if index is not None:
+            self._slots.update(index, forget)
+
+
+def create_login_throttle() -> LoginThrottle:
+    return LoginThrottle(
+        SharedSlots(shared_path('webapp-login-throttle'), int(env.get('LOGIN_THROTTLE_SLOTS', '65536')), 4),
+        threshold=int(env.get('LOGIN_THROTTLE_THRESHOLD', '3')),
+        base_delay=float(env.get('LOGIN_THROTTLE_BASE_DELAY', '1')),
+        max_delay=float(env.get('LOGIN_THROTTLE_MAX_DELAY', '900')),
+        window=float(env.get('LOGIN_THROTTLE_WINDOW', '900')),
+    )
@@ -0,0 +1,180 @@
+"""
+Request scoped unit of work
+
+Repositories called during a request share one connection of every pool they use, checked out on the first call.
+Their commits are deferred to the end of the request, which commits once before the response is sent, and their
+rollbacks roll back the whole request. Outside a request, or with ``UNIT_OF_WORK_ENABLED=0``, every repository call
+checks out its own connection as before.
+"""
+from os import environ as env
+from typing import Callable, Dict, List, Optional
+
+from flask import Flask, Response, g, has_request_context
+
+from infrastructure.utils.instrumentation import InstrumentedConnection
+
+ENABLED = env.get('UNIT_OF_WORK_ENABLED', '1') == '1'
+
+
+class SharedConnection:
+    """
+    Connection of a unit of work handed to the repositories, which can not commit, roll back or close it
+    """
+
+    def __init__(self, unit: 'UnitOfWork', connection: InstrumentedConnection):
+        self._unit = unit
+        self._connection = connection
+
+    def commit(self):
+        self._unit.dirty = True
+
+    def rollback(self):
+        self._unit.rollback_only = True
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> 'SharedConnection':
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __getattr__(self, item: str):
+        return getattr(self._connection, item)
+
+
+class UnitOfWork:
+    """
+    Connections and transaction state of a request
+    """
+
+    def __init__(self):
+        self.dirty = False
+        self.rollback_only = False
+        self._connections: Dict[str, InstrumentedConnection] = dict()
+        self._after_commit: List[Callable[[], None]] = []
+        self._on_commit: List[Callable[[], None]] = []
+
+    def connection(self, name: str,
+                   connect: Callable[[], Optional[InstrumentedConnection]]) -> Optional[SharedConnection]:
+        """
+        Connection of a pool, checked out on the first use
+        :param name: Pool name
+        :param connect: Function checking out a connection of the pool, or returning None when unavailable
+        :return: Shared connection, or None when unavailable
+        """
+        if name not in self._connections:
+            connection = connect()
+            if connection is None:
+                return None
+            self._connections[name] = connection
+
+        return SharedConnection(self, self._connections[name])
+
+    def commit(self):
+        """
+        Commit the deferred commits, or roll back when a repository asked for it
+        """
+        for connection in self._connections.values():
+            if self.rollback_only:
+                connection.rollback()
+            elif self.dirty:
+                connection.commit()
+
+        callbacks, self._on_commit = self._on_commit, []
+        committed = not self.rollback_only
+        self.dirty = False
+        self._run_after_commit()
+
+        if committed:
+            for fx in callbacks:
+                fx()
+
+    def _run_after_commit(self):
+        callbacks, self._after_commit = self._after_commit, []
+        for fx in callbacks:
+            fx()
+
+    def close(self, error: Optional[BaseException] = None):
+        """
+        Roll back what was not committed and return the connections to their pools
+        :param error: Error ending the request
+        """
+        connections, self._connections = self._connections, dict()
+        self._on_commit = []
+        try:
+            for connection in connections.values():
+                try:
+                    if error is not None or self.dirty or self.rollback_only:
+                        connection.rollback()
+                finally:
+                    connection.close()
+        finally:
+            self._run_after_commit()
+
+
+def current_unit() -> Optional[UnitOfWork]:
+    """
+    Unit of work of the current request
+    :return: Unit of work, or None outside a request or when disabled
+    """
+    if not ENABLED or not has_request_context():
+        return None
+
+    if 'unit_of_work' not in g:
+        g.unit_of_work = UnitOfWork()
+
+    return g.unit_of_work
+
+
+def after_commit(fx: Callable[[], None]):
+    """
+    Run a function once the writes of the current request are committed, or now outside a request
+    :param fx: Function to run
+    """
+    unit = current_unit()
+    if unit is None:
+        fx()
+    else:
+        unit._after_commit.append(fx)
+
+
+def on_commit(fx: Callable[[], None]):
+    """
+    Run a function once the writes of the current request are committed, never when they are rolled back, or now
+    outside a request, where the repositories commit themselves
+    :param fx: Function to run
+    """
+    unit = current_unit()
+    if unit is None:
+        fx()
+    else:
+        unit._on_commit.append(fx)
+
+
+def _commit(response: Response) -> Response:
+    unit = g.get('unit_of_work')
+    if unit is not None:
+        if response.status_code >= 500:
+            unit.rollback_only = True
+
+        # Before sending the response, so a failed commit is a server error and not a lost write
+        unit.commit()
+
+    return response
+
+
+def _close(error: Optional[BaseException]):
+    unit = g.pop('unit_of_work', None)
+    if unit is not None:
+        unit.close(error)
+
+
+def init_app(app: Flask):
+    """
+    Commit the unit of work of every request before its response and release its connections at teardown
+    :param app: Flask application
+    """
+    app.after_request(_commit)
+    app.teardown_request(_close)
@@ -1,27 +1,33 @@
+from dotenv import load_dotenv
+
+# Load the configuration before importing the modules reading it
+load_dotenv()
+
 from flask import Flask, url_for, redirect, session
 from markupsafe import Markup
 
 from flask_session import Session
-from dotenv import load_dotenv
 from os import environ as env
 
 from domain.providers import PasswordHasher, FormSecurityProvider
-from infrastructure.providers.password import PASSWORD_HASHER_PROVIDERS
-from infrastructure.providers.form_security import FORM_SECURITY_PROVIDERS
-
-from infrastructure.repositories.users import (
-    MysqlUnsafeRepository as UserMysqlUnsafeRepository,
-    MysqlRepository as UserMysqlSafeRepository
-)
-from infrastructure.repositories.posts import (
-    MysqlUnsafeRepository as PostMysqlUnsafeRepository,
-    MysqlRepository as PostMysqlSafeRepository
-)
+from infrastructure.providers import PASSWORD_HASHER_PROVIDERS, FORM_SECURITY_PROVIDERS
+from infrastructure.repositories import USER_REPOSITORY_PROVIDERS, POST_REPOSITORY_PROVIDERS, POST_ARCHIVE_PROVIDERS, \
+    ARCHIVE_AGE_DAYS
+from infrastructure.repositories.archived import ArchivedPostRepository
+from infrastructure.repositories.cached import CachedUserRepository
+from infrastructure.repositories.timeline import TimelinePostRepository
 
 from routes.users import router as users_router
 from routes.posts import router as posts_router
+from routes.fragments import render_post_card
+from routes.metrics import router as metrics_router
+from routes.api import router as api_router
 
-load_dotenv()
+from infrastructure.utils.templates import use_bytecode_cache, warm_templates
+from infrastructure.utils import instrumentation, invalidation, profiling, ratelimit, static, unit_of_work
+from infrastructure.utils.throttle import create_login_throttle
+from commands import archive_posts, build_static, compile_templates, explain_time_range, import_report, \
+    invalidation_check, partition_posts
 
 app = Flask(__name__, static_folder=None)
 app.secret_key = env.get('SECRET_KEY', 'test')
@@ -29,6 +35,14 @@ app.config['SESSION_TYPE'] = 'filesystem'
 app.config['SESSION_COOKIE_SAMESITE'] = 'None'
 app.config['SESSION_COOKIE_SECURE'] = True
 Session(app)
+instrumentation.init_app(app)
+invalidation.init_app(app)
+unit_of_work.init_app(app)
+profiling.init_app(app)
+static.init_app(app)
+ratelimit.init_app(app)
+
+use_bytecode_cache(app.jinja_env, env.get('TEMPLATE_CACHE_DIR', 'template_cache'))
 
 CONFIG_PASSWORD_HASHER = env.get('DOMAIN_PASSWORD_HASHER', 'MD5')
 CONFIG_FORM_SECURITY = env.get('DOMAIN_FORM_SECURITY', 'CSRF')
@@ -39,20 +53,47 @@ assert CONFIG_PASSWORD_HASHER in PASSWORD_HASHER_PROVIDERS, \
 
 assert CONFIG_FORM_SECURITY in FORM_SECURITY_PROVIDERS, f'unknown form security provider: {CONFIG_FORM_SECURITY}'
 
-PasswordHasher.provide_hasher(PASSWORD_HASHER_PROVIDERS[CONFIG_PASSWORD_HASHER]())
+password_hasher = PASSWORD_HASHER_PROVIDERS[CONFIG_PASSWORD_HASHER]()
+profiling.time_provider(password_hasher, 'do_hash', 'do_verify')
+PasswordHasher.provide_hasher(password_hasher)
 app.config['PASSWORD_HASHER'] = PasswordHasher
 
-FormSecurityProvider.provide(FORM_SECURITY_PROVIDERS[CONFIG_FORM_SECURITY]())
+form_security = FORM_SECURITY_PROVIDERS[CONFIG_FORM_SECURITY]()
+profiling.time_provider(form_security, 'do_inject', 'do_validate')
+FormSecurityProvider.provide(form_security)
 app.config['FORM_SECURITY_PROVIDER'] = FormSecurityProvider
 
-if CONFIG_REPOSITORY_PROVIDER == 'MYSQL_UNSAFE':
-    app.config['USER_REPOSITORY'] = UserMysqlUnsafeRepository()
-    app.config['POST_REPOSITORY'] = PostMysqlUnsafeRepository()
-elif CONFIG_REPOSITORY_PROVIDER == 'MYSQL_SAFE':
-    app.config['USER_REPOSITORY'] = UserMysqlSafeRepository()
-    app.config['POST_REPOSITORY'] = PostMysqlSafeRepository()
-else:
-    raise AssertionError(f'unknown repository provider: {CONFIG_REPOSITORY_PROVIDER}')
+assert CONFIG_REPOSITORY_PROVIDER in USER_REPOSITORY_PROVIDERS, \
+    f'unknown repository provider: {CONFIG_REPOSITORY_PROVIDER}'
+
+app.config['USER_REPOSITORY'] = USER_REPOSITORY_PROVIDERS[CONFIG_REPOSITORY_PROVIDER]()
+app.config['POST_REPOSITORY'] = POST_REPOSITORY_PROVIDERS[CONFIG_REPOSITORY_PROVIDER]()
+
+if float(env.get('USER_CACHE_TTL', '30')) > 0:
+    app.config['USER_REPOSITORY'] = CachedUserRepository(
+        app.config['USER_REPOSITORY'],
+        max_size=int(env.get('USER_CACHE_SIZE', '4096')),
+        ttl=float(env.get('USER_CACHE_TTL', '30')),
+    )
+
+# Providers without an archive keep every post in their table
+if ARCHIVE_AGE_DAYS > 0 and CONFIG_REPOSITORY_PROVIDER in POST_ARCHIVE_PROVIDERS:
+    app.config['POST_ARCHIVE'] = POST_ARCHIVE_PROVIDERS[CONFIG_REPOSITORY_PROVIDER]()
+    app.config['POST_REPOSITORY'] = ArchivedPostRepository(
+        app.config['POST_REPOSITORY'],
+        app.config['POST_ARCHIVE'],
+        age_days=ARCHIVE_AGE_DAYS,
+    )
+
+app.config['HOME_FEED_SIZE'] = int(env.get('HOME_FEED_SIZE', '100'))
+if float(env.get('TIMELINE_REFRESH_SECONDS', '60')) > 0:
+    app.config['POST_REPOSITORY'] = TimelinePostRepository(
+        app.config['POST_REPOSITORY'],
+        size=app.config['HOME_FEED_SIZE'],
+        refresh=float(env.get('TIMELINE_REFRESH_SECONDS', '60')),
+    )
+
+app.config['LOGIN_THROTTLE'] = create_login_throttle()
 
 
 @app.context_processor
@@ -60,6 +101,9 @@ def template_context():
     return dict(form_security=lambda: Markup(app.config['FORM_SECURITY_PROVIDER'].inject('input')))
 
 
+app.add_template_global(render_post_card, 'post_card')
+
+
 @app.route('/', methods=['GET'])
 def home():
     if 'session_id' not in session:
@@ -70,6 +114,19 @@ def home():
 
 app.register_blueprint(users_router, url_prefix='/users')
 app.register_blueprint(posts_router, url_prefix='/posts')
+app.register_blueprint(metrics_router, url_prefix='/metrics')
+app.register_blueprint(api_router, url_prefix='/api')
+
+if env.get('TEMPLATE_WARMUP', '1') == '1':
+    warm_templates(app.jinja_env)
+
+app.cli.add_command(compile_templates)
+app.cli.add_command(import_report)
+app.cli.add_command(invalidation_check)
+app.cli.add_command(build_static)
+app.cli.add_command(partition_posts)
+app.cli.add_command(explain_time_range)
+app.cli.add_command(archive_posts)
 
 if __name__ == '__main__':
     app.debug = True
@@ -0,0 +1,65 @@
+"""
+Asyncio versions of the ``/api`` routes, served natively by ``asgi.py``
+
+They run inside a Flask request context pushed by the ASGI application, so they read the session, the parameters
+and the configuration like the routes of ``routes.api`` and answer the same payloads, while the queries wait on the
+event loop instead of holding a thread.
+"""
+from typing import Awaitable, Callable, List, Pattern, Tuple
+import re
+
+from flask import Response, current_app, request, session
+
+from domain.models import Post
+import domain.errors as err_codes
+from routes.api import POST_FIELDS, USER_FIELDS, decode_cursor, ensure_api_session, feed_response, json_response, \
+    page_limit, project, requested_fields
+
+
+@ensure_api_session
+async def feed() -> Response:
+    fields = requested_fields(POST_FIELDS)
+    limit = page_limit()
+
+    # One more post tells whether there is a next page
+    posts = await current_app.config['ASYNC_POST_REPOSITORY'].page(limit + 1, decode_cursor(request.args.get('cursor')))
+    return feed_response(posts, limit, fields)
+
+
+@ensure_api_session
+async def post_by_id(_id: str) -> Response:
+    fields = requested_fields(POST_FIELDS)
+    post = await current_app.config['ASYNC_POST_REPOSITORY'].by_id(int(_id))
+    return json_response(project(post, POST_FIELDS, fields))
+
+
+@ensure_api_session
+async def create_post() -> Response:
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = dict()
+
+    provider = current_app.config['FORM_SECURITY_PROVIDER']
+    assert await provider.validate_async(request.headers.get('X-Form-Token')), err_codes.FORBIDDEN
+
+    user = await current_app.config['ASYNC_USER_REPOSITORY'].by_id(session['session_id'])
+    post = Post(title=data.get('title') or '', content=data.get('content') or None, user_name=user.user_name)
+    _id = await current_app.config['ASYNC_POST_REPOSITORY'].create(post)
+
+    return json_response(dict(id=_id), 201)
+
+
+@ensure_api_session
+async def user_by_id(user_name: str) -> Response:
+    fields = requested_fields(USER_FIELDS)
+    user = await current_app.config['ASYNC_USER_REPOSITORY'].by_user_id(user_name)
+    return json_response(project(user, USER_FIELDS, fields))
+
+
+# Method, path and route, named like the endpoints of the blueprint
+ROUTES: List[Tuple[str, Pattern, Callable[..., Awaitable[Response]]]] = [
+    ('GET', re.compile(r'^/api/posts$'), feed),
+    ('GET', re.compile(r'^/api/posts/(?P<_id>\d+)$'), post_by_id),
+    ('POST', re.compile(r'^/api/posts$'), create_post),
+    ('GET', re.compile(r'^/api/users/(?P<user_name>[^/]+)$'), user_by_id),
+]
@@ -0,0 +1,201 @@
+"""
+JSON API for headless clients
+
+Serves the feed, posts, user profiles and post creation without rendering templates. Every read accepts a ``fields``
+parameter with the comma separated fields to return, and the feed pages by the creation date and id of its last post
+through the ``next`` cursor instead of an offset, so deep pages cost as much as the first one. Requests are
+authenticated by the session cookie of the login form, and post creation validates the form security token sent on
+the ``X-Form-Token`` header, issued by ``/api/token``. The feed returns an excerpt of the content, ``truncated``
+when ``content_length`` is longer, and ``/api/posts/<id>`` the whole content.
+"""
+from datetime import date, datetime
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import re
+
+from flask import Blueprint, Response, current_app, request, session
+
+from domain.models import Post, User
+from domain.errors.messages import get_error_message
+import domain.errors as err_codes
+
+router = Blueprint('api', __name__)
+
+POST_FIELDS: Dict[str, Callable[[Post], Any]] = {
+    'id': lambda post: post.id,
+    'title': lambda post: post.title,
+    'user_name': lambda post: post.user_name,
+    'content': lambda post: post.content,
+    'content_length': lambda post: post.content_length,
+    'truncated': lambda post: post.truncated,
+    'date': lambda post: post.date.isoformat() if post.date is not None else None,
+}
+USER_FIELDS: Dict[str, Callable[[User], Any]] = {
+    'user_name': lambda user: user.user_name,
+    'full_name': lambda user: user.full_name,
+}
+
+_CURSOR_PATTERN = re.compile(r'^(\d{8})\.(\d+)$')
+_CURSOR_FORMAT = 'YYYYMMDD.ID'
+
+_STATUS = {
+    err_codes.NOT_FOUND.split('(', 1)[0]: 404,
+    err_codes.ALREADY_EXISTS.split('(', 1)[0]: 409,
+    err_codes.FORBIDDEN.split('(', 1)[0]: 403,
+    err_codes.INVALID_CREDENTIAL.split('(', 1)[0]: 401,
+    err_codes.TOO_MANY_ATTEMPTS.split('(', 1)[0]: 429,
+}
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    # Compact separators and no key sorting, the payload is built with the requested fields only
+    body = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+    return Response(body, status=status, mimetype='application/json')
+
+
+def requested_fields(available: Iterable[str]) -> List[str]:
+    """
+    Fields requested with the ``fields`` parameter, every field by default
+    :param available: Fields of the model
+    :return: Requested fields
+    """
+    available = list(available)
+    requested = request.args.get('fields')
+    if not requested:
+        return available
+
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    for field in fields:
+        assert field in available, err_codes.UNKNOWN_FIELD.format(field=field)
+
+    return fields
+
+
+def project(model: Any, getters: Dict[str, Callable[[Any], Any]], fields: List[str]) -> Dict[str, Any]:
+    return {field: getters[field](model) for field in fields}
+
+
+def encode_cursor(post: Post) -> str:
+    created = post.date.date() if isinstance(post.date, datetime) else post.date
+    return f'{created:%Y%m%d}.{post.id:d}'
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[date, int]]:
+    if not cursor:
+        return None
+
+    match = _CURSOR_PATTERN.match(cursor)
+    assert match is not None, err_codes.PATTERN_NOT_VALID.format(field='cursor', pattern=_CURSOR_FORMAT)
+    try:
+        return datetime.strptime(match.group(1), '%Y%m%d').date(), int(match.group(2))
+    except ValueError:
+        raise AssertionError(err_codes.PATTERN_NOT_VALID.format(field='cursor', pattern=_CURSOR_FORMAT))
+
+
+def page_limit() -> int:
+    """
+    Posts of a feed page requested with the ``limit`` parameter, up to ``HOME_FEED_SIZE``
+    :return: Page size
+    """
+    maximum = current_app.config['HOME_FEED_SIZE']
+    limit = min(request.args.get('limit', 20, type=int), maximum)
+    assert limit > 0, err_codes.LENGTH_NOT_VALID.format(field='limit', min=1, max=maximum)
+    return limit
+
+
+def feed_response(posts: List[Post], limit: int, fields: List[str]) -> Response:
+    """
+    Feed page with the cursor of the next one
+    :param posts: Posts read with one more than the page size
+    :param limit: Page size
+    :param fields: Fields of every post
+    :return: JSON response
+    """
+    cursor = encode_cursor(posts[limit - 1]) if len(posts) > limit else None
+    return json_response(dict(
+        items=[project(post, POST_FIELDS, fields) for post in posts[:limit]],
+        next=cursor,
+    ))
+
+
+def ensure_api_session(fx: Callable) -> Callable:
+    """
+    Ensure the session is initialized, answering 401 instead of redirecting to the login form
+    :param fx: Route to decorate
+    :return: Wrapped route
+    """
+    @wraps(fx)
+    def wrapper(*args, **kwargs):
+        if 'session_id' not in session:
+            raise AssertionError(err_codes.INVALID_CREDENTIAL)
+
+        return fx(*args, **kwargs)
+
+    return wrapper
+
+
+def error_response(error: AssertionError) -> Response:
+    """
+    Response of an error code, with the HTTP status of its kind
+    :param error: Error raised with the code
+    :return: JSON response
+    """
+    code = error.args[0]
+    return json_response(dict(error=code, message=get_error_message(code)), _STATUS.get(code.split('(', 1)[0], 400))
+
+
+@router.errorhandler(AssertionError)
+def _error(error: AssertionError) -> Response:
+    return error_response(error)
+
+
+@router.route('/token', methods=['GET'])
+@ensure_api_session
+def token():
+    provider = current_app.config['FORM_SECURITY_PROVIDER']
+    return json_response(dict(key=provider.get_target_key(), token=provider.inject('code')))
+
+
+@router.route('/posts', methods=['GET'])
+@ensure_api_session
+def feed():
+    fields = requested_fields(POST_FIELDS)
+    limit = page_limit()
+
+    # One more post tells whether there is a next page
+    posts = current_app.config['POST_REPOSITORY'].page(limit + 1, decode_cursor(request.args.get('cursor')))
+    return feed_response(posts, limit, fields)
+
+
+@router.route('/posts/<int:_id>', methods=['GET'])
+@ensure_api_session
+def post_by_id(_id: int):
+    fields = requested_fields(POST_FIELDS)
+    post = current_app.config['POST_REPOSITORY'].by_id(_id)
+    return json_response(project(post, POST_FIELDS, fields))
+
+
+@router.route('/posts', methods=['POST'])
+@ensure_api_session
+def create_post():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = dict()
+
+    provider = current_app.config['FORM_SECURITY_PROVIDER']
+    assert provider.validate(request.headers.get('X-Form-Token')), err_codes.FORBIDDEN
+
+    user = current_app.config['USER_REPOSITORY'].by_id(session['session_id'])
+    post = Post(title=data.get('title') or '', content=data.get('content') or None, user_name=user.user_name)
+    _id = current_app.config['POST_REPOSITORY'].create(post)
+
+    return json_response(dict(id=_id), 201)
+
+
+@router.route('/users/<user_name>', methods=['GET'])
+@ensure_api_session
+def user_by_id(user_name: str):
+    fields = requested_fields(USER_FIELDS)
+    user = current_app.config['USER_REPOSITORY'].by_user_id(user_name)
+    return json_response(project(user, USER_FIELDS, fields))
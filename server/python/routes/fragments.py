@@ -0,0 +1,42 @@
+from hashlib import blake2b
+from os import environ as env
+
+from flask import render_template
+from markupsafe import Markup
+
+from domain.models import Post
+from infrastructure.utils.cache import named_cache, listen
+
+_post_cards = named_cache('post_cards', int(env.get('FRAGMENT_CACHE_SIZE', 1024)))
+
+
+def _post_version(post: Post) -> bytes:
+    """
+    Fingerprint of the rendered fields of a post
+    :param post: Post to fingerprint
+    :return: Version of the post
+    """
+    fields = (post.title, post.user_name, post.content, post.content_length)
+    return blake2b(repr(fields).encode(), digest_size=8).digest()
+
+
+def render_post_card(post: Post) -> Markup:
+    """
+    Render ``posts/card.html`` for a post, reusing the cached fragment while the post does not change
+    :param post: Post to render
+    :return: Rendered HTML fragment
+    """
+    key = (post.id, _post_version(post))
+    fragment = _post_cards.get(key)
+    if fragment is not None:
+        return fragment
+
+    fragment = Markup(render_template('posts/card.html', post=post))
+    _post_cards.set(key, fragment)
+
+    return fragment
+
+
+@listen('posts')
+def _invalidate_post_card(_id: int):
+    _post_cards.delete_where(lambda key: key[0] == _id)
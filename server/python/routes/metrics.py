@@ -0,0 +1,81 @@
+from time import perf_counter
+from os import environ as env
+import hmac
+import os
+
+from flask import Blueprint, current_app, make_response, request, g, abort
+
+from infrastructure.utils.metrics import metrics
+from infrastructure.utils.cache import cache_stats
+from infrastructure.utils.mysql import pool_stats
+
+router = Blueprint('metrics', __name__)
+
+# Scrapers authenticate with ``Authorization: Bearer <METRICS_TOKEN>``, the endpoint is hidden when no token is set.
+# Behind the reverse proxy every request comes from the proxy, so the client address cannot tell scrapers apart
+_TOKEN = env.get('METRICS_TOKEN', '')
+
+metrics.describe('http_request_duration_seconds', 'histogram', 'Request latency by endpoint')
+metrics.describe('http_requests_total', 'counter', 'Requests by endpoint and status code')
+metrics.describe('db_pool_size', 'gauge', 'Connections of the database pools')
+metrics.describe('db_pool_in_use', 'gauge', 'Connections checked out of the database pools')
+metrics.describe('cache_hits', 'gauge', 'Hits of the in-memory caches since the worker started')
+metrics.describe('cache_misses', 'gauge', 'Misses of the in-memory caches since the worker started')
+
+
+@metrics.collector
+def _pool_gauges():
+    stats = pool_stats()
+    if stats is not None:
+        size, idle = stats
+        yield 'db_pool_size', (), size
+        yield 'db_pool_in_use', (), size - idle
+
+
+@metrics.collector
+def _cache_gauges():
+    for name, stats in cache_stats():
+        yield 'cache_hits', (('cache', name),), stats['hits']
+        yield 'cache_misses', (('cache', name),), stats['misses']
+
+
+@router.before_app_request
+def _start_timer():
+    g.metrics_start = perf_counter()
+
+
+@router.after_app_request
+def _record_request(response):
+    if 'metrics_start' in g:
+        endpoint = request.endpoint or 'none'
+        metrics.observe('http_request_duration_seconds', perf_counter() - g.metrics_start, (('endpoint', endpoint),))
+        metrics.inc('http_requests_total', (('endpoint', endpoint), ('status', str(response.status_code))))
+        metrics.flush()
+
+    return response
+
+
+@router.route('', methods=['GET'])
+def export():
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if not _TOKEN:
+        abort(404)
+
+    # compare_digest only takes ASCII strings, any header value compares as bytes
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), _TOKEN.encode()):
+        abort(403)
+
+    session_dir = current_app.config.get('SESSION_FILE_DIR')
+    sessions = 0
+    if session_dir and os.path.isdir(session_dir):
+        sessions = sum(1 for name in os.listdir(session_dir) if not name.startswith('.'))
+
+    body = metrics.render()
+    body += '# HELP session_store_size Sessions stored on the session directory\n'
+    body += '# TYPE session_store_size gauge\n'
+    body += f'session_store_size {sessions:d}\n'
+
+    response = make_response(body)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
@@ -11,7 +11,7 @@ router = Blueprint('posts', __name__)
 @ensure_session
 def home():
     user = current_app.config['USER_REPOSITORY'].by_id(session['session_id'])
-    posts = current_app.config['POST_REPOSITORY'].list()
+    posts = current_app.config['POST_REPOSITORY'].list(limit=current_app.config['HOME_FEED_SIZE'])
     return make_response(render_template(
         'posts/home.html',
         user=user,
@@ -70,4 +70,15 @@ def by_id(_id: int):
         'posts/by_id.html',
         user=user,
         post=post,
-    ))
\ No newline at end of file
+    ))
+
+
+@router.route('/view/<int:_id>/content', methods=['GET'])
+@ensure_session
+def content(_id: int):
+    # Whole content of a post shown with an excerpt by a feed, loaded on demand by its card
+    post = current_app.config['POST_REPOSITORY'].by_id(_id)
+
+    response = make_response(post.content or '')
+    response.mimetype = 'text/plain'
+    return response
@@ -2,7 +2,9 @@ from flask import Blueprint, current_app, make_response, render_template, reques
 from domain.models import User
 import domain.errors as err_codes
 from domain.errors.messages import get_error_message
+from infrastructure.utils.ratelimit import client_address
 from routes import ensure_session
+from math import ceil
 
 router = Blueprint('users', __name__)
 
@@ -16,17 +18,25 @@ def login_form():
 def login_action():
     data = request.form.copy()
     message = None
+    client = client_address(request.environ)
     try:
         token = data.get(current_app.config['FORM_SECURITY_PROVIDER'].get_target_key())
         assert current_app.config['FORM_SECURITY_PROVIDER'].validate(token), err_codes.FORBIDDEN
 
+        retry_after = current_app.config['LOGIN_THROTTLE'].retry_after(data['user_name'], client)
+        assert retry_after == 0, err_codes.TOO_MANY_ATTEMPTS.format(seconds=ceil(retry_after))
+
         User(data['user_name'], 'No Name', data['password'])  # Validate form data
 
         user, _id = current_app.config['USER_REPOSITORY'].by_login(data['user_name'], data['password'])
     except AssertionError as err:
+        if err.args[0] == err_codes.INVALID_CREDENTIAL:
+            current_app.config['LOGIN_THROTTLE'].failure(data['user_name'], client)
+
         message = get_error_message(*err.args)
         message = f'{err.args[0]}: {message}'
     else:
+        current_app.config['LOGIN_THROTTLE'].success(data['user_name'])
         session['session_id'] = _id
 
         return make_response(redirect(url_for('home')))